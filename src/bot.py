@@ -1,4 +1,7 @@
 from aiogram import Bot
 from config import cfg
+from src.chat_members import ChatMemberCache
 
-bot = Bot(token=cfg.token.get_secret_value())
\ No newline at end of file
+bot = Bot(token=cfg.token.get_secret_value())
+chat_members = ChatMemberCache(bot, cfg.chat_member_cache_size, cfg.chat_member_ttl, cfg.chat_member_negative_ttl,
+                               cfg.chat_member_timeout)
\ No newline at end of file
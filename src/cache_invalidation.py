@@ -0,0 +1,102 @@
+import logging
+import threading
+import uuid
+from typing import Any, Callable, Hashable, Optional, Protocol
+
+from src.connections import MongoDBConnection, RedisConnection
+from src.users.vacancy import VacancyCatalog
+from src.users.vacancy_index import SCANNED_FIELDS, VacancyIndex
+from src.users.vacancy_ranker import VacancyRanker
+
+
+class Invalidatable(Protocol):
+    """
+    Anything entries of which are invalidated by key, e.g. TTLCache
+    """
+    def invalidate(self, key: Hashable) -> Any: ...
+
+
+class CacheInvalidator:
+    """
+    Keeps copies of a TTLCache (or of another Invalidatable) held by several bot workers sharing the same databases
+    coherent.
+    A worker that changes the data behind an entry publishes its key to a Redis channel, and every other worker
+    invalidates the key in its own copy. Messages published while Redis is unreachable are lost,
+    so the TTL of the cache bounds how stale an entry can get
+    """
+    def __init__(self, redis_connection: RedisConnection, channel: str, cache: Invalidatable,
+                 parse_key: Callable[[str], Hashable] = str):
+        self._redis_connection = redis_connection
+        self._channel = channel
+        self._cache = cache
+        self._parse_key = parse_key
+        # Tells messages of this worker apart, it has applied the change already
+        self._worker_id = uuid.uuid4().hex
+        self._thread: Optional[threading.Thread] = None
+
+
+    def start(self) -> bool:
+        if self._thread is None:
+            self._thread = self._redis_connection.subscribe(self._channel, self._on_message)
+        return self._thread is not None
+
+
+    def is_started(self) -> bool:
+        return self._thread is not None
+
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.stop()
+            self._thread = None
+
+
+    def notify(self, key: Hashable):
+        """
+        Invalidates key in the caches of the other workers
+        """
+        self._redis_connection.publish(self._channel, f"{self._worker_id}:{key}")
+
+
+    def _on_message(self, data: bytes):
+        worker_id, key = data.decode().split(":", 1)
+        if worker_id == self._worker_id:
+            return
+
+        self._cache.invalidate(self._parse_key(key))
+        logging.debug("Invalidated %s in cache on message from worker %s", key, worker_id)
+
+
+class VacancyStructures:
+    """
+    The in-memory vacancy index, catalog and ranker of a worker, as an Invalidatable keyed by vacancy_id.
+    Invalidating a vacancy reads its document back from MongoDB and puts it into all of them,
+    or removes it from them if there is no such vacancy (anymore), so vacancies published or deleted
+    by other workers are applied in whatever order their messages come
+    """
+    def __init__(self, mongodb_connection: MongoDBConnection, vacancy_index: VacancyIndex,
+                 vacancy_catalog: VacancyCatalog, vacancy_ranker: VacancyRanker):
+        self._mongodb_connection = mongodb_connection
+        self._vacancy_index = vacancy_index
+        self._vacancy_catalog = vacancy_catalog
+        self._vacancy_ranker = vacancy_ranker
+
+
+    def invalidate(self, vacancy_id: int):
+        try:
+            documents = list(self._mongodb_connection.scan_documents(
+                "vacancies", {"vacancy_id": vacancy_id}, projection={field: 1 for field in SCANNED_FIELDS}))
+        except Exception as e:
+            logging.error("Error reading vacancy %d back: %s", vacancy_id, e)
+            return
+
+        if len(documents) == 0:
+            self._vacancy_index.remove(vacancy_id)
+            self._vacancy_catalog.remove(vacancy_id)
+            self._vacancy_ranker.remove(vacancy_id)
+            return
+
+        document = documents[0]
+        self._vacancy_index.add(vacancy_id, document)
+        self._vacancy_catalog.add(vacancy_id, document["recruiter_id"], str(document["_id"]), document)
+        self._vacancy_ranker.add(vacancy_id, document["recruiter_id"], str(document["_id"]), document)
@@ -0,0 +1,134 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, Optional
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire ttl seconds after they were put.
+    Once max_size entries are stored, putting a new one evicts the least recently used.
+    If max_weight is given, least recently used entries are also evicted while the total weight of the entries,
+    as measured by weigh (e.g. an estimate of their size in bytes), exceeds it.
+    Values are returned as stored, callers must not modify them
+    """
+    def __init__(self, max_size: int, ttl: float, clock: Callable[[], float] = time.monotonic,
+                 max_weight: Optional[int] = None, weigh: Callable[[Any], int] = lambda value: 1):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self._weigh = weigh
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (expiration time, value, weight), least recently used first
+        self._entries: OrderedDict[Hashable, tuple[float, Any, int]] = OrderedDict()
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            return self._get(key, default, self._clock())
+
+
+    def get_many(self, keys: Iterable[Hashable]) -> dict[Hashable, Any]:
+        """
+        Returns the values of keys that are cached, in the order of keys
+        """
+        missing = object()
+        found = {}
+        with self._lock:
+            now = self._clock()
+            for key in keys:
+                value = self._get(key, missing, now)
+                if value is not missing:
+                    found[key] = value
+        return found
+
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._put(key, value, self._clock())
+
+
+    def put_many(self, values: dict[Hashable, Any]):
+        with self._lock:
+            now = self._clock()
+            for key, value in values.items():
+                self._put(key, value, now)
+
+
+    def reweigh(self, key: Hashable):
+        """
+        Measures the weight of the value of key again, for values that grow after they were put
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+
+            expires_at, value, weight = entry
+            new_weight = self._weigh(value)
+            self._entries[key] = (expires_at, value, new_weight)
+            self.weight += new_weight - weight
+            self._evict()
+
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self.invalidations += 1
+
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.weight = 0
+
+
+    def _get(self, key: Hashable, default: Any, now: float) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        expires_at, value, _ = entry
+        if expires_at <= now:
+            self._remove(key)
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+
+    def _put(self, key: Hashable, value: Any, now: float):
+        self._remove(key)
+        weight = self._weigh(value)
+        self._entries[key] = (now + self.ttl, value, weight)
+        self.weight += weight
+        self._evict()
+
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.weight -= entry[2]
+
+
+    def _evict(self):
+        # The most recently used entry is kept even if it alone outweighs max_weight
+        while len(self._entries) > self.max_size or \
+                (self.max_weight is not None and self.weight > self.max_weight and len(self._entries) > 1):
+            _, (_, _, weight) = self._entries.popitem(last=False)
+            self.weight -= weight
+            self.evictions += 1
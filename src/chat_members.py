@@ -0,0 +1,71 @@
+import asyncio
+import html
+import logging
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.methods.get_chat_member import GetChatMember
+from aiogram.types import User
+
+from src.caches import TTLCache
+
+
+class ChatMemberCache:
+    """
+    Telegram users looked up with GetChatMember, cached for ttl seconds.
+    Users Telegram does not know (or who blocked the bot) are remembered for negative_ttl seconds,
+    and concurrent lookups of the same user share a single request.
+    Lookups slower than timeout return None, while the request goes on and fills the cache for the next one
+    """
+    def __init__(self, bot: Bot, max_size: int, ttl: float, negative_ttl: float, timeout: float):
+        self._bot = bot
+        self._timeout = timeout
+        self.users = TTLCache(max_size, ttl)
+        self.missing = TTLCache(max_size, negative_ttl)
+        # Requests in flight by user_id
+        self._pending: dict[int, asyncio.Task] = {}
+
+
+    async def get_user(self, user_id: int) -> Optional[User]:
+        user = self.users.get(user_id)
+        if user is not None or self.missing.get(user_id) is not None:
+            return user
+
+        task = self._pending.get(user_id)
+        if task is None:
+            task = asyncio.create_task(self._request_user(user_id))
+            self._pending[user_id] = task
+            task.add_done_callback(lambda _: self._pending.pop(user_id, None))
+
+        try:
+            # Shielded, so that a timeout does not cancel the request shared with other lookups
+            return await asyncio.wait_for(asyncio.shield(task), self._timeout)
+        except asyncio.TimeoutError:
+            logging.warning("GetChatMember for user %d is taking longer than %.1fs", user_id, self._timeout)
+            return None
+
+
+    async def mention_html(self, user_id: int, name: str) -> str:
+        """
+        Link to the user titled name, or just name if the user could not be looked up in time
+        """
+        user = await self.get_user(user_id)
+        if user is None:
+            return html.escape(name)
+        return user.mention_html(name)
+
+
+    async def _request_user(self, user_id: int) -> Optional[User]:
+        try:
+            member = await GetChatMember(chat_id=user_id, user_id=user_id).as_(self._bot)
+        except (TelegramBadRequest, TelegramForbiddenError) as e:
+            logging.info("User %d is not available to the bot: %s", user_id, e)
+            self.missing.put(user_id, True)
+            return None
+        except Exception as e:
+            logging.error("Error requesting chat member %d: %s", user_id, e)
+            return None
+
+        self.users.put(user_id, member.user)
+        return member.user
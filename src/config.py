@@ -8,6 +8,9 @@ class Config(BaseSettings):
     postgres_password: SecretStr
     postgres_db: str
     postgres_port: int
+    postgres_pool_min_size: int = 4
+    postgres_pool_max_size: int = 10
+    postgres_pool_timeout: float = 5.0
     pgdata: str
     mongo_host: str
     mongo_dbname: str
@@ -19,6 +22,45 @@ class Config(BaseSettings):
     neo4j_host: str = "localhost"
     neo4j_user: str
     neo4j_password: SecretStr
+    storage_workers: int = 8
+    prefetch_workers: int = 2
+    storage_connect_timeout: float = 10.0
+    neo4j_connect_timeout: float = 60.0
+    metrics_host: str = "0.0.0.0"
+    metrics_port: int = 9100
+    # At most log_rate_limit INFO records per log_rate_interval seconds from every logging call site, 0 disables
+    log_rate_limit: int = 20
+    log_rate_interval: float = 10.0
+    # Vacancy documents kept in memory, see SweetConnections.vacancy_documents
+    vacancy_cache_size: int = 10000
+    vacancy_cache_ttl: float = 600.0
+    # Rendered vacancy cards, see SeekerHome.get_vacancy_card
+    vacancy_card_cache_size: int = 5000
+    vacancy_card_cache_ttl: float = 300.0
+    # Seconds a search session (see SearchSession) outlives the last step of the seeker
+    search_session_ttl: int = 3600
+    # User profiles kept in memory, see SweetConnections.user_profiles. Besides their number, the estimated size
+    # of the profiles (with their search contexts and cached vacancies) is limited to user_cache_max_bytes
+    user_cache_size: int = 10000
+    user_cache_ttl: float = 1800.0
+    user_cache_max_bytes: int = 256 * 1024 * 1024
+    # Seeker portfolios shown to recruiters by portfolio_ref, see SeekerHome.request_seeker_portfolios
+    portfolio_cache_size: int = 5000
+    portfolio_cache_ttl: float = 300.0
+    # Applicants whose portfolios are fetched together as the recruiter pages through them
+    applicants_page_size: int = 10
+    # Telegram users mentioned in applicant views, see ChatMemberCache. Users the bot cannot look up are
+    # remembered for chat_member_negative_ttl seconds, lookups slower than chat_member_timeout fall back to plain names
+    chat_member_cache_size: int = 10000
+    chat_member_ttl: float = 3600.0
+    chat_member_negative_ttl: float = 300.0
+    chat_member_timeout: float = 1.0
+    # Width of the hashed bag-of-words vectors vacancies are ranked by, see VacancyRanker
+    ranker_features: int = 1024
+    # Vacancies recommended to a seeker, kept per seeker until their portfolio changes
+    recommendations_limit: int = 200
+    recommendations_cache_size: int = 1000
+    recommendations_cache_ttl: float = 3600.0
     
     class Config:
         env_file = ".env"
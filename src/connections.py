@@ -1,271 +1,973 @@
 import logging
+import math
+import threading
 import time
-from typing import Optional, Union, Dict, Any
+from contextlib import contextmanager
+from typing import Optional, Union, Dict, Any, Callable, Iterator
 
 import neo4j
 import psycopg2
+import psycopg2.errors
 import pymongo
 from bson import ObjectId
 import redis
 from psycopg2.extras import RealDictCursor, RealDictRow
+from psycopg2.pool import ThreadedConnectionPool, PoolError
+from redis.commands.core import Script
+from pymongo import UpdateOne
 from pymongo.collection import Collection
+from pymongo.database import Database
 from pymongo.errors import ConnectionFailure
 
+from src.metrics import StorageMetrics
 
-class PsqlConnection:
-    def __init__(self, db_host: str, db_name: str, db_user: str, db_pswd: str):
+
+class LazyConnection:
+    """
+    Base of the store connections. Nothing is dialed on construction: the connection is opened by
+    the first call that needs it (or explicitly with open), exactly once, even if several threads ask at the same time.
+    Subclasses implement _open, which should give up after connect_timeout seconds and raise on failure.
+    A failed open is retried by later calls, but not sooner than connect_timeout seconds after the failure,
+    so that a store which is down does not hold every call for the whole timeout
+    """
+    def __init__(self, connect_timeout: float):
+        self.connect_timeout = connect_timeout
+        self._open_lock = threading.Lock()
+        self._opened = False
+        self._retry_after = 0.0
+
+
+    def open(self) -> bool:
+        """
+        Returns True if the connection is open. Safe to call any number of times
+        """
+        if self._opened:
+            return True
+
+        with self._open_lock:
+            if self._opened:
+                return True
+            if time.monotonic() < self._retry_after:
+                return False
+
+            try:
+                self._open()
+                self._opened = True
+            except Exception as e:
+                logging.error("Error while opening connection in %s: %s", self.__class__.__name__, e)
+                self._retry_after = time.monotonic() + self.connect_timeout
+        return self._opened
+
+
+    def close(self):
+        with self._open_lock:
+            if not self._opened:
+                return
+            self._opened = False
+            try:
+                self._close()
+            except Exception as e:
+                logging.error("Error while closing connection in %s: %s", self.__class__.__name__, e)
+
+
+    def _open(self):
+        raise NotImplementedError
+
+
+    def _close(self):
+        raise NotImplementedError
+
+
+class PsqlConnection(LazyConnection):
+    def __init__(self, db_host: str, db_name: str, db_user: str, db_pswd: str,
+                 pool_min_size: int = 0, pool_max_size: int = 0, acquire_timeout: float = 5.0,
+                 health_check_interval: float = 30.0, connect_timeout: float = 10.0,
+                 metrics: Optional[StorageMetrics] = None):
+        """
+        pool_max_size > 0 switches the connection into pooled mode: every call checks out its own
+        connection and cursor, so concurrent handlers no longer queue on one shared cursor.
+        Otherwise a single connection with a shared cursor is used, as before.
+        pool_min_size connections are opened upfront and kept open while idle
+        """
+        super().__init__(connect_timeout)
+        self.metrics = metrics if metrics is not None else StorageMetrics()
         self.name = db_name
         self.host = db_host
         self.user = db_user
         self.password = db_pswd
         self.conn = None
         self.cur = None
+        # The cursor is shared, so calls coming from different storage workers must take turns
+        self._lock = threading.Lock()
+
+        self.pool_min_size = pool_min_size
+        self.pool_max_size = pool_max_size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self._pool: Optional[ThreadedConnectionPool] = None
+        # ThreadedConnectionPool fails immediately once exhausted, the semaphore lets callers wait instead
+        self._pool_slots: Optional[threading.BoundedSemaphore] = None
+        self._last_checked: dict[int, float] = {}
+
+        # Registry of named prepared statements and the statements already prepared on each connection
+        self._prepared_statements: dict[str, str] = {}
+        self._prepared_on: dict[int, set[str]] = {}
+
+
+    def _open(self):
+        logging.info("Opening PsqlDatabase connection with %s", self.name)
+        # libpq only accepts whole seconds
+        connect_timeout = max(1, math.ceil(self.connect_timeout))
+        self._prepared_on.clear()
+        if self.pool_max_size > 0:
+            self._pool = ThreadedConnectionPool(self.pool_min_size, self.pool_max_size, host=self.host,
+                                                dbname=self.name, user=self.user, password=self.password,
+                                                connect_timeout=connect_timeout)
+            self._pool_slots = threading.BoundedSemaphore(self.pool_max_size)
+            return
+
+        self.conn = psycopg2.connect(host=self.host, dbname=self.name, user=self.user, password=self.password,
+                                     connect_timeout=connect_timeout)
+        self.conn.autocommit = True
+        self.cur = self.conn.cursor(cursor_factory=RealDictCursor) # Use dict-only access to query result
         
+        
+    def _close(self):
+        logging.info("Closing PsqlDatabase connection with %s", self.name)
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
+            return
+
+        self.cur.close()
+        self.conn.close()
+        self.cur = None
+        self.conn = None
+
+
+    def is_open(self) -> bool:
+        return self._pool is not None or self.cur is not None
+
+
+    @contextmanager
+    def _checkout(self):
+        """
+        Yields a cursor for a single call. In pooled mode the connection is checked out of the pool,
+        health checked and returned (or discarded if it turned out to be broken) afterwards
+        """
+        if self._pool is None:
+            with self._lock:
+                yield self.cur
+            return
 
-    def open(self):
+        if not self._pool_slots.acquire(timeout=self.acquire_timeout):
+            raise PoolError(f"Timed out after {self.acquire_timeout}s waiting for a connection to {self.name}")
+
+        conn = None
+        broken = False
         try:
-            logging.info(f"Opening PsqlDatabase connection with {self.name}")
-            self.conn = psycopg2.connect(host=self.host, dbname=self.name, user=self.user, password=self.password)
-            self.conn.autocommit = True
-            self.cur = self.conn.cursor(cursor_factory=RealDictCursor) # Use dict-only access to query result
-        except (Exception, psycopg2.DatabaseError) as e:
-            logging.error("Error while opening connection in %s: %s" % (self.__class__.__name__, e))
-        
-        
-    def close(self):
-        logging.info(f"Closing PsqlDatabase connection with {self.name}")
+            conn = self._get_healthy_connection()
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                yield cur
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            if conn is not None:
+                self._release_connection(conn, discard=broken or conn.closed != 0)
+            self._pool_slots.release()
+
+
+    @contextmanager
+    def transaction(self):
+        """
+        Yields a cursor whose statements all run on one connection inside one transaction.
+        The transaction is committed when the block exits and rolled back if it raises.
+        Unlike the execute_* methods, errors are not swallowed
+        """
+        if not self.open():
+            raise ConnectionError(f"PsqlDatabase connection with {self.name} is not open")
+
+        with self.metrics.track("postgres", "transaction"), self._checkout() as cur:
+            cur.execute("BEGIN")
+            try:
+                yield cur
+            except BaseException:
+                try:
+                    cur.execute("ROLLBACK")
+                except psycopg2.Error as e:
+                    logging.error("Error while rolling back transaction in %s: %s", self.__class__.__name__, e)
+                raise
+            cur.execute("COMMIT")
+
+
+    def _get_healthy_connection(self):
+        conn = self._pool.getconn()
+        if conn.closed == 0 and self._is_healthy(conn):
+            return conn
+
+        logging.warning("Discarding broken connection from %s pool", self.name)
+        self._release_connection(conn, discard=True)
+        conn = self._pool.getconn()
+        conn.autocommit = True
+        self._last_checked[id(conn)] = time.monotonic()
+        return conn
+
+
+    def _is_healthy(self, conn) -> bool:
+        """
+        Pings the connection if it was not used for health_check_interval seconds
+        """
+        now = time.monotonic()
+        last_checked = self._last_checked.get(id(conn))
+        if last_checked is not None and now - last_checked < self.health_check_interval:
+            return True
+
         try:
-            self.cur.close()
-            self.conn.close()
-        except Exception as e:
-            logging.error("Error while closing connection in %s: %s" % (self.__class__.__name__, e))
-            
+            if not conn.autocommit:
+                conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+        except psycopg2.Error:
+            return False
+
+        self._last_checked[id(conn)] = now
+        return True
+
+
+    def _release_connection(self, conn, discard: bool = False):
+        conn_id = id(conn)
+        self._pool.putconn(conn, close=discard)
+        # The pool also closes returned connections on its own once pool_min_size of them are idle.
+        # Ids of closed connections can be reused, so their bookkeeping has to go
+        if conn.closed != 0:
+            self._last_checked.pop(conn_id, None)
+            self._prepared_on.pop(conn_id, None)
+        else:
+            self._last_checked[conn_id] = time.monotonic()
+
 
     def execute_query(self, query: str, *args) -> (list[RealDictRow] | None):
-        if self.cur is not None:
+        if self.open():
             try:
-                self.cur.execute(query, args)
+                with self.metrics.track("postgres", self.metrics.sql_query_name(query)) as tracked, \
+                        self._checkout() as cur:
+                    cur.execute(query, args)
 
-                # Check if there are results to fetch. If desc is none - there is no results
-                if self.cur.description is None:
-                    return None
+                    # Check if there are results to fetch. If desc is none - there is no results
+                    if cur.description is None:
+                        return None
 
-                result = self.cur.fetchall()
+                    result = cur.fetchall()
+                    tracked.set_rows(len(result))
                 return None if len(result) == 0 else result
             except Exception as e:
-                logging.error(f"Error while executing query {query} in {self.__class__.__name__}: {e}")
+                logging.error("Error while executing query %s in %s: %s", query, self.__class__.__name__, e)
         else:
-            logging.warning("PsqlDatabase failed to execute query on %s" % self.name)
+            logging.warning("PsqlDatabase failed to execute query on %s", self.name)
             return None
 
 
     def execute_query_fetchone(self, query: str, *args) -> (RealDictRow | None):
-        if self.cur is not None:
+        if self.open():
+            try:
+                with self.metrics.track("postgres", self.metrics.sql_query_name(query)) as tracked, \
+                        self._checkout() as cur:
+                    cur.execute(query, args)
+
+                    # Check if there are results to fetch. If desc is none - there is no results
+                    if cur.description is None:
+                        return None
+
+                    result = cur.fetchone()
+                    tracked.set_rows(int(result is not None))
+                return result
+            except Exception as e:
+                logging.error("Error while executing query %s in %s: %s", query, self.__class__.__name__, e)
+        else:
+            logging.warning("PsqlDatabase failed to execute query on %s", self.name)
+            return None
+
+
+    def execute_prepared(self, name: str, query: str, *args) -> (list[RealDictRow] | None):
+        """
+        Same as execute_query, but runs the query as a named prepared statement, so its plan is reused.
+        The query must use $1, $2, ... placeholders. It is registered under name on first use and
+        prepared lazily on every connection it is executed on
+        """
+        if self.open():
             try:
-                self.cur.execute(query, args)
+                with self.metrics.track("postgres", name) as tracked, self._checkout() as cur:
+                    self._execute_prepared(cur, name, query, args)
+
+                    if cur.description is None:
+                        return None
+
+                    result = cur.fetchall()
+                    tracked.set_rows(len(result))
+                return None if len(result) == 0 else result
+            except Exception as e:
+                logging.error("Error while executing prepared statement %s in %s: %s", name, self.__class__.__name__, e)
+        else:
+            logging.warning("PsqlDatabase failed to execute query on %s", self.name)
+            return None
 
-                # Check if there are results to fetch. If desc is none - there is no results
-                if self.cur.description is None:
-                    return None
 
-                result = self.cur.fetchone()
+    def execute_prepared_fetchone(self, name: str, query: str, *args) -> (RealDictRow | None):
+        """
+        Same as execute_prepared, but fetches a single row
+        """
+        if self.open():
+            try:
+                with self.metrics.track("postgres", name) as tracked, self._checkout() as cur:
+                    self._execute_prepared(cur, name, query, args)
+
+                    if cur.description is None:
+                        return None
+
+                    result = cur.fetchone()
+                    tracked.set_rows(int(result is not None))
                 return result
             except Exception as e:
-                logging.error(f"Error while executing query {query} in {self.__class__.__name__}: {e}")
+                logging.error("Error while executing prepared statement %s in %s: %s", name, self.__class__.__name__, e)
         else:
-            logging.warning("PsqlDatabase failed to execute query on %s" % self.name)
+            logging.warning("PsqlDatabase failed to execute query on %s", self.name)
             return None
 
 
-class Neo4jConnection:
-    def __init__(self, host: str, user: str, password: str, port: int = 7687):
+    def _execute_prepared(self, cur, name: str, query: str, args: tuple):
+        registered_query = self._prepared_statements.setdefault(name, query)
+        assert registered_query == query, f"Prepared statement {name} is already registered with another query"
+
+        prepared = self._prepared_on.setdefault(id(cur.connection), set())
+        if name not in prepared:
+            try:
+                cur.execute(f"PREPARE {name} AS {query}")
+            except psycopg2.errors.DuplicatePreparedStatement:
+                pass
+            prepared.add(name)
+
+        if len(args) == 0:
+            cur.execute(f"EXECUTE {name}")
+        else:
+            cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(args))})", args)
+
+
+class Neo4jConnection(LazyConnection):
+    def __init__(self, host: str, user: str, password: str, port: int = 7687, connect_timeout: float = 60.0,
+                 metrics: Optional[StorageMetrics] = None):
+        super().__init__(connect_timeout)
+        self.metrics = metrics if metrics is not None else StorageMetrics()
         self._driver: Optional[neo4j.Driver] = None
         self.host = host
         self.user = user
         self.password = password
         self.port = port
+        # Session of each storage thread, see _session. All of them, to be closed along with the driver
+        self._local = threading.local()
+        self._sessions_lock = threading.Lock()
+        self._sessions: list[neo4j.Session] = []
 
 
     def _internal_connect(self) -> bool:
         """
         Return True if was able to connect successfully, otherwise - False
         """
-        start_time = time.time()
-        timeout = 60  # Timeout in seconds
+        deadline = time.monotonic() + self.connect_timeout
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
 
-        while time.time() - start_time < timeout:
             try:
                 uri = f"bolt://{self.host}:{self.port}"
-                logging.info(f"Attempting to connect to neo4j database with uri {uri}")
-                driver = neo4j.GraphDatabase.driver(uri=uri, auth=(self.user, self.password))
+                logging.info("Attempting to connect to neo4j database with uri %s", uri)
+                driver = neo4j.GraphDatabase.driver(uri=uri, auth=(self.user, self.password),
+                                                    connection_timeout=remaining)
                 driver.verify_connectivity()
                 self._driver = driver
                 logging.info("Successfully connected to the Neo4j database.")
                 return True
             except Exception as e:
-                logging.error(f"Connection failed: {e}")
-                time.sleep(5)  # Wait for 5 seconds before retrying
+                logging.error("Connection failed: %s", e)
+                # Wait for 5 seconds before retrying, but never past the deadline
+                time.sleep(max(0.0, min(5.0, deadline - time.monotonic())))
 
         logging.error("Failed to connect to the Neo4j database within the timeout period.")
         return False
 
 
-    def open(self):
+    def _open(self):
         if not self._internal_connect():
-            logging.error("Error while opening connection in %s", (self.__class__.__name__))
-        else:
-            logging.info("Successfully initialized Neo4j connection")
+            raise ConnectionError(f"could not connect to {self.host}:{self.port} within {self.connect_timeout}s")
+        logging.info("Successfully initialized Neo4j connection")
 
 
-    def close(self):
+    def _close(self):
+        logging.info("Closing neo4j connection for %s", self.host)
+        with self._sessions_lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
+        self._driver.close()
+        self._driver = None
+
+
+    @contextmanager
+    def _session(self) -> Iterator[neo4j.Session]:
+        """
+        Session of the calling thread, reused by all of its queries and transactions instead of opening one per call.
+        A session only borrows a pooled connection while a query or transaction runs, so idle ones hold none,
+        and its bookmarks let every call see the writes of the previous ones. A session that failed is replaced
+        """
+        driver = self._driver
+        session = getattr(self._local, "session", None)
+        if session is None or self._local.driver is not driver or session.closed():
+            session = driver.session()
+            self._local.session, self._local.driver = session, driver
+            with self._sessions_lock:
+                self._sessions.append(session)
+
         try:
-            logging.info("Closing neo4j connection for ")
-            self._driver.close()
-        except Exception as e:
-            logging.error("Error while closing connection in %s: %s" % (self.__class__.__name__, e))
+            yield session
+        except Exception:
+            self._local.session = None
+            with self._sessions_lock:
+                if session in self._sessions:
+                    self._sessions.remove(session)
+            session.close()
+            raise
 
 
     def run_query(self, query, parameters=None):
+        if not self.open():
+            return None
+
         try:
-            with self._driver.session() as session:
-                result = session.run(query, parameters)
-                return result.data()
+            with self.metrics.track("neo4j", self.metrics.cypher_query_name(query)) as tracked, \
+                    self._session() as session:
+                data = session.run(query, parameters).data()
+                tracked.set_rows(len(data))
+                return data
         except Exception as e:
-            logging.error(f"Error while executing query %s in %s: %s" % (query, self.__class__.__name__, e))
+            logging.error("Error while executing query %s in %s: %s", query, self.__class__.__name__, e)
 
 
-class RedisConnection:
-    def __init__(self, host: str, pswd: str):
-        self.host = host
-        self.password = pswd
-        self.conn: Optional[redis.Redis] = None
+    def run_transaction(self, statements: list[tuple[str, (dict | None)]],
+                        query_name: Optional[str] = None) -> (list[list[dict]] | None):
+        """
+        Runs all statements on one session inside one managed write transaction,
+        which the driver retries as a whole on transient errors.
+        Returns the data of every statement in order, or None if the transaction failed.
+        Metrics are recorded under query_name, which defaults to the name of the first statement
+        """
+        def work(tx: neo4j.ManagedTransaction) -> list[list[dict]]:
+            return [tx.run(query, parameters).data() for query, parameters in statements]
 
+        if not self.open():
+            return None
+
+        if query_name is None:
+            query_name = self.metrics.cypher_query_name(statements[0][0]) if statements else "transaction"
 
-    def open(self):
         try:
-            logging.info(f"Opening Redis connection for host {self.host}")
-            self.connection = redis.Redis(host=self.host, password=self.password)
+            with self.metrics.track("neo4j", query_name) as tracked, self._session() as session:
+                results = session.execute_write(work)
+                tracked.set_rows(sum(len(result) for result in results))
+                return results
         except Exception as e:
-            logging.error("Error while opening connection in %s: %s" % (self.__class__.__name__, e))
+            logging.error("Error while executing transaction of %d statements in %s: %s",
+                          len(statements), self.__class__.__name__, e)
+            return None
 
 
-    def close(self):
-        try:
-            self.conn.close()
-            print("Disconnected from Redis")
-        except Exception as e:
-            logging.error("Error while closing connection in %s: %s" % (self.__class__.__name__, e))
+    def run_batch(self, query: str, rows: list[dict], batch_size: int = 1000) -> (list[dict] | None):
+        """
+        Runs query once per batch of rows using UNWIND, all batches within one transaction.
+        The query refers to the current parameter map as `row`, e.g. "MATCH (v:Vacancy {vacancy_id: row.vacancy_id})"
+        Returns the concatenated data of all batches, or None if the transaction failed
+        """
+        if len(rows) == 0:
+            return []
+
+        unwind_query = "UNWIND $rows AS row " + query
+        statements = [(unwind_query, {"rows": rows[i:i + batch_size]}) for i in range(0, len(rows), batch_size)]
+        results = self.run_transaction(statements, "unwind:" + self.metrics.cypher_query_name(query))
+        if results is None:
+            return None
+
+        return [record for result in results for record in result]
+
+
+class RedisConnection(LazyConnection):
+    def __init__(self, host: str, pswd: str, connect_timeout: float = 10.0, metrics: Optional[StorageMetrics] = None):
+        super().__init__(connect_timeout)
+        self.metrics = metrics if metrics is not None else StorageMetrics()
+        self.host = host
+        self.password = pswd
+        self.connection: Optional[redis.Redis] = None
+        # Lua scripts registered with the client by their source, see run_script
+        self._scripts: dict[str, Script] = {}
+
+
+    def _open(self):
+        logging.info("Opening Redis connection for host %s", self.host)
+        self.connection = redis.Redis(host=self.host, password=self.password,
+                                      socket_connect_timeout=self.connect_timeout)
+        self.connection.ping()
+
+
+    def _close(self):
+        self.connection.close()
+        self.connection = None
+        self._scripts = {}
+        logging.info("Disconnected from Redis")
+
+
+    def _client(self) -> redis.Redis:
+        if not self.open():
+            raise ConnectionError(f"Redis connection to {self.host} is not open")
+        return self.connection
 
 
     def get(self, key: str) -> (str | bytes | None):
         try:
-            value = self.connection.get(key)
-            logging.info(f"Retrieved value for {key} from Redis: {value}")
+            with self.metrics.track("redis", self.metrics.redis_key_name("get", key)):
+                value = self._client().get(key)
+            logging.debug("Retrieved value for %s from Redis", key)
             return value
         except Exception as e:
-            logging.error(f"Error getting value for {key} from Redis: {e}")
+            logging.error("Error getting value for %s from Redis: %s", key, e)
             return None
 
 
     def set(self, key: str, value: (str | bytes | int | float)):
         try:
-            self.connection.set(key, value)
-            logging.info(f"Set {key} to {value} in Redis")
+            with self.metrics.track("redis", self.metrics.redis_key_name("set", key)):
+                self._client().set(key, value)
+            logging.debug("Set %s in Redis", key)
         except Exception as e:
-            logging.error(f"Error setting {key} in Redis: {e}")
+            logging.error("Error setting %s in Redis: %s", key, e)
 
 
     def increment(self, key: str):
         try:
-            self.connection.incr(key)
-            logging.info(f"Incremented value for {key} in Redis")
+            with self.metrics.track("redis", self.metrics.redis_key_name("incr", key)):
+                self._client().incr(key)
+            logging.debug("Incremented value for %s in Redis", key)
         except Exception as e:
-            logging.error(f"Error incrementing value for {key} in Redis: {e}")
+            logging.error("Error incrementing value for %s in Redis: %s", key, e)
 
 
     def decrement(self, key: str):
         try:
-            self.connection.decr(key)
-            logging.info(f"Decremented value for {key} in Redis")
+            with self.metrics.track("redis", self.metrics.redis_key_name("decr", key)):
+                self._client().decr(key)
+            logging.debug("Decremented value for %s in Redis", key)
+        except Exception as e:
+            logging.error("Error decrementing value for %s in Redis: %s", key, e)
+
+
+    def delete(self, *keys: str):
+        try:
+            with self.metrics.track("redis", self.metrics.redis_key_name("del", keys[0] if keys else "")):
+                self._client().delete(*keys)
+            logging.debug("Deleted %s from Redis", keys)
+        except Exception as e:
+            logging.error("Error deleting %s from Redis: %s", keys, e)
+
+
+    def hset(self, key: str, mapping: dict[str, (str | bytes | int | float)]):
+        try:
+            with self.metrics.track("redis", self.metrics.redis_key_name("hset", key)):
+                self._client().hset(key, mapping=mapping)
+            logging.debug("Set fields %s of hash %s in Redis", list(mapping), key)
+        except Exception as e:
+            logging.error("Error setting hash %s in Redis: %s", key, e)
+
+
+    def hgetall(self, key: str) -> (dict[bytes, bytes] | None):
+        try:
+            with self.metrics.track("redis", self.metrics.redis_key_name("hgetall", key)):
+                value = self._client().hgetall(key)
+            logging.debug("Retrieved hash %s from Redis", key)
+            return value
+        except Exception as e:
+            logging.error("Error getting hash %s from Redis: %s", key, e)
+            return None
+
+
+    def hmget(self, key: str, fields: list[str]) -> (list[bytes | None] | None):
+        try:
+            with self.metrics.track("redis", self.metrics.redis_key_name("hmget", key)):
+                return self._client().hmget(key, fields)
+        except Exception as e:
+            logging.error("Error getting fields %s of hash %s from Redis: %s", fields, key, e)
+            return None
+
+
+    def hgetall_many(self, keys: list[str]) -> (list[dict[bytes, bytes]] | None):
+        """
+        Reads all hashes with a single pipelined round trip. Results are in the order of keys
+        """
+        try:
+            with self.metrics.track("redis", self.metrics.redis_key_name("pipeline_hgetall", keys[0] if keys else "")) as tracked:
+                pipeline = self._client().pipeline(transaction=False)
+                for key in keys:
+                    pipeline.hgetall(key)
+                hashes = pipeline.execute()
+                tracked.set_rows(len(hashes))
+                return hashes
+        except Exception as e:
+            logging.error("Error getting %d hashes from Redis: %s", len(keys), e)
+            return None
+
+
+    def hincrby(self, key: str, field: str, amount: int = 1) -> (int | None):
+        try:
+            with self.metrics.track("redis", self.metrics.redis_key_name("hincrby", key)):
+                value = self._client().hincrby(key, field, amount)
+            logging.debug("Incremented %s of hash %s by %d in Redis", field, key, amount)
+            return value
+        except Exception as e:
+            logging.error("Error incrementing %s of hash %s in Redis: %s", field, key, e)
+            return None
+
+
+    def run_script(self, script: str, keys: list[str], args: Optional[list] = None) -> Any:
+        """
+        Runs the Lua script atomically on keys. The script is sent once, later calls only send its SHA1 (EVALSHA).
+        Returns its result, None if it failed
+        """
+        try:
+            with self.metrics.track("redis", self.metrics.redis_key_name("evalsha", keys[0] if keys else "")):
+                registered = self._scripts.get(script)
+                if registered is None:
+                    registered = self._scripts[script] = self._client().register_script(script)
+                return registered(keys=keys, args=args or [])
+        except Exception as e:
+            logging.error("Error running script on %s in Redis: %s", keys, e)
+            return None
+
+
+    def scan_keys(self, pattern: str) -> (list[bytes] | None):
+        """
+        Returns all keys matching pattern, iterated with SCAN so that Redis is not blocked meanwhile
+        """
+        try:
+            with self.metrics.track("redis", self.metrics.redis_key_name("scan", pattern)) as tracked:
+                keys = list(self._client().scan_iter(match=pattern, count=1000))
+                tracked.set_rows(len(keys))
+            return keys
+        except Exception as e:
+            logging.error("Error scanning keys %s in Redis: %s", pattern, e)
+            return None
+
+
+    def expire(self, keys: list[str], ttl: int):
+        """
+        Sets the time to live (in seconds) of all keys with a single pipelined round trip
+        """
+        try:
+            with self.metrics.track("redis", self.metrics.redis_key_name("pipeline_expire", keys[0] if keys else "")):
+                pipeline = self._client().pipeline(transaction=False)
+                for key in keys:
+                    pipeline.expire(key, ttl)
+                pipeline.execute()
+        except Exception as e:
+            logging.error("Error setting time to live of %s in Redis: %s", keys, e)
+
+
+    def zreplace(self, key: str, members: dict[str, float], ttl: int, batch_size: int = 1000) -> bool:
+        """
+        Atomically replaces the sorted set at key with members (mapped to their scores) expiring in ttl seconds.
+        Members are sent batch_size per ZADD, all in one MULTI/EXEC round trip
+        """
+        try:
+            with self.metrics.track("redis", self.metrics.redis_key_name("zreplace", key)) as tracked:
+                pipeline = self._client().pipeline(transaction=True)
+                pipeline.delete(key)
+                items = list(members.items())
+                for i in range(0, len(items), batch_size):
+                    pipeline.zadd(key, dict(items[i:i + batch_size]))
+                pipeline.expire(key, ttl)
+                pipeline.execute()
+                tracked.set_rows(len(items))
+            return True
+        except Exception as e:
+            logging.error("Error replacing sorted set %s in Redis: %s", key, e)
+            return False
+
+
+    def zfilter(self, destination: str, source: str, members: list[str], ttl: int) -> (int | None):
+        """
+        Stores the members of the sorted set source that are among members (with their scores in source)
+        into the sorted set destination, expiring in ttl seconds. Returns the number of members stored
+        """
+        temporary_key = f"{destination}:members"
+        try:
+            with self.metrics.track("redis", self.metrics.redis_key_name("zfilter", destination)) as tracked:
+                pipeline = self._client().pipeline(transaction=True)
+                pipeline.delete(temporary_key)
+                for i in range(0, len(members), 1000):
+                    pipeline.zadd(temporary_key, dict.fromkeys(members[i:i + 1000], 0))
+                pipeline.zinterstore(destination, {source: 1, temporary_key: 0})
+                pipeline.delete(temporary_key)
+                pipeline.expire(destination, ttl)
+                stored = pipeline.execute()[-3]
+                tracked.set_rows(stored)
+            return stored
         except Exception as e:
-            logging.error(f"Error decrementing value for {key} in Redis: {e}")
+            logging.error("Error filtering sorted set %s into %s in Redis: %s", source, destination, e)
+            return None
+
+
+    def zrange_after(self, key: str, score: float, forward: bool, count: int) -> (list[bytes] | None):
+        """
+        Returns up to count members with scores right above (or, if not forward, right below) score,
+        ordered away from it. O(log n + count)
+        """
+        try:
+            with self.metrics.track("redis", self.metrics.redis_key_name("zrange", key)) as tracked:
+                if forward:
+                    members = self._client().zrange(key, f"({score}", "+inf", byscore=True, offset=0, num=count)
+                else:
+                    members = self._client().zrange(key, f"({score}", "-inf", desc=True, byscore=True,
+                                                    offset=0, num=count)
+                tracked.set_rows(len(members))
+            return members
+        except Exception as e:
+            logging.error("Error getting range of sorted set %s from Redis: %s", key, e)
+            return None
+
+
+    def publish(self, channel: str, message: (str | bytes)) -> bool:
+        try:
+            with self.metrics.track("redis", self.metrics.redis_key_name("publish", channel)):
+                self._client().publish(channel, message)
+            return True
+        except Exception as e:
+            logging.error("Error publishing to Redis channel %s: %s", channel, e)
+            return False
+
+
+    def subscribe(self, channel: str, handler: Callable[[bytes], None]) -> Optional[threading.Thread]:
+        """
+        Calls handler with the data of every message published to channel, on a daemon thread, which is returned
+        (stop it with its stop method). Messages published while the connection is broken are lost
+        """
+        def on_message(message: dict):
+            try:
+                handler(message["data"])
+            except Exception as e:
+                logging.error("Error handling message from Redis channel %s: %s", channel, e)
 
-class MongoDBConnection:
-    def __init__(self, host:str, user:str, password:str, db_name: str):
+        def on_error(e: Exception, pubsub, thread):
+            logging.error("Error listening to Redis channel %s: %s", channel, e)
+            time.sleep(1.0)
+
+        try:
+            pubsub = self._client().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{channel: on_message})
+            thread = pubsub.run_in_thread(sleep_time=1.0, daemon=True, exception_handler=on_error)
+            logging.info("Subscribed to Redis channel %s", channel)
+            return thread
+        except Exception as e:
+            logging.error("Error subscribing to Redis channel %s: %s", channel, e)
+            return None
+
+
+class MongoDBConnection(LazyConnection):
+    def __init__(self, host:str, user:str, password:str, db_name: str, connect_timeout: float = 10.0,
+                 metrics: Optional[StorageMetrics] = None):
+        super().__init__(connect_timeout)
+        self.metrics = metrics if metrics is not None else StorageMetrics()
         self.host = host
         self.user = user
         self.password = password
         self.db_name = db_name
         self.client: Optional[pymongo.MongoClient] = None
-        self.db: Optional[pymongo.mongo_client.Database] = None
+        self.db: Optional[Database] = None
 
 
-    def open(self):
+    def _open(self):
+        uri = f"mongodb://{self.user}:{self.password}@{self.host}:27017"
+        logging.info("Opening MongoDB connection with host %s", self.host)
+        timeout_ms = int(self.connect_timeout * 1000)
+        self.client = pymongo.MongoClient(uri, connectTimeoutMS=timeout_ms, serverSelectionTimeoutMS=timeout_ms)
         try:
-            uri = f"mongodb://{self.user}:{self.password}@{self.host}:27017"
-            logging.info(f"Opening MongoDB connection with URI: {uri}")
-            self.client = pymongo.MongoClient(uri)
-            self.db = self.client[self.db_name]
-        except (Exception, ConnectionFailure) as e:
-            logging.error("Error while opening connection in %s: %s" % (self.__class__.__name__, e))
+            self.client.admin.command("ping")
+        except ConnectionFailure:
+            self.client.close()
+            self.client = None
+            raise
+        self.db = self.client[self.db_name]
 
 
-    def close(self):
-        try:
-            logging.info(f"Closing MongoDB connection with DB {self.db_name}")
-            self.client.close()
-        except Exception as e:
-            logging.error("Error while closing connection in %s: %s" % (self.__class__.__name__, e))
+    def _close(self):
+        logging.info("Closing MongoDB connection with DB %s", self.db_name)
+        self.client.close()
+        self.client = None
+        self.db = None
+
+
+    def _database(self) -> Database:
+        if not self.open():
+            raise ConnectionError(f"MongoDB connection to {self.host} is not open")
+        return self.db
 
 
     def insert_document(self, collection_name: str, document: Dict[str, Any]) -> (str | None):
         try:
-            collection = self.db[collection_name]
-            result = collection.insert_one(document)
-            logging.info(f"Inserted document with ID: {result.inserted_id}")
+            collection = self._database()[collection_name]
+            with self.metrics.track("mongodb", f"insert_one:{collection_name}") as tracked:
+                result = collection.insert_one(document)
+                tracked.set_rows(1)
+            logging.debug("Inserted document with ID: %s", result.inserted_id)
             return str(result.inserted_id)
         except Exception as e:
-            logging.error(f"Error inserting document {document} into MongoDB: {e}")
+            logging.error("Error inserting document into MongoDB collection %s: %s", collection_name, e)
             return None
 
 
     def get_document(self, collection_name: str, doc_id: str) -> (Dict[str, Any] | None):
         try:
-            collection = self.db[collection_name]
-            document = collection.find_one({"_id": ObjectId(doc_id)})
+            collection = self._database()[collection_name]
+            with self.metrics.track("mongodb", f"find_one:{collection_name}") as tracked:
+                document = collection.find_one({"_id": ObjectId(doc_id)})
+                tracked.set_rows(int(document is not None))
             if document:
                 # print(f"Retrieved document with ID {doc_id} from MongoDB: {document}")
                 pass
             else:
-                logging.error(f"Failed to retrieve document with ID {doc_id} from MongoDB!")
+                logging.error("Failed to retrieve document with ID %s from MongoDB!", doc_id)
                 
             return document
         except Exception as e:
-            logging.error(f"Error getting document from MongoDB: {e}")
+            logging.error("Error getting document from MongoDB: %s", e)
             return None
 
 
     def update_document(self, collection_name: str, doc_id: str, document: Dict[str, Any]) -> bool:
-        collection: Collection = self.db[collection_name]
+        collection: Collection = self._database()[collection_name]
         filter_condition = {"_id": ObjectId(doc_id)}
-        result = collection.update_one(filter=filter_condition, update={"$set": document})
+        with self.metrics.track("mongodb", f"update_one:{collection_name}") as tracked:
+            result = collection.update_one(filter=filter_condition, update={"$set": document})
+            tracked.set_rows(result.modified_count)
         return True if (result.acknowledged 
             and result.matched_count > 0 
             and result.modified_count > 0) else False
 
     def delete_document(self, collection_name: str, doc_id: str) -> bool:
         try:
-            collection: Collection = self.db[collection_name]
-            result = collection.delete_one({"_id": ObjectId(doc_id)})
+            collection: Collection = self._database()[collection_name]
+            with self.metrics.track("mongodb", f"delete_one:{collection_name}") as tracked:
+                result = collection.delete_one({"_id": ObjectId(doc_id)})
+                tracked.set_rows(result.deleted_count)
             return result.deleted_count > 0
         except Exception as e:
-            logging.error(f"Error deleting document with ID {doc_id} from MongoDB: {e}")
+            logging.error("Error deleting document with ID %s from MongoDB: %s", doc_id, e)
             return False
 
 
     def find(self, collection_name: str, doc_ids: list[str]) -> list[dict[str, Any]]:
-        collection: Collection = self.db[collection_name]
+        collection: Collection = self._database()[collection_name]
 
         object_ids = [ObjectId(doc_id) for doc_id in doc_ids]
-        documents = list(collection.find({"_id": {"$in": object_ids}}))
-        return documents
\ No newline at end of file
+        with self.metrics.track("mongodb", f"find:{collection_name}") as tracked:
+            documents = list(collection.find({"_id": {"$in": object_ids}}))
+            tracked.set_rows(len(documents))
+        return documents
+
+
+    def find_documents(self, collection_name: str, query: dict[str, Any], projection: (dict[str, Any] | None) = None,
+                       sort: (list[tuple[str, int]] | None) = None, limit: int = 0) -> list[dict[str, Any]]:
+        """
+        Fetches documents matching query, optionally sorted and limited (0 means no limit)
+        """
+        try:
+            collection: Collection = self._database()[collection_name]
+            with self.metrics.track("mongodb", f"find_documents:{collection_name}") as tracked:
+                cursor = collection.find(query, projection, limit=limit)
+                if sort is not None:
+                    cursor = cursor.sort(sort)
+                documents = list(cursor)
+                tracked.set_rows(len(documents))
+            return documents
+        except Exception as e:
+            logging.error("Error finding documents in MongoDB collection %s: %s", collection_name, e)
+            return []
+
+
+    def update_documents(self, collection_name: str, documents: dict[str, dict[str, Any]]) -> int:
+        """
+        Sets fields of many documents (keyed by their ids) with a single bulk write.
+        Returns the number of modified documents
+        """
+        if len(documents) == 0:
+            return 0
+
+        try:
+            collection: Collection = self._database()[collection_name]
+            requests = [UpdateOne({"_id": ObjectId(doc_id)}, {"$set": fields}) for doc_id, fields in documents.items()]
+            with self.metrics.track("mongodb", f"bulk_update:{collection_name}") as tracked:
+                result = collection.bulk_write(requests, ordered=False)
+                tracked.set_rows(result.modified_count)
+            return result.modified_count
+        except Exception as e:
+            logging.error("Error updating documents in MongoDB collection %s: %s", collection_name, e)
+            return 0
+
+
+    def create_index(self, collection_name: str, keys: list[tuple[str, int]], **kwargs) -> (str | None):
+        try:
+            return self._database()[collection_name].create_index(keys, **kwargs)
+        except Exception as e:
+            logging.error("Error creating index %s in MongoDB collection %s: %s", keys, collection_name, e)
+            return None
+
+
+    def find_many(self, collection_name: str, doc_ids: list[str], projection: (dict[str, Any] | None) = None,
+                  batch_size: int = 500) -> dict[str, dict[str, Any]]:
+        """
+        Fetches documents by ids, issuing one $in query per batch_size ids.
+        Returns documents keyed by their string id, in the order the ids were requested.
+        Ids without a document are left out
+        """
+        try:
+            collection: Collection = self._database()[collection_name]
+            # Deduplicate, but keep the requested order
+            unique_ids = list(dict.fromkeys(str(doc_id) for doc_id in doc_ids))
+
+            found: dict[str, dict[str, Any]] = {}
+            with self.metrics.track("mongodb", f"find_many:{collection_name}") as tracked:
+                for i in range(0, len(unique_ids), batch_size):
+                    object_ids = [ObjectId(doc_id) for doc_id in unique_ids[i:i + batch_size]]
+                    for document in collection.find({"_id": {"$in": object_ids}}, projection):
+                        found[str(document["_id"])] = document
+                tracked.set_rows(len(found))
+
+            return {doc_id: found[doc_id] for doc_id in unique_ids if doc_id in found}
+        except Exception as e:
+            logging.error("Error finding documents in MongoDB collection %s: %s", collection_name, e)
+            return {}
+
+
+    def scan_documents(self, collection_name: str, query: dict[str, Any], projection: (dict[str, Any] | None) = None,
+                       sort: (list[tuple[str, int]] | None) = None, batch_size: int = 1000) -> Iterator[dict[str, Any]]:
+        """
+        Streams documents matching query, fetching batch_size documents per round trip, so that whole
+        collections can be read without holding them in memory. Unlike other methods this one raises on errors,
+        since a scan that stopped half way must not pass for a complete one
+        """
+        collection: Collection = self._database()[collection_name]
+        with self.metrics.track("mongodb", f"scan:{collection_name}") as tracked:
+            cursor = collection.find(query, projection, batch_size=batch_size)
+            if sort is not None:
+                cursor = cursor.sort(sort)
+            scanned = 0
+            for document in cursor:
+                scanned += 1
+                yield document
+            tracked.set_rows(scanned)
@@ -22,6 +22,7 @@ class SeekerProfileKeyboardMarkup(SweetKeyboardMarkup):
         self._keyboard_buttons: dict[str, KeyboardButton] = {
             "edit_portfolio_button" : KeyboardButton(text="Edit Portfolio"),
             "search_vacancies_button" : KeyboardButton(text="Search Vacancies"),
+            "recommended_vacancies_button" : KeyboardButton(text="Recommended For You"),
             "back_button": KeyboardButton(text="Back ⬅️")
         }
         self.update_markup()
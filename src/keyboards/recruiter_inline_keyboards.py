@@ -128,9 +128,9 @@ class DeleteVacancyOrGoBackInlineKeyboardMarkup(SweetInlineKeyboardMarkup):
 
 
 class ApplicantsListDisplayInlineKeyboard(SweetInlineKeyboardMarkup):
-    def __init__(self, applicants_length: int):
+    def __init__(self, applicants_length: int, cur_applicant: int = 0):
         super().__init__()
-        self._cur_applicant: int = 0
+        self._cur_applicant: int = cur_applicant
         self._applicants_length: int = applicants_length
         self._keyboard_buttons: dict[str, InlineKeyboardButton] = {
             "previous_button": InlineKeyboardButton(text="Previous ⬅️", callback_data="back"),
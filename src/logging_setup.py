@@ -0,0 +1,82 @@
+import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import TextIO
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves formatting to the writer thread. The stock prepare merges the message
+    with its arguments in the calling thread, which is exactly the cost we want off the hot path.
+    Arguments are therefore formatted a little later than the call, which is fine for log output
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class CallSiteRateLimitFilter(logging.Filter):
+    """
+    Lets through at most max_records records per interval seconds from every call site (file and line).
+    Records of level WARNING and above always pass. The number of dropped records is appended
+    to the next record let through from the same call site
+    """
+    def __init__(self, max_records: int, interval: float):
+        super().__init__()
+        self.max_records = max_records
+        self.interval = interval
+        self._lock = threading.Lock()
+        # (pathname, lineno) -> [window start, records in window, records dropped]
+        self._call_sites: dict[tuple[str, int], list] = {}
+
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.max_records <= 0:
+            return True
+
+        now = time.monotonic()
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            call_site = self._call_sites.get(key)
+            if call_site is None:
+                call_site = self._call_sites[key] = [now, 0, 0]
+            elif now - call_site[0] >= self.interval:
+                call_site[0] = now
+                call_site[1] = 0
+
+            if call_site[1] >= self.max_records:
+                call_site[2] += 1
+                return False
+
+            call_site[1] += 1
+            dropped, call_site[2] = call_site[2], 0
+
+        if dropped > 0:
+            record.msg = f"{record.msg} [{dropped} similar messages suppressed]"
+        return True
+
+
+def setup_logging(level: int, stream: TextIO, max_records: int = 0, interval: float = 10.0) -> QueueListener:
+    """
+    Routes all records through a queue to a writer thread, so that logging call sites only enqueue.
+    max_records > 0 rate limits every call site to max_records per interval seconds.
+    The returned listener is already started and should be stopped on shutdown to flush the queue
+    """
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+
+    stream_handler = logging.StreamHandler(stream)
+    stream_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(CallSiteRateLimitFilter(max_records, interval))
+
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(queue_handler)
+    root_logger.setLevel(level)
+
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -2,8 +2,11 @@ import logging
 import asyncio
 import sys
 
-logging.basicConfig(level=logging.INFO, stream=sys.stdout)
-logging.getLogger().setLevel(logging.INFO)
+from config import cfg
+from logging_setup import setup_logging
+
+# Handlers only enqueue records, a background thread formats and writes them
+log_listener = setup_logging(logging.INFO, sys.stdout, cfg.log_rate_limit, cfg.log_rate_interval)
 
 from aiogram import Dispatcher
 
@@ -12,15 +15,34 @@ from routers.profile_router import profile_router
 from routers.seeker_router import seeker_router
 from routers.recruiter_router import recruiter_router
 from bot import bot
+from src.bot import chat_members
+from src.metrics import start_metrics_server
+from src.middlewares import UserLockMiddleware
+from src.sweet_home import sweet_connections
 
 
 dp = Dispatcher()
+# Updates of one user are handled one after another, as handlers mutate the profile of the user on storage threads
+dp.update.outer_middleware(UserLockMiddleware())
 dp.include_routers(entry_router, profile_router, seeker_router, recruiter_router)
 
 
 async def main() -> None:
-    await dp.start_polling(bot)
+    sweet_connections.metrics.register_cache("chat_members", chat_members.users)
+    sweet_connections.metrics.register_cache("missing_chat_members", chat_members.missing)
+    metrics_runner = await start_metrics_server(sweet_connections.metrics, cfg.metrics_host, cfg.metrics_port)
+    logging.info("Serving storage metrics on port %d", cfg.metrics_port)
+    # Importing the routers does not dial any database, all stores are opened here side by side
+    await asyncio.get_running_loop().run_in_executor(None, sweet_connections.open)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await metrics_runner.cleanup()
+        sweet_connections.close()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    try:
+        asyncio.run(main())
+    finally:
+        log_listener.stop()
@@ -0,0 +1,192 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from aiohttp import web
+
+from src.caches import TTLCache
+
+
+# Upper bounds (in seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_SQL_TABLE_REGEX = re.compile(r"\b(?:from|into|update|table(?:\s+if\s+not\s+exists)?|on)\s+(\w+)", re.IGNORECASE)
+_CYPHER_NAME_REGEX = re.compile(r"^\s*(\w+)\b.*?:(\w+)", re.DOTALL)
+
+
+class QueryStats:
+    """
+    Latency histogram, error counter and row counter of a single (store, query) pair
+    """
+    __slots__ = ("bucket_counts", "latency_sum", "count", "errors", "rows")
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.count = 0
+        self.errors = 0
+        self.rows = 0
+
+
+class TrackedCall:
+    """
+    Context manager returned by StorageMetrics.track. Records latency on exit and an error
+    if the block raised. The block may report how many rows or documents it returned with set_rows
+    """
+    __slots__ = ("_metrics", "_store", "_query", "_start", "_rows")
+
+    def __init__(self, metrics: 'StorageMetrics', store: str, query: str):
+        self._metrics = metrics
+        self._store = store
+        self._query = query
+        self._rows = 0
+
+
+    def set_rows(self, rows: int):
+        self._rows = rows
+
+
+    def __enter__(self) -> 'TrackedCall':
+        self._start = time.perf_counter()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        self._metrics.observe(self._store, self._query, time.perf_counter() - self._start,
+                              self._rows, failed=exc_type is not None)
+        return False
+
+
+class StorageMetrics:
+    """
+    In-process registry of storage call metrics, labelled by store and by a short query name.
+    Rendered in the Prometheus text exposition format
+    """
+    def __init__(self):
+        self._stats: dict[tuple[str, str], QueryStats] = {}
+        self._lock = threading.Lock()
+        self._sql_names: dict[str, str] = {}
+        self._caches: dict[str, TTLCache] = {}
+
+
+    def track(self, store: str, query: str) -> TrackedCall:
+        return TrackedCall(self, store, query)
+
+
+    def observe(self, store: str, query: str, seconds: float, rows: int = 0, failed: bool = False):
+        bucket = bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            stats = self._stats.get((store, query))
+            if stats is None:
+                stats = self._stats[(store, query)] = QueryStats()
+            stats.bucket_counts[bucket] += 1
+            stats.latency_sum += seconds
+            stats.count += 1
+            stats.rows += rows
+            if failed:
+                stats.errors += 1
+
+
+    def register_cache(self, name: str, cache: TTLCache):
+        """
+        Exposes hits, misses, evictions and size of cache under name
+        """
+        with self._lock:
+            self._caches[name] = cache
+
+
+    def sql_query_name(self, query: str) -> str:
+        """
+        Short name of an SQL query made of its verb and the first table, e.g. "select:vacancies".
+        Names are memoized by query text, since the same handful of queries is executed over and over
+        """
+        name = self._sql_names.get(query)
+        if name is not None:
+            return name
+
+        verb = query.split(None, 1)[0].lower() if query.strip() else "empty"
+        table = _SQL_TABLE_REGEX.search(query)
+        name = f"{verb}:{table.group(1).lower()}" if table is not None else verb
+        # Queries are not interpolated anymore, but the memo is still bounded for safety
+        if len(self._sql_names) < 1024:
+            self._sql_names[query] = name
+        return name
+
+
+    @staticmethod
+    def cypher_query_name(query: str) -> str:
+        """
+        Short name of a Cypher query made of its first clause and the first label, e.g. "match:Vacancy"
+        """
+        match = _CYPHER_NAME_REGEX.match(query)
+        if match is None:
+            return "cypher"
+        return f"{match.group(1).lower()}:{match.group(2)}"
+
+
+    @staticmethod
+    def redis_key_name(command: str, key: str) -> str:
+        """
+        Short name of a Redis command made of the command and the key prefix, e.g. "hgetall:company"
+        """
+        return f"{command}:{key.split(':', 1)[0]}"
+
+
+    def render(self) -> str:
+        with self._lock:
+            snapshot = [(store, query, stats.bucket_counts.copy(), stats.latency_sum, stats.count,
+                         stats.errors, stats.rows) for (store, query), stats in sorted(self._stats.items())]
+            caches = sorted(self._caches.items())
+
+        lines = ["# HELP storage_query_duration_seconds Latency of storage calls",
+                 "# TYPE storage_query_duration_seconds histogram"]
+        for store, query, bucket_counts, latency_sum, count, _, _ in snapshot:
+            labels = f'store="{store}",query="{query}"'
+            cumulative = 0
+            for bound, bucket_count in zip(LATENCY_BUCKETS, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f'storage_query_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'storage_query_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"storage_query_duration_seconds_sum{{{labels}}} {latency_sum}")
+            lines.append(f"storage_query_duration_seconds_count{{{labels}}} {count}")
+
+        lines += ["# HELP storage_query_errors_total Storage calls that failed",
+                  "# TYPE storage_query_errors_total counter"]
+        for store, query, _, _, _, errors, _ in snapshot:
+            lines.append(f'storage_query_errors_total{{store="{store}",query="{query}"}} {errors}')
+
+        lines += ["# HELP storage_query_rows_total Rows, records or documents returned by storage calls",
+                  "# TYPE storage_query_rows_total counter"]
+        for store, query, _, _, _, _, rows in snapshot:
+            lines.append(f'storage_query_rows_total{{store="{store}",query="{query}"}} {rows}')
+
+        for metric, kind, help_text, read in (
+                ("cache_hits_total", "counter", "Lookups served from a cache", lambda c: c.hits),
+                ("cache_misses_total", "counter", "Lookups not found in a cache or expired", lambda c: c.misses),
+                ("cache_evictions_total", "counter", "Entries evicted to keep a cache within its size", lambda c: c.evictions),
+                ("cache_invalidations_total", "counter", "Entries invalidated in a cache", lambda c: c.invalidations),
+                ("cache_entries", "gauge", "Entries currently held by a cache", len),
+                ("cache_weight", "gauge", "Total weight of the entries held by a cache", lambda c: c.weight)):
+            if caches:
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+            for name, cache in caches:
+                lines.append(f'{metric}{{cache="{name}"}} {read(cache)}')
+
+        return "\n".join(lines) + "\n"
+
+
+async def start_metrics_server(metrics: StorageMetrics, host: str, port: int) -> web.AppRunner:
+    """
+    Serves metrics as text on http://host:port/metrics. The returned runner should be cleaned up on shutdown
+    """
+    async def handle_metrics(_: web.Request) -> web.Response:
+        return web.Response(text=metrics.render(), content_type="text/plain")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
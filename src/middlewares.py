@@ -0,0 +1,43 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+
+class UserLockMiddleware(BaseMiddleware):
+    """
+    Handles the updates of each user one at a time, in the order they came in, while updates of different users
+    are still handled concurrently. Handlers mutate the cached profile of the user (e.g. move its search context)
+    on the storage worker threads, so two quick clicks must not run them side by side.
+    Registered as an outer middleware of updates, after the one of the dispatcher resolving event_from_user
+    """
+    def __init__(self):
+        self._locks: dict[int, asyncio.Lock] = {}
+        # Updates holding or waiting for each lock, the lock is dropped once there are none
+        self._holders: dict[int, int] = {}
+
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        user_id = user.id
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        self._holders[user_id] = self._holders.get(user_id, 0) + 1
+        try:
+            async with lock:
+                return await handler(event, data)
+        finally:
+            self._holders[user_id] -= 1
+            if self._holders[user_id] == 0:
+                del self._holders[user_id]
+                del self._locks[user_id]
+
+
+    def __len__(self) -> int:
+        return len(self._locks)
@@ -0,0 +1,146 @@
+import logging
+from dataclasses import dataclass
+
+from connections import PsqlConnection, MongoDBConnection, RedisConnection
+from users.company import CompanyMetrics
+
+
+# Key of the advisory lock held while migrating, so that concurrently starting bots do not migrate twice
+MIGRATIONS_LOCK_ID = 0x5EE7_0001
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    statements: tuple[str, ...]
+
+
+# Applied in order of version. Versions must never be reused or reordered once released,
+# and every statement should be idempotent, since the first migration adopts databases created before versioning
+MIGRATIONS: tuple[Migration, ...] = (
+    Migration(1, "initial_schema", (
+        """
+        CREATE TABLE IF NOT EXISTS user_profiles (
+            user_id BIGINT PRIMARY KEY,
+            first_name VARCHAR(255),
+            last_name VARCHAR(255))""",
+        # They should be created before because of the relationships between tables
+        # For instance recruiter_profiles need companies table to exist
+        """
+        CREATE TABLE IF NOT EXISTS vacancies (
+            vacancy_id SERIAL PRIMARY KEY,
+            recruiter_id BIGINT,
+            vacancy_doc_ref VARCHAR(255))""",
+        """
+        CREATE TABLE IF NOT EXISTS companies (
+            company_id SERIAL PRIMARY KEY,
+            name VARCHAR(255))""",
+        """
+        CREATE TABLE IF NOT EXISTS seeker_profiles (
+            user_id BIGINT PRIMARY KEY,
+            portfolio_ref VARCHAR(255) NOT NULL,
+            seeker_node_ref BIGINT NOT NULL)""",
+        """
+        CREATE TABLE IF NOT EXISTS recruiter_profiles (
+            user_id BIGINT PRIMARY KEY,
+            recruiter_node_ref BIGINT,
+            company_id INT,
+            FOREIGN KEY (company_id) REFERENCES companies(company_id))""",
+    )),
+    # RecruiterProfile.get_vacancies_data and delete_vacancy look vacancies up by recruiter
+    Migration(2, "vacancies_recruiter_id_index", (
+        "CREATE INDEX IF NOT EXISTS vacancies_recruiter_id_idx ON vacancies (recruiter_id)",
+    )),
+    # CompanyRegistry.search_by_name matches a case insensitive prefix (ILIKE 'x%').
+    # A text_pattern_ops b-tree only serves case sensitive LIKE, a trigram index serves ILIKE as well
+    Migration(3, "companies_name_trigram_index", (
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS companies_name_trgm_idx ON companies USING gin (name gin_trgm_ops)",
+    )),
+)
+
+
+def run_migrations(sql_connection: PsqlConnection, migrations: tuple[Migration, ...] = MIGRATIONS) -> (list[int] | None):
+    """
+    Applies all migrations that are not recorded in schema_migrations yet, in one transaction
+    under an advisory lock. Returns the versions applied now, or None if migrating failed
+    (in which case nothing is applied)
+    """
+    try:
+        with sql_connection.transaction() as cur:
+            # Released on commit or rollback. Other instances wait here and then find nothing left to apply
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATIONS_LOCK_ID,))
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INT PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT now())""")
+            cur.execute("SELECT version FROM schema_migrations")
+            applied_versions = {row["version"] for row in cur.fetchall()}
+
+            applied_now = []
+            for migration in sorted(migrations, key=lambda m: m.version):
+                if migration.version in applied_versions:
+                    continue
+
+                logging.info("Applying migration %d (%s)", migration.version, migration.name)
+                for statement in migration.statements:
+                    cur.execute(statement)
+                cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                            (migration.version, migration.name))
+                applied_now.append(migration.version)
+    except Exception as e:
+        logging.error("Error while applying migrations: %s", e)
+        return None
+
+    if applied_now:
+        logging.info("Applied migrations %s", applied_now)
+    return applied_now
+
+
+def prepare_vacancy_documents(sql_connection: PsqlConnection, mongodb_connection: MongoDBConnection) -> int:
+    """
+    Filtered vacancy search pages over MongoDB by vacancy_id, see VacanciesChunk.
+    Ensures the index it needs exists and copies vacancy_id and recruiter_id from Postgres into vacancy documents
+    created before documents carried them. Idempotent: documents that already have them are not touched.
+    Returns the number of documents backfilled
+    """
+    mongodb_connection.create_index("vacancies", [("vacancy_id", 1)])
+
+    documents = mongodb_connection.find_documents("vacancies", {"vacancy_id": {"$exists": False}}, projection={"_id": 1})
+    if len(documents) == 0:
+        return 0
+
+    doc_refs = [str(document["_id"]) for document in documents]
+    rows = sql_connection.execute_query("SELECT vacancy_id, recruiter_id, vacancy_doc_ref FROM vacancies "
+                                        "WHERE vacancy_doc_ref = ANY(%s)", doc_refs)
+    if rows is None:
+        return 0
+
+    backfilled = mongodb_connection.update_documents("vacancies", {
+        row["vacancy_doc_ref"]: {"vacancy_id": row["vacancy_id"], "recruiter_id": row["recruiter_id"]} for row in rows})
+    logging.info("Backfilled vacancy ids of %d vacancy documents", backfilled)
+    return backfilled
+
+
+def migrate_company_metrics(redis_connection: RedisConnection) -> (int | None):
+    """
+    Moves the metrics of all companies still stored as one Redis key per metric (company:{id}:employees and
+    company:{id}:vacancies) into the hashes of the companies, see CompanyMetrics. Each company is migrated
+    atomically, so bots starting at the same time do not copy metrics twice. Idempotent.
+    Returns the number of companies migrated, None if Redis could not be scanned
+    """
+    legacy_keys = redis_connection.scan_keys("company:*:employees")
+    if legacy_keys is None:
+        return None
+
+    migrated = 0
+    for legacy_key in legacy_keys:
+        metrics_ref = legacy_key.decode().rsplit(":", 1)[0]
+        if CompanyMetrics(metrics_ref).migrate_legacy_metrics(redis_connection) is not None:
+            migrated += 1
+
+    if migrated > 0:
+        logging.info("Migrated metrics of %d companies into Redis hashes", migrated)
+    return migrated
@@ -6,7 +6,7 @@ from aiogram import Router
 
 from src.states.registration_states import EntryRegistrationStates
 from src.states.menu_states import MenuStates
-from src.sweet_home import sweet_home
+from src.sweet_home import async_sweet_home
 from src.users.user_profile import UserProfile
 
 
@@ -16,7 +16,7 @@ entry_router = Router(name="Entry Router")
 @entry_router.message(CommandStart())
 async def entry_handler(message: Message, state: FSMContext) -> None:
     user_id = message.from_user.id
-    user_profile = sweet_home.request_user_profile(user_id)
+    user_profile = await async_sweet_home.request_user_profile(user_id)
     if user_profile is not None:
         markup = user_profile.user_markup.get_current_markup()
         await message.answer("Welcome back! Choose from one of the options below.", reply_markup=markup)
@@ -41,7 +41,7 @@ async def enter_last_name(message: Message, state: FSMContext) -> None:
     await state.update_data(last_name=message.text)
     data = await state.get_data()
     user_profile = UserProfile(message.from_user.id, data["first_name"], data["last_name"])
-    sweet_home.add_user_profile(user_profile=user_profile)
+    await async_sweet_home.add_user_profile(user_profile=user_profile)
     await message.answer("Your profile has been successfully registered! Choose from one of the options below.",
                          reply_markup=user_profile.user_markup.get_current_markup())
     await state.set_data({"profile": user_profile})
@@ -4,7 +4,7 @@ from aiogram import Router, F, types
 from aiogram.fsm.context import FSMContext
 from aiogram.utils.formatting import Italic, Bold
 
-from src.sweet_home import sweet_home
+from src.sweet_home import async_sweet_home
 from src.users.user_profile import UserProfile
 from src.users.seeker_profile import SeekerProfile
 from src.users.recruiter_profile import RecruiterProfile
@@ -26,12 +26,12 @@ profile_router = Router(name="Profile Router")
 @profile_router.message(F.text, MenuStates.profile_home)
 async def profile_home(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
-    user_profile: UserProfile = sweet_home.request_user_profile(user_id)
+    user_profile: UserProfile = await async_sweet_home.request_user_profile(user_id)
     assert user_profile is not None
     
     user_markup = user_profile.user_markup
     if message.text == user_markup.get_button_text("seeker_button"):
-        if not sweet_home.profile_home.request_seeker_profile(user_profile):
+        if not await async_sweet_home.profile_home.request_seeker_profile(user_profile):
             # Do seeker profile registration
             await message.answer("To become a seeker, you will need to make a portfolio.\n\n"
                                 "Enter the position you would like to apply for.",
@@ -47,7 +47,7 @@ async def profile_home(message: types.Message, state: FSMContext):
                 reply_markup=seeker_profile.seeker_markup.get_current_markup())
 
     elif message.text == user_markup.get_button_text("recruiter_button"):
-        if not sweet_home.profile_home.request_recruiter_profile(user_profile):
+        if not await async_sweet_home.profile_home.request_recruiter_profile(user_profile):
             # Do recruiter profile registration
             await message.answer("To become a recruiter, you should choose/create a company you're hiring for.\n\n"
                                 "Enter the name of your company and we will search for it.",
@@ -88,8 +88,8 @@ async def no_prior_experience(call: types.CallbackQuery, state: FSMContext):
     data = await state.get_data()
     portfolio = {"position": data["position"], "experiences": []}
 
-    user_profile: UserProfile = sweet_home.request_user_profile(call.from_user.id)
-    sweet_home.profile_home.add_seeker_profile(user_profile, portfolio)
+    user_profile: UserProfile = await async_sweet_home.request_user_profile(call.from_user.id)
+    await async_sweet_home.profile_home.add_seeker_profile(user_profile, portfolio)
 
     await call.message.answer(f"{Bold('You have successfully registered a seeker profile.').as_html()}\n\n"
                               f"{Bold('— Name:').as_html()} {user_profile.get_full_name()}\n"
@@ -109,7 +109,7 @@ async def add_experience_title(message: types.Message, state: FSMContext):
     else:
         data["experiences"].append({"title": message.text})
         # await state.update_data(experiences=data["experiences"])
-    logging.info(f"Current portfolio: {data.get('experiences')}")
+    logging.debug("Current portfolio: %s", data.get('experiences'))
     await message.answer("Noted! Now, enter the description of your previous experience.")
     await state.set_state(SeekerRegistrationStates.experience_desc)
 
@@ -117,7 +117,7 @@ async def add_experience_title(message: types.Message, state: FSMContext):
 @profile_router.message(F.text, SeekerRegistrationStates.experience_desc)
 async def add_experience_desc(message: types.Message, state: FSMContext):
     data = await state.get_data()
-    logging.info(f"Current portfolio: {data.get('experiences')}")
+    logging.debug("Current portfolio: %s", data.get('experiences'))
     experiences = data.get("experiences")
     exp_idx = len(experiences) - 1
     experiences[exp_idx].update({"desc": message.text})
@@ -147,9 +147,9 @@ async def add_experience_timeline(message: types.Message, state: FSMContext):
 @profile_router.callback_query(F.data == "conf-exp", SeekerRegistrationStates.confirm_or_add_portfolio)
 async def confirm_portfolio(call: types.CallbackQuery, state: FSMContext):
     data = await state.get_data()
-    user_profile: UserProfile = sweet_home.request_user_profile(call.from_user.id)
+    user_profile: UserProfile = await async_sweet_home.request_user_profile(call.from_user.id)
     portfolio = {"position": data.get("position"), "experiences": data.get("experiences")}
-    sweet_home.profile_home.add_seeker_profile(user_profile, portfolio)
+    await async_sweet_home.profile_home.add_seeker_profile(user_profile, portfolio)
     experiences_text = ""
     for exp in data.get("experiences"):
         experiences_text += (f"{Bold('— Title: ').as_html()} {exp['title']}\n"
@@ -172,13 +172,13 @@ async def add_more_experience(call: types.CallbackQuery, state: FSMContext):
     await call.message.answer(f"Let's add another experience!\n\n"
                          f"Enter your experience title {Italic('For instance: Developer at ABC Inc.').as_html()}",
                          parse_mode="HTML")
-    logging.info(f"Current portfolio: {(await state.get_data()).get('experiences')}")
+    logging.debug("Current portfolio: %s", (await state.get_data()).get('experiences'))
     await state.set_state(SeekerRegistrationStates.experience_title)
 
 
 @profile_router.message(F.text, RecruiterRegistrationStates.enter_company)
 async def search_for_company(message: types.Message, state: FSMContext):
-    result = sweet_home.profile_home.search_company_by_name(message.text)
+    result = await async_sweet_home.profile_home.search_company_by_name(message.text)
     await state.update_data(company_name=message.text.strip())
     if result is None:
         await message.answer(f"Hmmm, we didn't find your company in registered ones. "
@@ -219,9 +219,9 @@ async def register_company(call: types.CallbackQuery, state: FSMContext):
 async def finalize_seeker_registration(message: types.Message, state: FSMContext):
     data = await state.get_data()
     employees_count = int(message.text)
-    user_profile = sweet_home.request_user_profile(message.from_user.id)
-    company_ref = sweet_home.profile_home.add_company(data["company_name"], employees_count)
-    sweet_home.profile_home.add_recruiter_profile(user_profile, company_ref.get_id())
+    user_profile = await async_sweet_home.request_user_profile(message.from_user.id)
+    company_ref = await async_sweet_home.profile_home.add_company(data["company_name"], employees_count)
+    await async_sweet_home.profile_home.add_recruiter_profile(user_profile, company_ref.get_id())
     await message.answer("Your recruiter profile was successfully registered, with the following company association:\n\n"
                          f"{Bold('— Company name:').as_html()} {company_ref.name}\n"
                          f"{Bold('— Employees count:').as_html()} {company_ref.metrics.num_employees}\n\n"
@@ -244,9 +244,9 @@ async def handle_company_callback(call: types.CallbackQuery, state: FSMContext):
         return
     elif call.data.isdigit():
         chosen_company: Company = keyboard.get_companies()[int(call.data)]
-        company_metrics = sweet_home.profile_home.get_company_metrics(chosen_company.get_id())
-        user_profile: UserProfile = sweet_home.request_user_profile(call.from_user.id)
-        sweet_home.profile_home.add_recruiter_profile(user_profile, chosen_company.get_id())
+        company_metrics = await async_sweet_home.profile_home.get_company_metrics(chosen_company.get_id())
+        user_profile: UserProfile = await async_sweet_home.request_user_profile(call.from_user.id)
+        await async_sweet_home.profile_home.add_recruiter_profile(user_profile, chosen_company.get_id())
         await call.message.answer(f"You chose company {chosen_company.name} with following stats:\n\n"
                                      f"{Bold('— Employees count:').as_html()} {company_metrics.get('employees')}\n"
                                      f"{Bold('— Open vacancies:').as_html()} {company_metrics.get('open_vacancies')}\n\n"
@@ -271,7 +271,7 @@ async def on_profile_edit(call: types.CallbackQuery, state: FSMContext):
 @profile_router.callback_query(F.data == "back", MenuStates.user_profile_editing)
 async def on_back(call: types.CallbackQuery, state: FSMContext):
     user_id = call.from_user.id
-    user_profile: UserProfile = sweet_home.request_user_profile(user_id)
+    user_profile: UserProfile = await async_sweet_home.request_user_profile(user_id)
     assert user_profile is not None
 
     await call.message.answer(f"Returning back to main menu.",
@@ -294,8 +294,8 @@ async def handle_last_name(message: types.Message, state: FSMContext):
     last_name = message.text
 
     user_id = message.from_user.id
-    user_profile: UserProfile = sweet_home.request_user_profile(user_id)
-    sweet_home.profile_home.edit_user_profile(user_profile, first_name, last_name)
+    user_profile: UserProfile = await async_sweet_home.request_user_profile(user_id)
+    await async_sweet_home.profile_home.edit_user_profile(user_profile, first_name, last_name)
 
     await message.answer("Your profile has been updated.\n\n"
                          f"First name: {first_name}\n"
@@ -1,16 +1,17 @@
+import asyncio
 import logging
 
 from aiogram import Router, F, types
-from aiogram.methods.get_chat_member import GetChatMember
 from aiogram.fsm.context import FSMContext
 from aiogram.utils.formatting import Italic, Bold
 
+from config import cfg
 from src.states.menu_states import MenuStates, RecruiterMenuStates
 from src.users.company import Company
 from src.users.user_profile import UserProfile
 from src.users.recruiter_profile import RecruiterProfile
-from src.sweet_home import sweet_home
-from src.bot import bot
+from src.sweet_home import async_sweet_home
+from src.bot import chat_members
 from src.keyboards.recruiter_inline_keyboards import (ConfirmOrChangeDescriptionInlineKeyboardMarkup,
                                                       KeepThePreviousDescriptionInlineKeyboardMarkup,
                                                       VacancyDisplayInlineKeyboardMarkup,
@@ -25,14 +26,14 @@ recruiter_router = Router(name="Recruiter Router")
 @recruiter_router.message(F.text, MenuStates.recruiter_home)
 async def recruiter_home(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
-    user_profile: UserProfile = sweet_home.request_user_profile(user_id)
+    user_profile: UserProfile = await async_sweet_home.request_user_profile(user_id)
     
     recruiter_profile: RecruiterProfile = user_profile.recruiter_ref
     assert recruiter_profile is not None
 
     recruiter_markup = recruiter_profile.recruiter_markup
     if message.text == recruiter_markup.get_button_text("add_vacancy_button"):
-        company: Company = sweet_home.recruiter_home.get_company(recruiter_profile)
+        company: Company = await async_sweet_home.recruiter_home.get_company(recruiter_profile)
         await message.answer(f"We will now create a vacancy for your company ({Italic(company.name).as_html()}).\n\n"
                              f"First of all, enter vacancy position name.", parse_mode='HTML')
 
@@ -41,7 +42,7 @@ async def recruiter_home(message: types.Message, state: FSMContext):
         await state.set_state(RecruiterMenuStates.vacancy_position)
 
     elif message.text == recruiter_markup.get_button_text("your_vacancies_button"):
-        vacancies = sweet_home.recruiter_home.get_vacancies_data(recruiter_profile)
+        vacancies = await async_sweet_home.recruiter_home.get_vacancies_data(recruiter_profile)
         if vacancies is None or len(vacancies) == 0:
             await message.answer("You have no vacancies yet. You can create one in the recruiter menu.",
                                  reply_markup=recruiter_markup.get_current_markup())
@@ -69,7 +70,7 @@ async def recruiter_home(message: types.Message, state: FSMContext):
 async def back_to_menu(call: types.CallbackQuery, state: FSMContext):
     await state.set_data({})
     user_id = call.from_user.id
-    user_profile: UserProfile = sweet_home.request_user_profile(user_id)
+    user_profile: UserProfile = await async_sweet_home.request_user_profile(user_id)
     recruiter_profile: RecruiterProfile = user_profile.recruiter_ref
 
     await call.message.answer("You went back to recruiter menu.",
@@ -84,8 +85,14 @@ async def vacancy_display(message: types.Message, state: FSMContext):
     data = await state.get_data()
     vacancies = data["vacancies"]
 
-    chosen_vacancy = vacancies[int(message.text) - 1]
-    chosen_vacancy_data = chosen_vacancy[1]
+    vacancy_id, vacancy_preview = vacancies[int(message.text) - 1]
+    # The list of vacancies only holds positions, so we fetch the whole document of the chosen one
+    chosen_vacancy_data = await async_sweet_home.recruiter_home.get_vacancy_document(str(vacancy_preview["_id"]))
+    if chosen_vacancy_data is None:
+        await message.answer("This vacancy is no longer available. Choose another one by typing its index.")
+        return
+
+    chosen_vacancy = (vacancy_id, chosen_vacancy_data)
     await state.update_data(chosen_vacancy=chosen_vacancy)
 
     await message.answer(f"{Bold('Vacancy ' + chosen_vacancy_data['position']).as_html()}\n\n"
@@ -142,12 +149,12 @@ async def back_to_vacancy_action(call: types.CallbackQuery, state: FSMContext):
 @recruiter_router.callback_query(F.data == "confirm", RecruiterMenuStates.confirm_vacancy_removal)
 async def delete_vacancy(call: types.CallbackQuery, state: FSMContext):
     user_id = call.from_user.id
-    user_profile: UserProfile = sweet_home.request_user_profile(user_id)
+    user_profile: UserProfile = await async_sweet_home.request_user_profile(user_id)
     recruiter_profile: RecruiterProfile = user_profile.recruiter_ref
 
     data = await state.get_data()
     chosen_vacancy = data["chosen_vacancy"]
-    sweet_home.recruiter_home.delete_vacancy(recruiter_profile, chosen_vacancy)
+    await async_sweet_home.recruiter_home.delete_vacancy(recruiter_profile, chosen_vacancy)
 
     await call.message.answer(f"Your vacancy for '{chosen_vacancy[1]['position']}' was permanently deleted!",
                               reply_markup=recruiter_profile.recruiter_markup.get_current_markup())
@@ -160,15 +167,13 @@ async def delete_vacancy(call: types.CallbackQuery, state: FSMContext):
 @recruiter_router.callback_query(F.data == "applicants", RecruiterMenuStates.manage_vacancy)
 async def display_applicants(call: types.CallbackQuery, state: FSMContext):
     user_id = call.from_user.id
-    user_profile: UserProfile = sweet_home.request_user_profile(user_id)
+    user_profile: UserProfile = await async_sweet_home.request_user_profile(user_id)
     recruiter_profile = user_profile.recruiter_ref
 
     data = await state.get_data()
     chosen_vacancy = data["chosen_vacancy"]
 
-    applicants_id_list = sweet_home.recruiter_home.get_vacancy_applicants(recruiter_profile, chosen_vacancy[0])
-    user_profiles_list = [sweet_home.request_user_profile(uid) for uid in applicants_id_list
-                          if sweet_home.request_user_profile(uid) is not None]
+    applicants_id_list = await async_sweet_home.recruiter_home.get_vacancy_applicants(recruiter_profile, chosen_vacancy[0])
     if len(applicants_id_list) == 0:
         await call.message.answer("This vacancy has no applicants, you were returned to recruiter menu.",
                                   reply_markup=recruiter_profile.recruiter_markup.get_current_markup())
@@ -177,9 +182,13 @@ async def display_applicants(call: types.CallbackQuery, state: FSMContext):
         await state.set_state(MenuStates.recruiter_home)
         return
 
-    logging.info(f"Retrieved applicants with ids: {applicants_id_list}")
+    logging.debug("Retrieved applicants with ids: %s", applicants_id_list)
+    # Only ids and the index of the current applicant are kept in the state, their profiles and portfolios
+    # are fetched a page at a time (and cached) as the recruiter pages through them
+    applicant_ids = [profile.get_id() for profile in await async_sweet_home.request_user_profiles(applicants_id_list)
+                     if profile.has_seeker_profile()]
 
-    if len(user_profiles_list) == 0:
+    if len(applicant_ids) == 0:
         await call.message.answer("Applicants don't have a valid seeker profile and cannot be viewed properly, "
                                   "you were returned to recruiter menu.",
                                   reply_markup=recruiter_profile.recruiter_markup.get_current_markup())
@@ -188,25 +197,11 @@ async def display_applicants(call: types.CallbackQuery, state: FSMContext):
         await state.set_state(MenuStates.recruiter_home)
         return
 
-    current_applicant_profile = user_profiles_list[0]
-    current_portfolio = sweet_home.seeker_home.request_seeker_portfolio(current_applicant_profile.seeker_ref)
-    logging.info(f"Retrieved portfolio for user with id {current_applicant_profile.get_id()}: {current_portfolio}")
-
-    telegram_profile = await GetChatMember(chat_id=current_applicant_profile.get_id(),
-                                     user_id=current_applicant_profile.get_id()).as_(bot)
-    keyboard = ApplicantsListDisplayInlineKeyboard(len(user_profiles_list))
-    await state.update_data(applicant_profiles=user_profiles_list, keyboard=keyboard)
-
-    portfolio_text = ""
-    for exp in current_portfolio.get("experiences"):
-        portfolio_text += (f"{Bold('— Title: ').as_html()} {exp['title']}\n"
-                           f"{Bold('— Description: ').as_html()} {exp['desc']}\n"
-                           f"{Bold('— Duration').as_html()} {exp['timeline']}\n\n")
-
-    await call.message.answer(f"{telegram_profile.user.mention_html(current_applicant_profile.get_full_name())}\n\n"
-                              f"Main position: {current_portfolio.get('position')}\n"
-                              f"Past experiences:\n\n"
-                              f"{portfolio_text}", parse_mode='HTML',
+    applicant = await get_applicant(applicant_ids, 0)
+    keyboard = ApplicantsListDisplayInlineKeyboard(len(applicant_ids))
+    await state.update_data(applicant_ids=applicant_ids, applicant_index=0)
+
+    await call.message.answer(await render_applicant(applicant), parse_mode='HTML',
                               reply_markup=keyboard.get_current_markup())
     await call.message.delete()
     await state.set_state(RecruiterMenuStates.applicants_displaying)
@@ -215,19 +210,64 @@ async def display_applicants(call: types.CallbackQuery, state: FSMContext):
 @recruiter_router.callback_query(F.data.in_({'next', 'back'}), RecruiterMenuStates.applicants_displaying)
 async def previous_applicant(call: types.CallbackQuery, state: FSMContext):
     data = await state.get_data()
-    keyboard: ApplicantsListDisplayInlineKeyboard = data.get("keyboard")
-    prev_keyboard = keyboard.get_current_markup()
-
-    is_next = True if call.data == "next" else False
-    keyboard.flip_page(is_next=is_next)
-    current_applicant_index = keyboard.get_current_applicant()
-
-    current_applicant_profile = data.get("applicant_profiles")[current_applicant_index]
-    current_portfolio = sweet_home.seeker_home.request_seeker_portfolio(current_applicant_profile.seeker_ref)
-    telegram_profile = await GetChatMember(chat_id=current_applicant_profile.get_id(),
-                                           user_id=current_applicant_profile.get_id()).as_(bot)
+    applicant_ids: list[int] = data["applicant_ids"]
+    applicant_index = data["applicant_index"] + (1 if call.data == "next" else -1)
+    if not 0 <= applicant_index < len(applicant_ids):
+        return
 
-    experiences = current_portfolio.get("experiences")
+    keyboard = ApplicantsListDisplayInlineKeyboard(len(applicant_ids), applicant_index)
+    applicant = await get_applicant(applicant_ids, applicant_index)
+    await state.update_data(applicant_index=applicant_index)
+    await call.message.edit_text(await render_applicant(applicant), parse_mode='HTML',
+                                 reply_markup=keyboard.get_current_markup())
+
+
+# Prefetches of applicant pages in flight. The event loop only keeps weak references to tasks
+_applicant_prefetches: set[asyncio.Task] = set()
+
+
+async def get_applicant(applicant_ids: list[int], index: int) -> (tuple[UserProfile, (dict | None)] | None):
+    """
+    Returns the profile and the portfolio of the applicant at index, or None if their profile no longer exists.
+    Those of the whole page of applicants are fetched together, and the next page is prefetched
+    once the recruiter opens a page
+    """
+    page_size = cfg.applicants_page_size
+    page_start = index - index % page_size
+    page = await async_sweet_home.request_applicants(applicant_ids[page_start:page_start + page_size])
+
+    next_page_ids = applicant_ids[page_start + page_size:page_start + 2 * page_size]
+    if index % page_size == 0 and len(next_page_ids) > 0:
+        tasks = [asyncio.create_task(async_sweet_home.request_applicants(next_page_ids))]
+        # Warms the mentions of the next page, lookups are shared with the renders that may overlap them
+        tasks += [asyncio.create_task(chat_members.get_user(user_id)) for user_id in next_page_ids]
+        for task in tasks:
+            _applicant_prefetches.add(task)
+            task.add_done_callback(_applicant_prefetches.discard)
+
+    for user_profile, portfolio in page:
+        if user_profile.get_id() == applicant_ids[index]:
+            return user_profile, portfolio
+
+    # The portfolio went missing since the ids were listed
+    user_profiles = await async_sweet_home.request_user_profiles([applicant_ids[index]])
+    if len(user_profiles) == 0:
+        logging.warning("Profile of applicant %d no longer exists", applicant_ids[index])
+        return None
+    return user_profiles[0], None
+
+
+async def render_applicant(applicant: (tuple[UserProfile, (dict | None)] | None)) -> str:
+    if applicant is None:
+        return Italic('This applicant is no longer available.').as_html()
+
+    user_profile, portfolio = applicant
+    mention = await chat_members.mention_html(user_profile.get_id(), user_profile.get_full_name())
+    if portfolio is None:
+        return (f"{mention}\n\n"
+                f"{Italic('The portfolio of this applicant is no longer available.').as_html()}")
+
+    experiences = portfolio.get("experiences")
     if len(experiences) == 0:
         portfolio_text = "Has no prior experience."
     else:
@@ -237,23 +277,15 @@ async def previous_applicant(call: types.CallbackQuery, state: FSMContext):
                                f"{Bold('— Description: ').as_html()} {exp['desc']}\n"
                                f"{Bold('— Duration').as_html()} {exp['timeline']}\n\n")
 
-    if prev_keyboard == keyboard.get_current_markup():
-        await call.message.edit_text(f"{telegram_profile.user.mention_html(current_applicant_profile.get_full_name())}\n\n"
-                                  f"Main position: {current_portfolio.get('position')}\n"
-                                  f"{portfolio_text}", parse_mode='HTML')
-    else:
-        await call.message.edit_text(
-            f"{telegram_profile.user.mention_html(current_applicant_profile.get_full_name())}\n\n"
-            f"Main position: {current_portfolio.get('position')}\n"
-            f"{portfolio_text}", parse_mode='HTML',
-            reply_markup=(keyboard.get_current_markup()))
-    # await call.message.delete()
+    return (f"{mention}\n\n"
+            f"Main position: {portfolio.get('position')}\n"
+            f"{portfolio_text}")
 
 
 @recruiter_router.callback_query(F.data == "exit", RecruiterMenuStates.applicants_displaying)
 async def exit_applicants_display(call: types.CallbackQuery, state: FSMContext):
     user_id = call.from_user.id
-    user_profile: UserProfile = sweet_home.request_user_profile(user_id)
+    user_profile: UserProfile = await async_sweet_home.request_user_profile(user_id)
 
     recruiter_profile: RecruiterProfile = user_profile.recruiter_ref
 
@@ -328,14 +360,14 @@ async def confirm_description(call: types.CallbackQuery, state: FSMContext):
 @recruiter_router.message(F.text.regexp(r'^\d+(\.\d+)?$'), RecruiterMenuStates.vacancy_salary)
 async def handle_salary(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
-    user_profile: UserProfile = sweet_home.request_user_profile(user_id)
+    user_profile: UserProfile = await async_sweet_home.request_user_profile(user_id)
     recruiter_profile = user_profile.recruiter_ref
 
     data = await state.get_data()
     vacancy: dict = data['vacancy_ref']
     vacancy.update(salary=float(message.text), company=vacancy["company"].get_id())
 
-    sweet_home.recruiter_home.add_vacancy(recruiter_profile, vacancy)
+    await async_sweet_home.recruiter_home.add_vacancy(recruiter_profile, vacancy)
 
     await message.answer("Your vacancy has been added and can be searched by anyone now! "
                          "You can manage it in your vacancies menu.",
@@ -7,9 +7,10 @@ from aiogram.utils.formatting import Italic, Bold
 
 from src.states.menu_states import MenuStates
 from src.states.registration_states import SeekerPortfolioUpdateStates
+from src.users.company import Company
 from src.users.user_profile import UserProfile
 from src.users.seeker_profile import SeekerProfile
-from src.sweet_home import sweet_home
+from src.sweet_home import async_sweet_home
 
 from src.keyboards.seeker_inline_keyboards import (NoExperienceInlineKeyboardMarkup, 
                                                 SeekerPortfolioEditingInlineKeyboardMarkup, 
@@ -20,8 +21,8 @@ from src.keyboards.seeker_inline_keyboards import (NoExperienceInlineKeyboardMar
 seeker_router = Router(name="Seeker Router")
 
 
-def get_seeker_profile(user_id: int) -> SeekerProfile:
-    user_profile: UserProfile = sweet_home.request_user_profile(user_id)
+async def get_seeker_profile(user_id: int) -> SeekerProfile:
+    user_profile: UserProfile = await async_sweet_home.request_user_profile(user_id)
     
     seeker_profile: SeekerProfile = user_profile.seeker_ref
     assert seeker_profile is not None
@@ -31,7 +32,7 @@ def get_seeker_profile(user_id: int) -> SeekerProfile:
 @seeker_router.message(F.text, MenuStates.seeker_home)
 async def seeker_home(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
-    user_profile: UserProfile = sweet_home.request_user_profile(user_id)
+    user_profile: UserProfile = await async_sweet_home.request_user_profile(user_id)
     
     seeker_profile: SeekerProfile = user_profile.seeker_ref
     assert seeker_profile is not None
@@ -44,7 +45,7 @@ async def seeker_home(message: types.Message, state: FSMContext):
         await state.set_state(MenuStates.seeker_profile_editing)
 
     elif message.text == seeker_markup.get_button_text("search_vacancies_button"):
-        res = sweet_home.seeker_home.create_search_context(seeker_profile)
+        res = await async_sweet_home.seeker_home.create_search_context(seeker_profile)
         assert res
 
         vsc = seeker_profile.vacancies_search_context
@@ -60,6 +61,26 @@ async def seeker_home(message: types.Message, state: FSMContext):
             reply_markup=SeekerVacacnyFiltersInlineKeyboardMarkup().get_current_markup())
         await state.set_data({})
         await state.set_state(MenuStates.seeker_vacancy_filters)
+
+    elif message.text == seeker_markup.get_button_text("recommended_vacancies_button"):
+        if not await async_sweet_home.seeker_home.create_recommendations_context(seeker_profile):
+            await message.answer("Fill in your portfolio to get vacancies recommended for you!",
+                reply_markup=seeker_profile.seeker_markup.get_current_markup())
+            await state.set_state(MenuStates.seeker_home)
+            return
+
+        vsc = seeker_profile.vacancies_search_context
+        if vsc.empty_context:
+            await message.answer("There is no vacancies matching your portfolio yet!",
+                reply_markup=seeker_profile.seeker_markup.get_current_markup())
+            await state.set_state(MenuStates.seeker_home)
+            return
+
+        await post_vacancy_answer(message, seeker_profile, vsc.get_current_vacancy(),
+            vsc.inline_markup.get_current_markup(),
+            prefix="Here are the vacancies matching your portfolio best:\n\n")
+        await state.set_data({})
+        await state.set_state(MenuStates.seeker_vacancy_search)
     
     elif message.text == seeker_markup.get_button_text("back_button"):
         await message.answer("Returning back to user profile menu", 
@@ -71,12 +92,12 @@ async def seeker_home(message: types.Message, state: FSMContext):
 @seeker_router.callback_query(F.data == "portfolio", MenuStates.seeker_profile_editing)
 async def on_portfolio_edit(call: types.CallbackQuery, state: FSMContext):
     user_id = call.from_user.id
-    user_profile: UserProfile = sweet_home.request_user_profile(user_id)
+    user_profile: UserProfile = await async_sweet_home.request_user_profile(user_id)
     
     seeker_profile: SeekerProfile = user_profile.seeker_ref
     assert seeker_profile is not None
     
-    portfolio = sweet_home.seeker_home.request_seeker_portfolio(seeker_profile)
+    portfolio = await async_sweet_home.seeker_home.request_seeker_portfolio(seeker_profile)
     if portfolio is None:
         logging.error("Failed to retrieve portfolio...")
         await call.message.answer("Failed to retrieve portfolio!", 
@@ -98,7 +119,7 @@ async def on_portfolio_edit(call: types.CallbackQuery, state: FSMContext):
 @seeker_router.callback_query(F.data == "back", MenuStates.seeker_profile_editing)
 async def on_back(call: types.CallbackQuery, state: FSMContext):
     user_id = call.from_user.id
-    user_profile: UserProfile = sweet_home.request_user_profile(user_id)
+    user_profile: UserProfile = await async_sweet_home.request_user_profile(user_id)
     
     seeker_profile: SeekerProfile = user_profile.seeker_ref
     assert seeker_profile is not None
@@ -128,14 +149,14 @@ async def on_portfolio_position_message(message: types.Message, state: FSMContex
 @seeker_router.callback_query(F.data == "no-exp", SeekerPortfolioUpdateStates.experience_title)
 async def no_prior_experience(call: types.CallbackQuery, state: FSMContext):
     user_id = call.from_user.id
-    user_profile: UserProfile = sweet_home.request_user_profile(user_id)
+    user_profile: UserProfile = await async_sweet_home.request_user_profile(user_id)
     
     seeker_profile: SeekerProfile = user_profile.seeker_ref
     assert seeker_profile is not None
 
     data = await state.get_data()
     portfolio_ref = data['portfolio_ref']
-    sweet_home.seeker_home.update_seeker_portfolio(seeker_profile, portfolio_ref)
+    await async_sweet_home.seeker_home.update_seeker_portfolio(seeker_profile, portfolio_ref)
 
     await call.message.answer(f"{Bold('You have successfully updated your portfolio.').as_html()}\n\n"
                               f"{Bold('— Name:').as_html()} {user_profile.get_full_name()}\n"
@@ -167,7 +188,7 @@ async def add_experience_desc(message: types.Message, state: FSMContext):
     data = await state.get_data()
     portfolio_ref = data['portfolio_ref']
 
-    logging.info(f"Current portfolio: {portfolio_ref.get('experiences')}")
+    logging.debug("Current portfolio: %s", portfolio_ref.get('experiences'))
     
     experiences = portfolio_ref.get("experiences")
     exp_idx = len(experiences) - 1
@@ -203,14 +224,14 @@ async def add_experience_timeline(message: types.Message, state: FSMContext):
 async def confirm_portfolio(call: types.CallbackQuery, state: FSMContext):
 
     user_id = call.from_user.id
-    user_profile: UserProfile = sweet_home.request_user_profile(user_id)
+    user_profile: UserProfile = await async_sweet_home.request_user_profile(user_id)
     
     seeker_profile: SeekerProfile = user_profile.seeker_ref
     assert seeker_profile is not None
 
     data = await state.get_data()
     portfolio_ref = data["portfolio_ref"]
-    if not sweet_home.seeker_home.update_seeker_portfolio(seeker_profile, portfolio_ref):
+    if not await async_sweet_home.seeker_home.update_seeker_portfolio(seeker_profile, portfolio_ref):
         logging.error("Failed to update seeker's portfolio!")
         await call.message.answer("Unexpected behaviour detected while updating your portfolio, you were returned to "
                                   "the seeker profile menu.",
@@ -244,16 +265,7 @@ async def add_more_experience(call: types.CallbackQuery, state: FSMContext):
     await state.set_state(SeekerPortfolioUpdateStates.experience_title)
 
 
-def get_vacancy_message(vacancy) -> str:
-    data = sweet_home.recruiter_home.get_vacancy_data(vacancy)
-
-    logging.info(f"data is {data}")
-    company_id = int(data['company'])
-    company_registry = sweet_home.seeker_home.get_company_registry()
-    company = company_registry.get_company(company_id)
-    assert company is not None
-
-    metrics = company_registry.get_metrics(company_id)
+def render_vacancy_card(data: dict, company: Company, metrics: dict[str, int]) -> str:
     description = data['description']
 
     msg = \
@@ -263,31 +275,61 @@ def get_vacancy_message(vacancy) -> str:
     f"<i>It has {metrics['employees']} employees registered</i>\n"\
     f"<i>It has {metrics['open_vacancies']} open vacancies on the service</i>\n"
     return msg
+
+
+async def get_vacancy_message(seeker_profile: SeekerProfile, vacancy) -> str:
+    logging.debug("Showing vacancy %d", vacancy.get_id())
+    card = await async_sweet_home.seeker_home.get_vacancy_card(seeker_profile, vacancy, render_vacancy_card)
+    if card is None:
+        # The vacancy was deleted after the search session was created
+        return "<i>This vacancy is no longer available</i>\n"
+    return card
     
 
-async def post_vacancy_answer(message: types.Message, vacancy, markup, prefix: str = ""):
+async def post_vacancy_answer(message: types.Message, seeker_profile: SeekerProfile, vacancy, markup,
+                              prefix: str = ""):
     await message.answer(
         prefix + 
         "Current vacancy:\n" + 
-        get_vacancy_message(vacancy), 
+        await get_vacancy_message(seeker_profile, vacancy), 
         reply_markup=markup, 
         parse_mode="HTML")
     await message.delete()
 
 
+async def get_search_context(seeker_profile: SeekerProfile):
+    """
+    Returns the search context of the seeker, resuming it from their search session if the profile was loaded anew
+    """
+    if seeker_profile.vacancies_search_context is None:
+        if not await async_sweet_home.seeker_home.resume_search_context(seeker_profile):
+            return None
+    return seeker_profile.vacancies_search_context
+
+
+async def answer_search_expired(call: types.CallbackQuery, state: FSMContext, seeker_profile: SeekerProfile):
+    await call.message.answer("Your search session has expired, please start a new search",
+        reply_markup=seeker_profile.seeker_markup.get_current_markup())
+    await call.message.delete()
+    await state.set_state(MenuStates.seeker_home)
+
+
 async def jump_with_filters(step, call: types.CallbackQuery, state: FSMContext):
-    seeker_profile = get_seeker_profile(call.from_user.id)
-    vsc = seeker_profile.vacancies_search_context
-    assert vsc is not None
+    seeker_profile = await get_seeker_profile(call.from_user.id)
+    vsc = await get_search_context(seeker_profile)
+    if vsc is None:
+        await answer_search_expired(call, state, seeker_profile)
+        return
 
     data = await state.get_data()
     desired_salary: (tuple[int, int] | None) = data.get('desired_salary')
     desired_position = data.get('desired_position')
-    if not vsc.jump_vacancy_with_filters(step, desired_salary, desired_position):
+    if not await async_sweet_home.seeker_home.jump_vacancy_with_filters(seeker_profile, step,
+                                                                        desired_salary, desired_position):
         logging.error("Failed to decrement")
 
     vacancy = vsc.get_current_vacancy()
-    await post_vacancy_answer(call.message, vacancy, vsc.inline_markup.get_current_markup())
+    await post_vacancy_answer(call.message, seeker_profile, vacancy, vsc.inline_markup.get_current_markup())
 
 
 @seeker_router.callback_query(F.data == "prev", MenuStates.seeker_vacancy_search)
@@ -302,7 +344,7 @@ async def on_next_pressed_search(call: types.CallbackQuery, state: FSMContext):
 
 @seeker_router.callback_query(F.data == "back", MenuStates.seeker_vacancy_search)
 async def on_back_pressed_search(call: types.CallbackQuery, state: FSMContext):
-    seeker_profile: SeekerProfile = get_seeker_profile(call.from_user.id)
+    seeker_profile: SeekerProfile = await get_seeker_profile(call.from_user.id)
     await call.message.answer("Returning back to seeker home", 
         reply_markup=seeker_profile.seeker_markup.get_current_markup())
     await call.message.delete()
@@ -311,8 +353,11 @@ async def on_back_pressed_search(call: types.CallbackQuery, state: FSMContext):
 
 @seeker_router.callback_query(F.data == "apply", MenuStates.seeker_vacancy_search)
 async def on_apply_pressed_search(call: types.CallbackQuery, state: FSMContext):
-    seeker_profile = get_seeker_profile(call.from_user.id)
-    vsc = seeker_profile.vacancies_search_context
+    seeker_profile = await get_seeker_profile(call.from_user.id)
+    vsc = await get_search_context(seeker_profile)
+    if vsc is None:
+        logging.error("Search session of user %d has expired", seeker_profile.get_id())
+        return
 
     markup = vsc.inline_markup.get_current_markup()
     vacancy = vsc.get_current_vacancy()
@@ -320,14 +365,15 @@ async def on_apply_pressed_search(call: types.CallbackQuery, state: FSMContext):
         logging.error("Internal search context error. Vacancy is none")
         return
 
-    created = sweet_home.seeker_home.add_applicant(vacancy, seeker_profile)
+    created = await async_sweet_home.seeker_home.add_applicant(vacancy, seeker_profile)
     if not created:
-        logging.warn(f"User {seeker_profile} tried to apply for the vacancy {vacancy} he already applied before")
-        await post_vacancy_answer(call.message, vacancy, markup, 
+        logging.warning("User %d tried to apply for the vacancy %d they already applied for before",
+                        seeker_profile.get_id(), vacancy.get_id())
+        await post_vacancy_answer(call.message, seeker_profile, vacancy, markup, 
             prefix="You have already applied to this vacancy. Recruiter will let you know if they deside you are a match!\n\n")
         return
 
-    await post_vacancy_answer(call.message, vacancy, markup, 
+    await post_vacancy_answer(call.message, seeker_profile, vacancy, markup, 
         prefix="Successfully applied to the vacancy. Recruiter will see you in the list of applicants:\n\n")
 
 
@@ -344,7 +390,7 @@ async def on_salary_filter_message(message: types.Message, state: FSMContext):
     # The regex groups (min_salary and max_salary) are captured and can be accessed
     match = re.match(salary_regex, message.text)
     if not match:
-        logging.error(f"Failed to parse salary for message \"{message.text}\"!")
+        logging.error("Failed to parse salary for message \"%s\"!", message.text)
         await message.answer("Failed to parse salary. Enter the desired annual salary in format \"5000, 10000\")")
         return
 
@@ -378,26 +424,28 @@ async def on_position_filter_message(message: types.Message, state: FSMContext):
 
 @seeker_router.callback_query(F.data == "done", MenuStates.seeker_vacancy_filters)
 async def on_vacancy_filters_back(call: types.CallbackQuery, state: FSMContext):
-    seeker_profile = get_seeker_profile(call.from_user.id)
-    vsc = seeker_profile.vacancies_search_context
-    
+    seeker_profile = await get_seeker_profile(call.from_user.id)
+    # The profile may have been evicted from the cache while the filters were being set
+    vsc = await get_search_context(seeker_profile)
+    if vsc is None:
+        await answer_search_expired(call, state, seeker_profile)
+        return
+
     # Filters
     data = await state.get_data()
     desired_salary: (tuple[int, int] | None) = data.get('desired_salary')
     desired_position = data.get('desired_position')
 
-    logging.info(f"Filters are {desired_salary}, {desired_position}")
+    logging.debug("Filters are %s, %s", desired_salary, desired_position)
 
     # We need to manually check if FIRST vacancy is suitable!
-    position_regex = None
-    if desired_position is not None:
-        position_regex = re.compile(re.escape(desired_position), re.IGNORECASE)
-
     first_vacancy = None
-    if vsc.is_current_vacancy_by_filters(desired_salary, position_regex):
+    if await async_sweet_home.seeker_home.is_current_vacancy_by_filters(seeker_profile, desired_salary,
+                                                                         desired_position):
         logging.info("Picked current vacancy as it is filtered already")
         first_vacancy = vsc.get_current_vacancy()
-    elif vsc.jump_vacancy_with_filters(1, desired_salary, desired_position):
+    elif await async_sweet_home.seeker_home.jump_vacancy_with_filters(seeker_profile, 1,
+                                                                      desired_salary, desired_position):
         logging.info("Jumped from first to filtered")
         first_vacancy = vsc.get_current_vacancy()
 
@@ -409,6 +457,6 @@ async def on_vacancy_filters_back(call: types.CallbackQuery, state: FSMContext):
         await state.set_state(MenuStates.seeker_home)
         return
 
-    await post_vacancy_answer(call.message, first_vacancy, vsc.inline_markup.get_current_markup(), 
+    await post_vacancy_answer(call.message, seeker_profile, first_vacancy, vsc.inline_markup.get_current_markup(), 
         prefix="Successfully found vacancies matching specified filters (if any). Here are the vacancies:\n\n")
     await state.set_state(MenuStates.seeker_vacancy_search)
\ No newline at end of file
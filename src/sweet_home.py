@@ -1,85 +1,208 @@
+import asyncio
+import functools
 import logging
+import time
 
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, Optional
 
 from config import cfg
 from connections import PsqlConnection, Neo4jConnection, RedisConnection, MongoDBConnection
-from users.user_profile import UserProfile
-from users.seeker_profile import SeekerProfile
+from migrations import run_migrations, prepare_vacancy_documents, migrate_company_metrics
+from src.cache_invalidation import CacheInvalidator, VacancyStructures
+from src.caches import TTLCache
+from src.metrics import StorageMetrics
+from src.users.search_session import SearchSession
+from src.users.vacancy import VacancyCatalog
+from src.users.vacancy_index import VacancyIndex, scan_vacancy_documents
+from src.users.vacancy_ranker import RankedVacancies, VacancyRanker
+from users.user_profile import UserProfile, JOINED_PROFILE_QUERY
+from users.seeker_profile import SeekerProfile, SearchPosition
 from users.recruiter_profile import RecruiterProfile
 from users.vacancy import Vacancy
+from src.users.company import Company
 from src.users.company_registry import CompanyRegistry
 
 
 class SweetConnections:
     def __init__(self) -> None:
         self.cfg = cfg
+        # Shared by all connections and served on /metrics
+        self.metrics = StorageMetrics()
         self.sql_connection = PsqlConnection(
             cfg.postgres_host,
             cfg.postgres_db,
             cfg.postgres_user,
-            cfg.postgres_password.get_secret_value()
+            cfg.postgres_password.get_secret_value(),
+            pool_min_size=cfg.postgres_pool_min_size,
+            pool_max_size=cfg.postgres_pool_max_size,
+            acquire_timeout=cfg.postgres_pool_timeout,
+            connect_timeout=cfg.storage_connect_timeout,
+            metrics=self.metrics
         )
         self.redis_connection = RedisConnection(
             cfg.redis_host,
-            cfg.redis_password.get_secret_value()
+            cfg.redis_password.get_secret_value(),
+            connect_timeout=cfg.storage_connect_timeout,
+            metrics=self.metrics
         )
         self.mongodb_connection = MongoDBConnection(
             cfg.mongo_host,
             cfg.mongo_initdb_root_username,
             cfg.mongo_initdb_root_password.get_secret_value(),
-            cfg.mongo_dbname
+            cfg.mongo_dbname,
+            connect_timeout=cfg.storage_connect_timeout,
+            metrics=self.metrics
         )
         self.neo4j_connection = Neo4jConnection(
             cfg.neo4j_host,
             cfg.neo4j_user,
-            cfg.neo4j_password.get_secret_value()
+            cfg.neo4j_password.get_secret_value(),
+            connect_timeout=cfg.neo4j_connect_timeout,
+            metrics=self.metrics
         )
-
+        # Connections are not dialed here. Each one is opened on first use, or all at once with open()
+
+        # User profiles by user_id, see SweetHome.request_user_profile. Workers sharing the databases invalidate
+        # profiles they change in the caches of each other through user_profile_invalidator
+        self.user_profiles = TTLCache(cfg.user_cache_size, cfg.user_cache_ttl, max_weight=cfg.user_cache_max_bytes,
+                                      weigh=UserProfile.estimate_size)
+        self.metrics.register_cache("user_profiles", self.user_profiles)
+        self.user_profile_invalidator = CacheInvalidator(self.redis_connection, "invalidate:user_profiles",
+                                                         self.user_profiles, parse_key=int)
+        # Portfolios of seekers by portfolio_ref, invalidated by SeekerHome.update_seeker_portfolio
+        self.seeker_portfolios = TTLCache(cfg.portfolio_cache_size, cfg.portfolio_cache_ttl)
+        self.metrics.register_cache("seeker_portfolios", self.seeker_portfolios)
+        self.seeker_portfolio_invalidator = CacheInvalidator(self.redis_connection, "invalidate:seeker_portfolios",
+                                                             self.seeker_portfolios)
+        # Vacancy documents by vacancy_doc_ref. Written through by RecruiterProfile.add_vacancy and invalidated
+        # by delete_vacancy, which are the only writers of vacancy documents
+        self.vacancy_documents = TTLCache(cfg.vacancy_cache_size, cfg.vacancy_cache_ttl)
+        self.metrics.register_cache("vacancy_documents", self.vacancy_documents)
+        # Vacancy cards shown to seekers by vacancy_id, see SeekerHome.get_vacancy_card. Cards of the vacancies
+        # workers delete are invalidated through vacancy_card_invalidator
+        self.vacancy_cards = TTLCache(cfg.vacancy_card_cache_size, cfg.vacancy_card_cache_ttl)
+        self.metrics.register_cache("vacancy_cards", self.vacancy_cards)
+        self.vacancy_card_invalidator = CacheInvalidator(self.redis_connection, "invalidate:vacancy_cards",
+                                                         self.vacancy_cards, parse_key=int)
+        # Companies by company_id. Workers changing the metrics of a company have the others re-read them
+        # through company_invalidator
+        self.company_registry = CompanyRegistry(self.sql_connection, self.redis_connection)
+        self.company_invalidator = CacheInvalidator(self.redis_connection, "invalidate:companies",
+                                                    self.company_registry, parse_key=int)
+        # Keyword index over positions and descriptions of vacancies, built by open()
+        self.vacancy_index = VacancyIndex()
+        # Columns of vacancies filtered by salary and company, built by open()
+        self.vacancy_catalog = VacancyCatalog()
+        # Term frequencies of vacancies ranked against seeker portfolios, built by open()
+        self.vacancy_ranker = VacancyRanker(cfg.ranker_features)
+        # Applies the vacancies other workers publish or delete to the index, the catalog and the ranker
+        self.vacancy_invalidator = CacheInvalidator(self.redis_connection, "invalidate:vacancies",
+                                                    VacancyStructures(self.mongodb_connection, self.vacancy_index,
+                                                                      self.vacancy_catalog, self.vacancy_ranker),
+                                                    parse_key=int)
+        # Vacancies recommended to each seeker by seeker id, see SeekerHome.create_recommendations_context
+        self.recommendations = TTLCache(cfg.recommendations_cache_size, cfg.recommendations_cache_ttl)
+        self.metrics.register_cache("recommendations", self.recommendations)
+
+
+    def open(self) -> bool:
+        """
+        Opens all connections concurrently and waits until each of them is either open or out of its connect timeout.
+        Returns True if all of them were opened. Stores that failed are retried lazily on their next use
+        """
+        logging.info("Opening database connections")
+        start = time.perf_counter()
+        openers: dict[str, Callable[[], bool]] = {
+            "postgres": self._open_sql_connection,
+            "mongodb": self.mongodb_connection.open,
+            "redis": self.redis_connection.open,
+            "neo4j": self.neo4j_connection.open,
+        }
+
+        def timed_open(opener: Callable[[], bool]) -> tuple[bool, float]:
+            opener_start = time.perf_counter()
+            return opener(), time.perf_counter() - opener_start
+
+        # Not used as a context manager: leaving it would wait for a store that is stuck past its timeout
+        executor = ThreadPoolExecutor(max_workers=len(openers), thread_name_prefix="open-connection")
+        futures = {store: executor.submit(timed_open, opener) for store, opener in openers.items()}
+        executor.shutdown(wait=False)
+
+        # Stores enforce their own timeouts, this only guards against a driver that does not
+        deadline = start + max(self.cfg.storage_connect_timeout, self.cfg.neo4j_connect_timeout) + 5
+        all_opened = True
+        opened_stores = set()
+        for store, future in futures.items():
+            try:
+                opened, seconds = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+            except TimeoutError:
+                logging.warning("Gave up waiting for %s connection", store)
+                all_opened = False
+                continue
+
+            if opened:
+                opened_stores.add(store)
+                logging.info("Opened %s connection in %.2fs", store, seconds)
+            else:
+                logging.warning("Failed to open %s connection in %.2fs", store, seconds)
+                all_opened = False
+
+        if "redis" in opened_stores:
+            migrate_company_metrics(self.redis_connection)
+            self.user_profile_invalidator.start()
+            self.seeker_portfolio_invalidator.start()
+            self.vacancy_invalidator.start()
+            self.vacancy_card_invalidator.start()
+            self.company_invalidator.start()
+        if {"postgres", "mongodb"} <= opened_stores:
+            prepare_vacancy_documents(self.sql_connection, self.mongodb_connection)
+        if "mongodb" in opened_stores:
+            self._build_vacancy_structures()
+
+        logging.info("Database connections started up in %.2fs", time.perf_counter() - start)
+        return all_opened
+
+
+    def close(self):
+        self.user_profile_invalidator.stop()
+        self.seeker_portfolio_invalidator.stop()
+        self.vacancy_invalidator.stop()
+        self.vacancy_card_invalidator.stop()
+        self.company_invalidator.stop()
+        self.sql_connection.close()
+        self.mongodb_connection.close()
+        self.redis_connection.close()
+        self.neo4j_connection.close()
+
+
+    def _build_vacancy_structures(self):
+        """
+        Builds the vacancy index, catalog and ranker from a single scan of the vacancy documents.
+        If the scan fails, searches fall back to the databases, and the ranker is built when first needed
+        """
+        start = time.perf_counter()
         try:
-            logging.info("Opening database connections")
-            self.sql_connection.open()
-            self.mongodb_connection.open()
-            self.redis_connection.open()
-            self.neo4j_connection.open()
-            self._sql_db_init()
-        except Exception as _:
-            logging.warning("Failed to open some database connections")
+            documents = list(scan_vacancy_documents(self.mongodb_connection))
+        except Exception as e:
+            logging.error("Error while scanning vacancy documents: %s", e)
             return
-            
-
-    def _sql_db_init(self):
-        self.sql_connection.execute_query(f"""
-            CREATE TABLE IF NOT EXISTS user_profiles (
-                user_id BIGINT PRIMARY KEY, 
-                first_name VARCHAR(255), 
-                last_name VARCHAR(255))""")
-
-        # They should be created before because of the relationships between tables
-        # For instance recruiter_profiles need companies table to exist 
-        self.sql_connection.execute_query(f"""
-            CREATE TABLE IF NOT EXISTS vacancies (
-                vacancy_id SERIAL PRIMARY KEY,
-                recruiter_id BIGINT, 
-                vacancy_doc_ref VARCHAR(255))""")
-
-        self.sql_connection.execute_query(f"""
-            CREATE TABLE IF NOT EXISTS companies (
-                company_id SERIAL PRIMARY KEY, 
-                name VARCHAR(255))""")
-
-        self.sql_connection.execute_query(f"""
-            CREATE TABLE IF NOT EXISTS seeker_profiles (
-                user_id BIGINT PRIMARY KEY, 
-                portfolio_ref VARCHAR(255) NOT NULL, 
-                seeker_node_ref BIGINT NOT NULL)""")
-            
-        self.sql_connection.execute_query(f"""
-            CREATE TABLE IF NOT EXISTS recruiter_profiles (
-                user_id BIGINT PRIMARY KEY, 
-                recruiter_node_ref BIGINT, 
-                company_id INT,
-                FOREIGN KEY (company_id) REFERENCES companies(company_id))""")
+
+        logging.info("Scanned %d vacancy documents in %.2fs", len(documents), time.perf_counter() - start)
+        # Without vacancy_invalidator, the index and the catalog would miss the vacancies of other workers,
+        # so filtered searches keep querying MongoDB instead
+        if self.vacancy_invalidator.is_started():
+            self.vacancy_index.build(self.mongodb_connection, documents)
+            self.vacancy_catalog.build(self.mongodb_connection, documents)
+        else:
+            logging.warning("Not listening to vacancies of other workers, filtered searches query MongoDB")
+        self.vacancy_ranker.build(self.mongodb_connection, documents)
+
+
+    def _open_sql_connection(self) -> bool:
+        if not self.sql_connection.open():
+            return False
+        return run_migrations(self.sql_connection) is not None
 
 
 
@@ -103,6 +226,7 @@ class ProfileHome:
             self._sweet_connections.neo4j_connection, 
             self._sweet_connections.sql_connection
         )
+        self._sweet_connections.user_profile_invalidator.notify(user_profile.get_id())
 
 
     def add_company(self, company_name: str, company_employees: int, company_vacancies: int = 0):
@@ -120,6 +244,7 @@ class ProfileHome:
             self._sweet_connections.neo4j_connection,
             self._sweet_connections.sql_connection
         )
+        self._sweet_connections.user_profile_invalidator.notify(user_profile.get_id())
 
 
     def search_company_by_name(self, company_name: str):
@@ -132,12 +257,16 @@ class ProfileHome:
 
     def edit_user_profile(self, user_profile: UserProfile, first_name: str, last_name: str):
         user_profile.update(self._sweet_connections.sql_connection, first_name, last_name)
+        self._sweet_connections.user_profile_invalidator.notify(user_profile.get_id())
 
 
 class SeekerHome:
     def __init__(self, sweet_connections: SweetConnections, company_registry: CompanyRegistry):
         self._sweet_connections = sweet_connections
         self._company_registry = company_registry
+        # Search contexts prefetch the next page of vacancies here, off the critical path of the handlers
+        self._prefetch_executor = ThreadPoolExecutor(max_workers=sweet_connections.cfg.prefetch_workers,
+                                                     thread_name_prefix="vacancies-prefetch")
 
 
     def request_seeker_profile(self, user_profile: UserProfile) -> bool:
@@ -149,8 +278,31 @@ class SeekerHome:
         return seeker_profile.get_portfolio(self._sweet_connections.mongodb_connection)
 
 
+    def request_seeker_portfolios(self, seeker_profiles: list[SeekerProfile]) -> list[(dict[str, Any] | None)]:
+        """
+        Fetches portfolios of all seekers with one bulk query, except for those cached already.
+        Results are in the order of seeker_profiles
+        """
+        portfolio_cache = self._sweet_connections.seeker_portfolios
+        portfolio_refs = [seeker_profile.get_portfolio_ref() for seeker_profile in seeker_profiles]
+        portfolios = portfolio_cache.get_many(portfolio_refs)
+
+        missing_refs = [portfolio_ref for portfolio_ref in portfolio_refs if portfolio_ref not in portfolios]
+        if len(missing_refs) > 0:
+            queried_portfolios = self._sweet_connections.mongodb_connection.find_many("portfolios", missing_refs)
+            portfolio_cache.put_many(queried_portfolios)
+            portfolios.update(queried_portfolios)
+        return [portfolios.get(portfolio_ref) for portfolio_ref in portfolio_refs]
+
+
     def update_seeker_portfolio(self, seeker_profile: SeekerProfile, portfolio: Dict[str, Any]) -> bool:
-        return seeker_profile.update_portfolio(self._sweet_connections.mongodb_connection, portfolio)
+        if not seeker_profile.update_portfolio(self._sweet_connections.mongodb_connection, portfolio):
+            return False
+
+        self._sweet_connections.recommendations.invalidate(seeker_profile.get_id())
+        self._sweet_connections.seeker_portfolios.invalidate(seeker_profile.get_portfolio_ref())
+        self._sweet_connections.seeker_portfolio_invalidator.notify(seeker_profile.get_portfolio_ref())
+        return True
 
 
     def create_search_context(self, seeker_profile: SeekerProfile) -> bool:
@@ -160,14 +312,147 @@ class SeekerHome:
         if seeker_profile is None:
             return False
 
-        seeker_profile.add_search_context(self._sweet_connections.sql_connection, self._sweet_connections.mongodb_connection)
+        self._add_search_context(seeker_profile, self._create_search_session(seeker_profile))
         return True
 
 
+    def create_recommendations_context(self, seeker_profile: SeekerProfile) -> bool:
+        """
+        Creates a search context going through the vacancies most relevant to the portfolio of the seeker.
+        They are ranked once and reused until the portfolio is updated.
+        False if not valid seeker, the seeker has no portfolio or failed operation
+        """
+        if seeker_profile is None:
+            return False
+
+        vacancy_ranker = self._sweet_connections.vacancy_ranker
+        if not vacancy_ranker.is_ready() and not vacancy_ranker.build(self._sweet_connections.mongodb_connection):
+            return False
+
+        ranked_vacancies = self._sweet_connections.recommendations.get(seeker_profile.get_id())
+        if ranked_vacancies is None:
+            portfolio = seeker_profile.get_portfolio(self._sweet_connections.mongodb_connection)
+            if portfolio is None:
+                return False
+
+            vacancies = vacancy_ranker.rank(SeekerProfile.get_portfolio_text(portfolio),
+                                            self._sweet_connections.cfg.recommendations_limit)
+            ranked_vacancies = RankedVacancies(vacancy_ranker, vacancies)
+            self._sweet_connections.recommendations.put(seeker_profile.get_id(), ranked_vacancies)
+
+        # The search session of a previous search must not be resumed instead
+        self._create_search_session(seeker_profile).delete()
+        seeker_profile.add_search_context(self._sweet_connections.sql_connection, self._sweet_connections.mongodb_connection,
+                                          self._prefetch_executor, self._sweet_connections.vacancy_documents,
+                                          ranked_vacancies=ranked_vacancies)
+        return True
+
+
+    def resume_search_context(self, seeker_profile: SeekerProfile) -> bool:
+        """
+        Restores the search context of the seeker from their search session, e.g. after a restart of the bot
+        or when the seeker is served by another worker. False if there is no session or it expired
+        """
+        if seeker_profile is None:
+            return False
+
+        search_session = self._create_search_session(seeker_profile)
+        resume_from = search_session.load_position()
+        if resume_from is None:
+            return False
+
+        self._add_search_context(seeker_profile, search_session, resume_from)
+        return not seeker_profile.vacancies_search_context.empty_context
+
+
+    def _create_search_session(self, seeker_profile: SeekerProfile) -> SearchSession:
+        return SearchSession(self._sweet_connections.redis_connection, seeker_profile.get_id(),
+                             self._sweet_connections.cfg.search_session_ttl)
+
+
+    def _add_search_context(self, seeker_profile: SeekerProfile, search_session: SearchSession,
+                            resume_from: Optional[tuple] = None):
+        seeker_profile.add_search_context(self._sweet_connections.sql_connection, self._sweet_connections.mongodb_connection,
+                                          self._prefetch_executor, self._sweet_connections.vacancy_documents,
+                                          self._sweet_connections.vacancy_index,
+                                          self._sweet_connections.vacancy_catalog,
+                                          search_session, resume_from)
+
+
     def add_applicant(self, vacancy:Vacancy, seeker_profile: SeekerProfile) -> bool:
         return vacancy.add_applicant(seeker_profile.get_seeker_node_ref(), self._sweet_connections.neo4j_connection)
 
 
+    def is_current_vacancy_by_filters(self, seeker_profile: SeekerProfile, salary: tuple[int, int],
+                                      position: str) -> bool:
+        return seeker_profile.vacancies_search_context.is_current_vacancy_by_filters(salary, position)
+
+
+    def jump_vacancy_with_filters(self, seeker_profile: SeekerProfile, step: int, salary: tuple[int, int],
+                                  position: str) -> Optional[SearchPosition]:
+        return seeker_profile.vacancies_search_context.jump_vacancy_with_filters(step, salary, position)
+
+
+    def get_vacancy_view(self, seeker_profile: SeekerProfile, vacancy: Vacancy):
+        """
+        Returns vacancy data along with its company and company metrics.
+        Documents of all vacancies on the current page (chunk) of the search are read with one MongoDB query
+        (unless they were prefetched already), and metrics of their companies with one Redis round trip.
+        Both are reused until the seeker moves to another page
+        """
+        mongodb_connection = self._sweet_connections.mongodb_connection
+        document_cache = self._sweet_connections.vacancy_documents
+        chunk = seeker_profile.vacancies_search_context.get_current_chunk()
+        if chunk.documents is None:
+            chunk.load_documents(mongodb_connection, document_cache)
+
+        data = chunk.documents.get(vacancy.get_doc_ref())
+        if data is None:
+            data = vacancy.get_vacancy_data(mongodb_connection, document_cache)
+        if data is None:
+            return None, None, None
+
+        company_id = int(data['company'])
+        company = self._company_registry.get_company(company_id)
+
+        if chunk.company_metrics is None:
+            company_ids = {int(document['company']) for document in chunk.documents.values()} | {company_id}
+            chunk.company_metrics = self._company_registry.get_metrics_many(list(company_ids))
+
+        metrics = chunk.company_metrics.get(company_id)
+        if metrics is None:
+            metrics = self._company_registry.get_metrics(company_id)
+        return data, company, metrics
+
+
+    def get_vacancy_card(self, seeker_profile: SeekerProfile, vacancy: Vacancy,
+                         render: Callable[[Dict[str, Any], Company, dict[str, int]], str]) -> (str | None):
+        """
+        Returns the vacancy rendered by render(data, company, metrics), None if there is no such vacancy.
+        Cards are cached by vacancy_id along with the version of the company metrics they show, so a popular
+        vacancy renders with no storage round trips until it is deleted or the metrics of its company change.
+        Workers deleting vacancies or changing the metrics of companies have the others drop the cards
+        and re-read the metrics (bumping their version), see RecruiterHome.delete_vacancy
+        """
+        vacancy_cards = self._sweet_connections.vacancy_cards
+        cached = vacancy_cards.get(vacancy.get_id())
+        if cached is not None:
+            company_id, metrics_version, card = cached
+            company = self._company_registry.get_company(company_id)
+            if company is not None and company.metrics.version == metrics_version:
+                return card
+
+        data, company, _ = self.get_vacancy_view(seeker_profile, vacancy)
+        if data is None or company is None:
+            return None
+
+        # Rendered from the metrics the version stands for, which are at least as fresh as those of the view
+        metrics_version, metrics = company.metrics.snapshot()
+        card = render(data, company, metrics)
+        vacancy_cards.put(vacancy.get_id(), (company.get_id(), metrics_version, card))
+        return card
+
+
     def get_company_registry(self) -> CompanyRegistry:
         return self._company_registry
         
@@ -178,7 +463,8 @@ class RecruiterHome:
         self._company_registry = company_registry
 
     def get_vacancy_data(self, vacancy: Vacancy):
-        return vacancy.get_vacancy_data(self._sweet_connections.mongodb_connection)
+        return vacancy.get_vacancy_data(self._sweet_connections.mongodb_connection,
+                                        self._sweet_connections.vacancy_documents)
 
 
     def get_company(self, recruiter_profile: RecruiterProfile):
@@ -186,11 +472,17 @@ class RecruiterHome:
 
 
     def add_vacancy(self, recruiter_profile: RecruiterProfile, vacancy_data: dict):
-        recruiter_profile.add_vacancy(self._sweet_connections.sql_connection,
+        vacancy_id = recruiter_profile.add_vacancy(self._sweet_connections.sql_connection,
                                       self._sweet_connections.mongodb_connection,
                                       self._sweet_connections.neo4j_connection,
                                       self._sweet_connections.redis_connection, self._company_registry,
-                                      vacancy_data)
+                                      vacancy_data, self._sweet_connections.vacancy_documents,
+                                      self._sweet_connections.vacancy_index, self._sweet_connections.vacancy_catalog,
+                                      self._sweet_connections.vacancy_ranker)
+        self._sweet_connections.user_profile_invalidator.notify(recruiter_profile.get_id())
+        self._sweet_connections.vacancy_invalidator.notify(vacancy_id)
+        # Cards of the other vacancies of the company show its count of vacancies
+        self._sweet_connections.company_invalidator.notify(self.get_company(recruiter_profile).get_id())
 
 
     def delete_vacancy(self, recruiter_profile: RecruiterProfile, vacancy_data: tuple):
@@ -198,11 +490,21 @@ class RecruiterHome:
                                       self._sweet_connections.mongodb_connection,
                                       self._sweet_connections.neo4j_connection,
                                       self._sweet_connections.redis_connection, self._company_registry,
-                                      vacancy_data)
+                                      vacancy_data, self._sweet_connections.vacancy_documents,
+                                      self._sweet_connections.vacancy_index, self._sweet_connections.vacancy_catalog,
+                                      self._sweet_connections.vacancy_ranker)
+        # Other workers reload the cached vacancies of the recruiter
+        self._sweet_connections.user_profile_invalidator.notify(recruiter_profile.get_id())
+        vacancy_id, _ = vacancy_data
+        self._sweet_connections.vacancy_invalidator.notify(vacancy_id)
+        self._sweet_connections.vacancy_cards.invalidate(vacancy_id)
+        self._sweet_connections.vacancy_card_invalidator.notify(vacancy_id)
+        self._sweet_connections.company_invalidator.notify(self.get_company(recruiter_profile).get_id())
 
 
     def get_vacancy_data(self, vacancy: Vacancy):
-        return vacancy.get_vacancy_data(self._sweet_connections.mongodb_connection)
+        return vacancy.get_vacancy_data(self._sweet_connections.mongodb_connection,
+                                        self._sweet_connections.vacancy_documents)
 
 
     def get_vacancies_data(self, recruiter_profile: RecruiterProfile):
@@ -210,17 +512,26 @@ class RecruiterHome:
                                                     self._sweet_connections.mongodb_connection)
 
 
+    def get_vacancy_document(self, vacancy_doc_ref: str):
+        document_cache = self._sweet_connections.vacancy_documents
+        document = document_cache.get(vacancy_doc_ref)
+        if document is None:
+            document = self._sweet_connections.mongodb_connection.get_document("vacancies", vacancy_doc_ref)
+            if document is not None:
+                document_cache.put(vacancy_doc_ref, document)
+        return document
+
+
     def get_vacancy_applicants(self, recruiter_profile: RecruiterProfile, vacancy_id: int):
-        return recruiter_profile.get_vacancy_applicants(self._sweet_connections.neo4j_connection, vacancy_id)
+        return recruiter_profile.get_vacancy_applicants(self._sweet_connections.sql_connection,
+                                                        self._sweet_connections.neo4j_connection, vacancy_id)
 
 
 
 class SweetHome:
     def __init__(self, sweet_connections: SweetConnections) -> None:
         self._sweet_connections = sweet_connections
-        self._company_registry = CompanyRegistry(self._sweet_connections.sql_connection,
-                                                 self._sweet_connections.redis_connection)
-        self._user_cache: dict[int, UserProfile] = {}
+        self._company_registry = sweet_connections.company_registry
         self.profile_home = ProfileHome(sweet_connections, self._company_registry)
         self.seeker_home = SeekerHome(sweet_connections, self._company_registry)
         self.recruiter_home = RecruiterHome(sweet_connections, self._company_registry)
@@ -229,41 +540,245 @@ class SweetHome:
     def request_user_profile(self, user_id: int) -> (UserProfile | None):
         # Avoid querying sql connection everytime using cached values
         # cached values must ensure they are always up-to-date with sql connection and vice versa
-        user_profile: (UserProfile | None) = self._user_cache.get(user_id)
+        user_profiles = self._sweet_connections.user_profiles
+        user_profile: (UserProfile | None) = user_profiles.get(user_id)
         if user_profile is not None:
+            # Search contexts and cached vacancies grow profiles after they were cached
+            user_profiles.reweigh(user_id)
             return user_profile
 
-        row = self._sweet_connections.sql_connection.execute_query_fetchone(
-            f"SELECT * FROM user_profiles WHERE user_id = {user_id}")
+        # Seeker and recruiter profiles come with the same row. Vacancies of recruiters are loaded once needed
+        row = self._sweet_connections.sql_connection.execute_prepared_fetchone(
+            "user_profile_joined_by_id", JOINED_PROFILE_QUERY + "WHERE u.user_id = $1", user_id)
         if row is None:
             return None
 
-        first_name = row['first_name']
-        last_name = row['last_name']
-        # We do not specify seeker_profile and recruiter_profile here. Those will be set explicitly
-        user_profile = UserProfile(user_id, first_name, last_name)
-        
-        if not user_profile.request_seeker_profile(self._sweet_connections.sql_connection):
+        user_profile = UserProfile.from_joined_row(row)
+        if not user_profile.has_seeker_profile():
             logging.info("Could not set a seeker profile for user with id %d", user_id)
             logging.info("Registration of the seeker profile will be required")
 
-        if not user_profile.request_recruiter_profile(self._sweet_connections.sql_connection,
-                                                      self._sweet_connections.neo4j_connection):
+        if not user_profile.has_recruiter_profile():
             logging.info("Could not set a recruiter profile for user with id %d", user_id)
             logging.info("Registration of the recruiter profile will be required")
 
-        # Cache user profile value in map
-        self._user_cache[user_id] = user_profile
+        user_profiles.put(user_id, user_profile)
         return user_profile
 
 
+    def request_user_profiles(self, user_ids: list[int]) -> list[UserProfile]:
+        """
+        Same as request_user_profile for many users at once: profiles that are not cached are queried
+        with one joined query and cached together. Returns profiles of the users that exist, in the order of user_ids
+        """
+        user_profiles = self._sweet_connections.user_profiles
+        found: dict[int, UserProfile] = user_profiles.get_many(user_ids)
+
+        missing_ids = list({user_id for user_id in user_ids if user_id not in found})
+        if len(missing_ids) > 0:
+            rows = self._sweet_connections.sql_connection.execute_query(
+                JOINED_PROFILE_QUERY + "WHERE u.user_id = ANY(%s)", missing_ids)
+            queried = {row['user_id']: UserProfile.from_joined_row(row) for row in rows or []}
+            user_profiles.put_many(queried)
+            found.update(queried)
+
+        return [found[user_id] for user_id in user_ids if user_id in found]
+
+
+    def request_applicants(self, user_ids: list[int]) -> list[tuple[UserProfile, dict[str, Any]]]:
+        """
+        Returns profiles and portfolios of the seekers among user_ids, in their order, with one query for
+        the profiles and one for the portfolios (both skipped for cached ones). Seekers with no portfolio are left out
+        """
+        user_profiles = [user_profile for user_profile in self.request_user_profiles(user_ids)
+                         if user_profile.has_seeker_profile()]
+        portfolios = self.seeker_home.request_seeker_portfolios([user_profile.seeker_ref
+                                                                 for user_profile in user_profiles])
+        return [(user_profile, portfolio) for user_profile, portfolio in zip(user_profiles, portfolios)
+                if portfolio is not None]
+
+
     def add_user_profile(self, user_profile: UserProfile):
         assert self.request_user_profile(user_profile.get_id()) is None
         user_id = user_profile.get_id()
-        self._user_cache[user_id] = user_profile
+        self._sweet_connections.user_profiles.put(user_id, user_profile)
         self._sweet_connections.sql_connection.execute_query(f"INSERT INTO user_profiles (user_id, first_name, last_name) "
                                            f"VALUES (%s, %s, %s)",
                                            user_id, user_profile.first_name, user_profile.last_name)
 
 
-sweet_home = SweetHome(sweet_connections)
\ No newline at end of file
+sweet_home = SweetHome(sweet_connections)
+
+
+class AsyncHome:
+    """
+    Base of the awaitable facades used by the routers.
+    Every call is forwarded to its synchronous counterpart on the storage worker pool,
+    so a slow database round trip occupies a worker thread instead of the event loop.
+    Profiles passed in are not thread safe: calls on behalf of one user must not overlap, which UserLockMiddleware
+    ensures by handling the updates of each user one at a time. State shared by all users is locked where it lives
+    """
+    def __init__(self, executor: ThreadPoolExecutor):
+        self._executor = executor
+
+
+    async def _run(self, func: Callable, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+
+
+class AsyncProfileHome(AsyncHome):
+    def __init__(self, profile_home: ProfileHome, executor: ThreadPoolExecutor):
+        super().__init__(executor)
+        self._profile_home = profile_home
+
+
+    async def request_seeker_profile(self, user_profile: UserProfile) -> bool:
+        return await self._run(self._profile_home.request_seeker_profile, user_profile)
+
+
+    async def add_seeker_profile(self, user_profile: UserProfile, portfolio: dict):
+        return await self._run(self._profile_home.add_seeker_profile, user_profile, portfolio)
+
+
+    async def add_company(self, company_name: str, company_employees: int, company_vacancies: int = 0):
+        return await self._run(self._profile_home.add_company, company_name, company_employees, company_vacancies)
+
+
+    async def request_recruiter_profile(self, user_profile: UserProfile) -> bool:
+        return await self._run(self._profile_home.request_recruiter_profile, user_profile)
+
+
+    async def add_recruiter_profile(self, user_profile: UserProfile, company_id: int):
+        return await self._run(self._profile_home.add_recruiter_profile, user_profile, company_id)
+
+
+    async def search_company_by_name(self, company_name: str):
+        return await self._run(self._profile_home.search_company_by_name, company_name)
+
+
+    async def get_company_metrics(self, company_id: int):
+        return await self._run(self._profile_home.get_company_metrics, company_id)
+
+
+    async def edit_user_profile(self, user_profile: UserProfile, first_name: str, last_name: str):
+        return await self._run(self._profile_home.edit_user_profile, user_profile, first_name, last_name)
+
+
+class AsyncSeekerHome(AsyncHome):
+    def __init__(self, seeker_home: SeekerHome, executor: ThreadPoolExecutor):
+        super().__init__(executor)
+        self._seeker_home = seeker_home
+
+
+    async def request_seeker_profile(self, user_profile: UserProfile) -> bool:
+        return await self._run(self._seeker_home.request_seeker_profile, user_profile)
+
+
+    async def request_seeker_portfolio(self, seeker_profile: SeekerProfile):
+        return await self._run(self._seeker_home.request_seeker_portfolio, seeker_profile)
+
+
+    async def request_seeker_portfolios(self, seeker_profiles: list[SeekerProfile]) -> list[(dict[str, Any] | None)]:
+        return await self._run(self._seeker_home.request_seeker_portfolios, seeker_profiles)
+
+
+    async def update_seeker_portfolio(self, seeker_profile: SeekerProfile, portfolio: Dict[str, Any]) -> bool:
+        return await self._run(self._seeker_home.update_seeker_portfolio, seeker_profile, portfolio)
+
+
+    async def create_search_context(self, seeker_profile: SeekerProfile) -> bool:
+        return await self._run(self._seeker_home.create_search_context, seeker_profile)
+
+
+    async def create_recommendations_context(self, seeker_profile: SeekerProfile) -> bool:
+        return await self._run(self._seeker_home.create_recommendations_context, seeker_profile)
+
+
+    async def resume_search_context(self, seeker_profile: SeekerProfile) -> bool:
+        return await self._run(self._seeker_home.resume_search_context, seeker_profile)
+
+
+    async def add_applicant(self, vacancy: Vacancy, seeker_profile: SeekerProfile) -> bool:
+        return await self._run(self._seeker_home.add_applicant, vacancy, seeker_profile)
+
+
+    async def is_current_vacancy_by_filters(self, seeker_profile: SeekerProfile, salary: tuple[int, int],
+                                            position: str) -> bool:
+        return await self._run(self._seeker_home.is_current_vacancy_by_filters, seeker_profile, salary, position)
+
+
+    async def jump_vacancy_with_filters(self, seeker_profile: SeekerProfile, step: int, salary: tuple[int, int],
+                                        position: str) -> Optional[SearchPosition]:
+        return await self._run(self._seeker_home.jump_vacancy_with_filters, seeker_profile, step, salary, position)
+
+
+    async def get_vacancy_view(self, seeker_profile: SeekerProfile, vacancy: Vacancy):
+        return await self._run(self._seeker_home.get_vacancy_view, seeker_profile, vacancy)
+
+
+    async def get_vacancy_card(self, seeker_profile: SeekerProfile, vacancy: Vacancy,
+                               render: Callable[[Dict[str, Any], Company, dict[str, int]], str]) -> (str | None):
+        return await self._run(self._seeker_home.get_vacancy_card, seeker_profile, vacancy, render)
+
+
+class AsyncRecruiterHome(AsyncHome):
+    def __init__(self, recruiter_home: RecruiterHome, executor: ThreadPoolExecutor):
+        super().__init__(executor)
+        self._recruiter_home = recruiter_home
+
+
+    async def get_vacancy_data(self, vacancy: Vacancy):
+        return await self._run(self._recruiter_home.get_vacancy_data, vacancy)
+
+
+    async def get_company(self, recruiter_profile: RecruiterProfile):
+        return await self._run(self._recruiter_home.get_company, recruiter_profile)
+
+
+    async def add_vacancy(self, recruiter_profile: RecruiterProfile, vacancy_data: dict):
+        return await self._run(self._recruiter_home.add_vacancy, recruiter_profile, vacancy_data)
+
+
+    async def delete_vacancy(self, recruiter_profile: RecruiterProfile, vacancy_data: tuple):
+        return await self._run(self._recruiter_home.delete_vacancy, recruiter_profile, vacancy_data)
+
+
+    async def get_vacancies_data(self, recruiter_profile: RecruiterProfile):
+        return await self._run(self._recruiter_home.get_vacancies_data, recruiter_profile)
+
+
+    async def get_vacancy_document(self, vacancy_doc_ref: str):
+        return await self._run(self._recruiter_home.get_vacancy_document, vacancy_doc_ref)
+
+
+    async def get_vacancy_applicants(self, recruiter_profile: RecruiterProfile, vacancy_id: int):
+        return await self._run(self._recruiter_home.get_vacancy_applicants, recruiter_profile, vacancy_id)
+
+
+class AsyncSweetHome(AsyncHome):
+    def __init__(self, sweet_home: SweetHome, max_workers: int) -> None:
+        super().__init__(ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sweet-home"))
+        self._sweet_home = sweet_home
+        self.profile_home = AsyncProfileHome(sweet_home.profile_home, self._executor)
+        self.seeker_home = AsyncSeekerHome(sweet_home.seeker_home, self._executor)
+        self.recruiter_home = AsyncRecruiterHome(sweet_home.recruiter_home, self._executor)
+
+
+    async def request_user_profile(self, user_id: int) -> (UserProfile | None):
+        return await self._run(self._sweet_home.request_user_profile, user_id)
+
+
+    async def request_user_profiles(self, user_ids: list[int]) -> list[UserProfile]:
+        return await self._run(self._sweet_home.request_user_profiles, user_ids)
+
+
+    async def request_applicants(self, user_ids: list[int]) -> list[tuple[UserProfile, dict[str, Any]]]:
+        return await self._run(self._sweet_home.request_applicants, user_ids)
+
+
+    async def add_user_profile(self, user_profile: UserProfile):
+        return await self._run(self._sweet_home.add_user_profile, user_profile)
+
+
+async_sweet_home = AsyncSweetHome(sweet_home, cfg.storage_workers)
\ No newline at end of file
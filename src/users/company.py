@@ -1,53 +1,164 @@
+import threading
+
 from src.connections import RedisConnection
 
 
+# Moves the legacy metric keys of a company (KEYS[2], KEYS[3]) into its hash (KEYS[1]) as one atomic step,
+# so that workers reaching the same company at the same time copy them once.
+# A hash with no employees was created by HINCRBY before the migration, its vacancies add up to the legacy ones
+_MIGRATE_LEGACY_METRICS = """
+local employees = redis.call('GET', KEYS[2])
+local vacancies = redis.call('GET', KEYS[3])
+if employees and vacancies then
+    if redis.call('HEXISTS', KEYS[1], 'employees') == 0 then
+        redis.call('HSET', KEYS[1], 'employees', employees)
+        redis.call('HINCRBY', KEYS[1], 'vacancies', vacancies)
+    end
+    redis.call('DEL', KEYS[2], KEYS[3])
+end
+"""
+_MIGRATE_AND_READ_METRICS = _MIGRATE_LEGACY_METRICS + "return redis.call('HGETALL', KEYS[1])"
+_MIGRATE_AND_INCREMENT_VACANCIES = _MIGRATE_LEGACY_METRICS + "return redis.call('HINCRBY', KEYS[1], 'vacancies', ARGV[1])"
+
+
 class CompanyMetrics:
-    def __init__(self, metrics_ref: str):        
+    """
+    Metrics are stored as a single Redis hash per company (company:{id}) with "employees" and "vacancies" fields,
+    so that all of them are read with a single HGETALL.
+    version is bumped whenever the metrics held here change, so that anything rendered from them can tell it is stale
+    """
+    def __init__(self, metrics_ref: str):
         self._metrics_ref = metrics_ref
-        self._employees_ref = f"{metrics_ref}:employees"
-        self._vacancies_ref = f"{metrics_ref}:vacancies"
+        # Keys of the previous layout (one string key per metric). Those are migrated into the hash at startup
+        # (see migrate_company_metrics), or by the first read or increment of the metrics
+        self._legacy_employees_ref = f"{metrics_ref}:employees"
+        self._legacy_vacancies_ref = f"{metrics_ref}:vacancies"
+        # Metrics of a cached company are updated by the handlers of all users, on several storage threads
+        self._lock = threading.Lock()
         self.num_employees: (int | None) = None
         self.num_vacancies: (int | None) = None
+        self.version = 0
+
 
+    def get_ref(self) -> str:
+        return self._metrics_ref
 
-    # Returns True if update was successful, False if failed to query any of the metrics 
+
+    # Returns True if update was successful, False if failed to query any of the metrics
     def update(self, redis_connection: RedisConnection) -> bool:
+        return self.apply(redis_connection.hgetall(self._metrics_ref), redis_connection)
+
+
+    @staticmethod
+    def update_many(metrics_list: list['CompanyMetrics'], redis_connection: RedisConnection) -> None:
+        """
+        Updates all metrics with a single pipelined round trip to Redis
+        """
+        hashes = redis_connection.hgetall_many([metrics.get_ref() for metrics in metrics_list])
+        if hashes is None:
+            return
+
+        for metrics, metrics_hash in zip(metrics_list, hashes):
+            metrics.apply(metrics_hash, redis_connection)
+
+
+    def apply(self, metrics_hash: (dict[bytes, bytes] | None), redis_connection: RedisConnection) -> bool:
+        """
+        Sets metrics from the result of HGETALL. Migrates the legacy keys if the hash does not exist yet
+        """
+        if not metrics_hash or b"employees" not in metrics_hash:
+            metrics_hash = self.migrate_legacy_metrics(redis_connection)
+
         try:
-            self.num_employees = int(redis_connection.get(self._employees_ref))
-            self.num_vacancies = int(redis_connection.get(self._vacancies_ref))
-        except TypeError:
+            self._set(int(metrics_hash[b"employees"]), int(metrics_hash[b"vacancies"]))
+        except (TypeError, KeyError):
             return False
         return True
 
 
     def create_metrics(self, redis_connection: RedisConnection, employees_count: int, vacancies_count: int = 0) -> None:
-        redis_connection.set(self._employees_ref, employees_count)
-        redis_connection.set(self._vacancies_ref, vacancies_count)
-        self.update(redis_connection)
+        redis_connection.hset(self._metrics_ref, {"employees": employees_count, "vacancies": vacancies_count})
+        self._set(employees_count, vacancies_count)
 
 
     def increment_num_vacancies(self, redis_connection: RedisConnection):
-        redis_connection.increment(self._vacancies_ref)
-        self.num_vacancies += 1
+        self._set_num_vacancies(self._increment_vacancies(redis_connection, 1), 1)
 
 
     def decrement_num_vacancies(self, redis_connection: RedisConnection):
-        redis_connection.decrement(self._vacancies_ref)
-        self.num_vacancies -= 1
+        self._set_num_vacancies(self._increment_vacancies(redis_connection, -1), -1)
+
+
+    def migrate_legacy_metrics(self, redis_connection: RedisConnection) -> (dict[bytes, bytes] | None):
+        """
+        Moves the legacy keys into the hash, if they are still there. Returns the hash, None if it failed
+        """
+        fields = redis_connection.run_script(_MIGRATE_AND_READ_METRICS, self._script_keys())
+        if fields is None:
+            return None
+        return dict(zip(fields[::2], fields[1::2]))
+
+
+    def _increment_vacancies(self, redis_connection: RedisConnection, amount: int) -> (int | None):
+        # A plain HINCRBY would create the hash with vacancies only, before the legacy keys are migrated into it
+        return redis_connection.run_script(_MIGRATE_AND_INCREMENT_VACANCIES, self._script_keys(), [amount])
+
+
+    def _script_keys(self) -> list[str]:
+        return [self._metrics_ref, self._legacy_employees_ref, self._legacy_vacancies_ref]
+
+
+    def as_dict(self) -> dict[str, int]:
+        with self._lock:
+            return {"employees": self.num_employees, "open_vacancies": self.num_vacancies}
+
+
+    def snapshot(self) -> tuple[int, dict[str, int]]:
+        """
+        Returns version along with the metrics it stands for
+        """
+        with self._lock:
+            return self.version, {"employees": self.num_employees, "open_vacancies": self.num_vacancies}
+
+
+    def _set_num_vacancies(self, stored_value: (int | None), step: int):
+        with self._lock:
+            # HINCRBY returns the stored value, which also accounts for changes made by other processes
+            if stored_value is not None:
+                self._set_locked(self.num_employees, stored_value)
+            elif self.num_vacancies is not None:
+                self._set_locked(self.num_employees, self.num_vacancies + step)
+
+
+    def _set(self, num_employees: (int | None), num_vacancies: (int | None)):
+        with self._lock:
+            self._set_locked(num_employees, num_vacancies)
+
+
+    def _set_locked(self, num_employees: (int | None), num_vacancies: (int | None)):
+        if (num_employees, num_vacancies) != (self.num_employees, self.num_vacancies):
+            self.num_employees = num_employees
+            self.num_vacancies = num_vacancies
+            self.version += 1
 
 
 class Company:
     def __init__(self, company_id: int, name: str):
         self._id: int = company_id
-        self._redis_metrics_ref = f"company:{company_id}"
+        self._redis_metrics_ref = Company.get_metrics_ref(company_id)
         self.metrics = CompanyMetrics(self._redis_metrics_ref)
         self.name = name
 
 
+    @staticmethod
+    def get_metrics_ref(company_id: int) -> str:
+        return f"company:{company_id}"
+
+
     def get_id(self) -> int:
         return self._id
 
 
     def update_metrics(self, redis_connection: RedisConnection):
         assert self.metrics is not None
-        self.metrics.update(redis_connection)
\ No newline at end of file
+        self.metrics.update(redis_connection)
@@ -1,14 +1,17 @@
 import logging
+import threading
 from typing import Dict
 
 from connections import PsqlConnection, RedisConnection
-from users.company import Company
+from users.company import Company, CompanyMetrics
 
 
 class CompanyRegistry:
     def __init__(self, psql_connection: PsqlConnection, redis_connection: RedisConnection):
         self._sql_connection = psql_connection
         self._redis_connection = redis_connection
+        # Shared by the handlers of all users, running on several storage threads
+        self._companies_lock = threading.Lock()
         self._companies: Dict[int, Company] = {}
 
 
@@ -19,19 +22,19 @@ class CompanyRegistry:
             return company
 
         # if there is no company in cache - query psql connection
-        row = self._sql_connection.execute_query_fetchone(f"SELECT * FROM companies WHERE company_id = {company_id}")
+        row = self._sql_connection.execute_prepared_fetchone("company_by_id",
+                                                             "SELECT * FROM companies WHERE company_id = $1", company_id)
         if row is None:
             return None
 
         company_name = row['name']
         company = Company(company_id, company_name)
         company.update_metrics(self._redis_connection)
-        self._add_company_to_cache(company)
-        return company
+        return self._add_company_to_cache(company)
 
 
     def search_by_name(self, name: str) -> (list[Company] | None):
-        rows = self._sql_connection.execute_query(f"SELECT * FROM companies WHERE name ILIKE %s",
+        rows = self._sql_connection.execute_query("SELECT * FROM companies WHERE name ILIKE %s",
                                                  name + '%',)
         if rows is None:
             return None
@@ -45,32 +48,56 @@ class CompanyRegistry:
             f"INSERT INTO companies (name) VALUES (%s) RETURNING company_id;",
             company_name)
         if company_id_row is None:
-            logging.error(f"An error occured while adding company {company_name}, as company_id was not retrieved.")
+            logging.error("An error occured while adding company %s, as company_id was not retrieved.", company_name)
             return
 
         company_id = company_id_row["company_id"]
 
         company = Company(company_id, company_name)
         company.metrics.create_metrics(self._redis_connection, company_employees, company_vacancies)
-        self._add_company_to_cache(company)
-
-        return company
+        return self._add_company_to_cache(company)
 
 
     def get_metrics(self, company_id: int) -> dict[str, int]:
         company = self._get_company_from_cache(company_id)
         if company is not None:
-            employees = company.metrics.num_employees
-            vacancies = company.metrics.num_vacancies
-        else:
-            employees = int(self._redis_connection.get(f"company:{company_id}:employees"))
-            vacancies = int(self._redis_connection.get(f"company:{company_id}:vacancies"))
-        return {"employees": employees, "open_vacancies": vacancies}
+            return company.metrics.as_dict()
+
+        return self.get_metrics_many([company_id])[company_id]
+
+
+    def get_metrics_many(self, company_ids: list[int]) -> dict[int, dict[str, int]]:
+        """
+        Reads fresh metrics of all companies with one pipelined round trip to Redis.
+        Metrics of the cached companies are refreshed along the way
+        """
+        metrics_by_id: dict[int, CompanyMetrics] = {}
+        for company_id in company_ids:
+            company = self._get_company_from_cache(company_id)
+            metrics_by_id[company_id] = company.metrics if company is not None \
+                else CompanyMetrics(Company.get_metrics_ref(company_id))
+
+        CompanyMetrics.update_many(list(metrics_by_id.values()), self._redis_connection)
+        return {company_id: metrics.as_dict() for company_id, metrics in metrics_by_id.items()}
+
+
+    def invalidate(self, company_id: int):
+        """
+        Re-reads the metrics of the company if it is cached, e.g. once another worker changed them
+        """
+        company = self._get_company_from_cache(company_id)
+        if company is not None:
+            company.update_metrics(self._redis_connection)
 
 
     def _get_company_from_cache(self, company_id: int) -> (Company | None):
-        return self._companies.get(company_id)
+        with self._companies_lock:
+            return self._companies.get(company_id)
 
 
-    def _add_company_to_cache(self, company: Company):
-        self._companies[company.get_id()] = company
\ No newline at end of file
+    def _add_company_to_cache(self, company: Company) -> Company:
+        """
+        Returns the cached company, which is the one loaded first if two threads loaded it at the same time
+        """
+        with self._companies_lock:
+            return self._companies.setdefault(company.get_id(), company)
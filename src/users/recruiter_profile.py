@@ -1,17 +1,22 @@
 import logging
 from dataclasses import dataclass
+from typing import Optional
 
+from src.caches import TTLCache
 from src.users.company_registry import CompanyRegistry
 from src.connections import PsqlConnection, Neo4jConnection, MongoDBConnection, RedisConnection
 from src.users.company import Company
 from src.keyboards.profile_keyboards import RecruiterProfileKeyboardMarkup
-from src.users.vacancy import Vacancy
+from src.users.vacancy import Vacancy, VacancyCatalog, VACANCY_SIZE
+from src.users.vacancy_index import VacancyIndex
+from src.users.vacancy_ranker import VacancyRanker
 
 @dataclass
 class RecruiterProfile:
     _user_id: int
     _company_id: int # Can be used to retrieve company object from companies table in sql connection
     _recruiter_node_ref: str
+    # Vacancies of the recruiter by vacancy_id, None until a recruiter view first needs them (see load_vacancies)
     _cached_vacancies: (dict[int, Vacancy] | None) = None
     recruiter_markup = RecruiterProfileKeyboardMarkup()
 
@@ -20,54 +25,82 @@ class RecruiterProfile:
         return self._user_id
 
 
-    def get_vacancies(self) -> list[Vacancy]:
-        if self._cached_vacancies is None:
-            return []
-        return list(self._cached_vacancies.values())
+    def get_vacancies(self, psql_connection: PsqlConnection) -> list[Vacancy]:
+        return list(self.load_vacancies(psql_connection).values())
+
+
+    def estimate_size(self) -> int:
+        return len(self._cached_vacancies or {}) * VACANCY_SIZE
 
 
     def get_company(self, company_registry: CompanyRegistry) -> Company:
         return company_registry.get_company(self._company_id)
 
 
-    def update_vacancies(self, psql_connection: PsqlConnection, neo4j_connection: Neo4jConnection) -> None:
-        vacancies_id_list = neo4j_connection.run_query("MATCH (v:Vacancy)-[:published_by]->(r:Recruiter "
-                                                       "{user_id: $user_id})"
-                                                        "RETURN DISTINCT v.vacancy_id AS vacancy_id",
-                                                       {"user_id": self._user_id})
-        vacancies_id_tuple = tuple([vid["vacancy_id"] for vid in vacancies_id_list])
+    def load_vacancies(self, psql_connection: PsqlConnection) -> dict[int, Vacancy]:
+        """
+        Returns the vacancies of the recruiter, querying them on first use
+        """
+        if self._cached_vacancies is None:
+            self.update_vacancies(psql_connection)
+        return self._cached_vacancies if self._cached_vacancies is not None else {}
 
-        vacancies_rows = psql_connection.execute_query("SELECT * FROM vacancies "
-                                                       "WHERE vacancy_id IN %s", vacancies_id_tuple)
 
-        if len(vacancies_rows) == 0:
-            logging.info(f"No vacancies were found for seeker profile {self._user_id}")
+    def update_vacancies(self, psql_connection: PsqlConnection) -> None:
+        # vacancies.recruiter_id is indexed, so this is one lookup instead of a graph query followed by an IN query
+        vacancies_rows = psql_connection.execute_prepared("vacancies_by_recruiter",
+                                                          "SELECT vacancy_id, vacancy_doc_ref FROM vacancies "
+                                                          "WHERE recruiter_id = $1", self._user_id)
+        if vacancies_rows is None:
+            logging.error("Failed to query vacancies of recruiter profile %d", self._user_id)
             return
 
+        if len(vacancies_rows) == 0:
+            logging.info("No vacancies were found for recruiter profile %d", self._user_id)
+
         self._cached_vacancies: dict[int, Vacancy] = {}
         for vacancy in vacancies_rows:
             self._cached_vacancies[vacancy["vacancy_id"]] = Vacancy(vacancy["vacancy_id"],
                                                                     self._user_id,
                                                                     vacancy["vacancy_doc_ref"])
 
-        logging.info(f"Updated vacancies cache: {self._cached_vacancies}")
+        logging.debug("Updated vacancies cache of recruiter %d with %d vacancies", self._user_id, len(self._cached_vacancies))
 
     def add_vacancy(self, psql_connection: PsqlConnection, mongodb_connection: MongoDBConnection,
                     neo4j_connection: Neo4jConnection, redis_connection: RedisConnection,
-                    company_registry: CompanyRegistry, vacancy_data: dict) -> None:
-        logging.info(f"Adding vacancy with data {vacancy_data}")
+                    company_registry: CompanyRegistry, vacancy_data: dict,
+                    document_cache: Optional[TTLCache] = None, vacancy_index: Optional[VacancyIndex] = None,
+                    vacancy_catalog: Optional[VacancyCatalog] = None,
+                    vacancy_ranker: Optional[VacancyRanker] = None) -> int:
+        """
+        Publishes the vacancy and returns its vacancy_id
+        """
+        logging.debug("Adding vacancy for recruiter %d", self._user_id)
         document_ref = mongodb_connection.insert_document("vacancies", vacancy_data)
         vacancy_id = psql_connection.execute_query_fetchone("INSERT INTO vacancies (recruiter_id, vacancy_doc_ref) "
                                                             "VALUES (%s, %s) RETURNING vacancy_id;",
                                                             self._user_id, document_ref)["vacancy_id"]
-        neo4j_connection.run_query("MATCH (r:Recruiter) WHERE id(r) = $recruiter_id "
-                                   "CREATE (v: Vacancy {vacancy_id: $vacancy_id})-[:published_by]->(r) "
-                                   "RETURN id(v) AS vacancyId",
-                                   {"recruiter_id": self._recruiter_node_ref, "vacancy_id": vacancy_id})
+        # Filtered search queries vacancy documents directly, so they carry the ids of their vacancy and recruiter
+        mongodb_connection.update_document("vacancies", document_ref,
+                                           {"vacancy_id": vacancy_id, "recruiter_id": self._user_id})
+        neo4j_connection.run_transaction([("MATCH (r:Recruiter) WHERE id(r) = $recruiter_id "
+                                           "CREATE (v: Vacancy {vacancy_id: $vacancy_id})-[:published_by]->(r) "
+                                           "RETURN id(v) AS vacancyId",
+                                           {"recruiter_id": self._recruiter_node_ref, "vacancy_id": vacancy_id})])
         self.get_company(company_registry).metrics.increment_num_vacancies(redis_connection)
+        # Written through, so that the first seekers to see the vacancy do not query it back
+        if document_cache is not None:
+            document_cache.put(document_ref, {**vacancy_data, "vacancy_id": vacancy_id, "recruiter_id": self._user_id})
+        if vacancy_index is not None:
+            vacancy_index.add(vacancy_id, vacancy_data)
+        if vacancy_catalog is not None:
+            vacancy_catalog.add(vacancy_id, self._user_id, document_ref, vacancy_data)
+        if vacancy_ranker is not None:
+            vacancy_ranker.add(vacancy_id, self._user_id, document_ref, vacancy_data)
 
         vacancy = Vacancy(vacancy_id, self._user_id, document_ref)
         self._add_vacancy_to_cache(vacancy)
+        return vacancy_id
 
 
     def get_vacancies_data(self, psql_connection:PsqlConnection, mongodb_connection: MongoDBConnection):
@@ -76,15 +109,19 @@ class RecruiterProfile:
         if vacancies_rows is None or len(vacancies_rows) == 0:
             return None
 
+        # The list view only needs positions. The whole document is fetched once a vacancy is chosen
         vacancies_doc_refs = [row["vacancy_doc_ref"] for row in vacancies_rows if row["vacancy_doc_ref"] is not None]
-        vacancies_ids = [row["vacancy_id"] for row in vacancies_rows]
-        vacancies_data = mongodb_connection.find("vacancies", vacancies_doc_refs)
-        return list(zip(vacancies_ids, vacancies_data))
+        vacancies_data = mongodb_connection.find_many("vacancies", vacancies_doc_refs, projection={"position": 1})
+        return [(row["vacancy_id"], vacancies_data[row["vacancy_doc_ref"]]) for row in vacancies_rows
+                if row["vacancy_doc_ref"] in vacancies_data]
 
 
     def delete_vacancy(self, psql_connection: PsqlConnection, mongodb_connection: MongoDBConnection,
                     neo4j_connection: Neo4jConnection, redis_connection: RedisConnection,
-                    company_registry: CompanyRegistry, vacancy_data: tuple):
+                    company_registry: CompanyRegistry, vacancy_data: tuple,
+                    document_cache: Optional[TTLCache] = None, vacancy_index: Optional[VacancyIndex] = None,
+                    vacancy_catalog: Optional[VacancyCatalog] = None,
+                    vacancy_ranker: Optional[VacancyRanker] = None):
         vacancy_id, vacancy_doc_ref = vacancy_data
 
         neo4j_connection.run_query("MATCH (vacancy:Vacancy {vacancy_id: $vacancy_id}) "
@@ -92,21 +129,31 @@ class RecruiterProfile:
                                    "OPTIONAL MATCH (vacancy)<-[applied_to:applied_to]-() "
                                    "DETACH DELETE vacancy, published_by, applied_to",
                                    {"vacancy_id": vacancy_id})
-        psql_connection.execute_query(f"DELETE FROM vacancies WHERE vacancy_id = {vacancy_id}")
+        psql_connection.execute_query("DELETE FROM vacancies WHERE vacancy_id = %s", vacancy_id)
         mongodb_connection.delete_document("vacancies", vacancy_doc_ref["_id"])
+        if document_cache is not None:
+            document_cache.invalidate(str(vacancy_doc_ref["_id"]))
+        if vacancy_index is not None:
+            vacancy_index.remove(vacancy_id)
+        if vacancy_catalog is not None:
+            vacancy_catalog.remove(vacancy_id)
+        if vacancy_ranker is not None:
+            vacancy_ranker.remove(vacancy_id)
 
         self.get_company(company_registry).metrics.decrement_num_vacancies(redis_connection)
-        self._cached_vacancies.pop(vacancy_id)
+        if self._cached_vacancies is not None:
+            self._cached_vacancies.pop(vacancy_id, None)
 
 
-    def get_vacancy_applicants(self, neo4j_connection: Neo4jConnection, vacancy_id: int):
-        if self._cached_vacancies is not None:
-            return self._cached_vacancies[vacancy_id].get_applicants(neo4j_connection)
+    def get_vacancy_applicants(self, psql_connection: PsqlConnection, neo4j_connection: Neo4jConnection,
+                               vacancy_id: int):
+        vacancy = self.load_vacancies(psql_connection).get(vacancy_id)
+        if vacancy is not None:
+            return vacancy.get_applicants(neo4j_connection)
         return []
 
 
     def _add_vacancy_to_cache(self, vacancy: Vacancy) -> None:
-        if self._cached_vacancies is None:
-            self._cached_vacancies = {}
-
-        self._cached_vacancies[vacancy.get_id()] = vacancy
\ No newline at end of file
+        # Until they are loaded, the new vacancy is loaded along with the others
+        if self._cached_vacancies is not None:
+            self._cached_vacancies[vacancy.get_id()] = vacancy
\ No newline at end of file
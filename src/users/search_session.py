@@ -0,0 +1,97 @@
+import json
+from typing import Optional
+
+from src.connections import RedisConnection
+from src.users.vacancy import Vacancy, VacancyFilters
+
+
+class SearchSession:
+    """
+    Snapshot of the vacancies a seeker searches through, materialized once into a Redis sorted set.
+    Members are scored by vacancy_id, so chunks are still paged by vacancy_id cursors, each with an O(log n) ZRANGE,
+    and vacancies published or deleted during the session do not shift it.
+    Filtered searches page over a second sorted set holding the snapshot vacancies that match the filters.
+    The sets and the position of the seeker expire ttl seconds after the last step. Since they live in Redis,
+    the search can be resumed after a restart or by another bot worker
+    """
+    def __init__(self, redis_connection: RedisConnection, seeker_id: int, ttl: int):
+        self._redis_connection = redis_connection
+        self._ttl = ttl
+        self._state_key = f"search:{seeker_id}"
+        self._vacancies_key = f"search:{seeker_id}:vacancies"
+        self._filtered_key = f"search:{seeker_id}:filtered"
+
+
+    def create(self, vacancies: list[tuple[int, int, str]]) -> bool:
+        """
+        Materializes the (vacancy_id, recruiter_id, vacancy_doc_ref) of all vacancies of the search,
+        replacing the previous session of the seeker
+        """
+        members = {SearchSession._member(*vacancy): vacancy[0] for vacancy in vacancies}
+        if not self._redis_connection.zreplace(self._vacancies_key, members, self._ttl):
+            return False
+
+        self._redis_connection.delete(self._filtered_key)
+        self.save_position(0, 0, None)
+        return True
+
+
+    def delete(self):
+        self._redis_connection.delete(self._state_key, self._vacancies_key, self._filtered_key)
+
+
+    def filter(self, vacancies: list[tuple[int, int, str]]) -> bool:
+        """
+        Materializes the snapshot vacancies that are among vacancies (those matching the filters now)
+        """
+        members = [SearchSession._member(*vacancy) for vacancy in vacancies]
+        return self._redis_connection.zfilter(self._filtered_key, self._vacancies_key, members, self._ttl) is not None
+
+
+    def query(self, cursor_id: int, forward: bool, count: int, filtered: bool) -> Optional[list[Vacancy]]:
+        """
+        Returns up to count vacancies right after (or right before) cursor_id, ordered away from it
+        """
+        members = self._redis_connection.zrange_after(self._filtered_key if filtered else self._vacancies_key,
+                                                      cursor_id, forward, count)
+        if members is None:
+            return None
+
+        vacancies = []
+        for member in members:
+            vacancy_id, recruiter_id, doc_ref = member.decode().split(":", 2)
+            vacancies.append(Vacancy(int(vacancy_id), int(recruiter_id), doc_ref))
+        return vacancies
+
+
+    def save_position(self, vacancy_id: int, position: int, filters: Optional[VacancyFilters]):
+        """
+        Remembers the current vacancy, its index in the search and the filters, and extends the session
+        """
+        filters_json = json.dumps({"salary": filters.salary, "position": filters.position,
+                                   "company_id": filters.company_id}) if filters is not None else ""
+        self._redis_connection.hset(self._state_key, {"vacancy_id": vacancy_id, "position": position,
+                                                      "filters": filters_json})
+        self._redis_connection.expire([self._state_key, self._vacancies_key, self._filtered_key], self._ttl)
+
+
+    def load_position(self) -> Optional[tuple[int, int, Optional[VacancyFilters]]]:
+        """
+        Returns the vacancy_id, the index and the filters saved by save_position, None if the session expired
+        """
+        state = self._redis_connection.hgetall(self._state_key)
+        if not state:
+            return None
+
+        filters = None
+        if state[b"filters"]:
+            filters_dict = json.loads(state[b"filters"])
+            # JSON has no tuples, while filters compare salary ranges as tuples
+            salary = tuple(filters_dict["salary"]) if filters_dict["salary"] is not None else None
+            filters = VacancyFilters.create(salary, filters_dict["position"], filters_dict["company_id"])
+        return int(state[b"vacancy_id"]), int(state[b"position"]), filters
+
+
+    @staticmethod
+    def _member(vacancy_id: int, recruiter_id: int, doc_ref: str) -> str:
+        return f"{vacancy_id}:{recruiter_id}:{doc_ref}"
@@ -1,48 +1,117 @@
-import re
 import logging
+import time
 
+from concurrent.futures import Executor, Future
 from dataclasses import dataclass
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Optional, Tuple
 
+from src.caches import TTLCache
 from src.connections import MongoDBConnection, PsqlConnection
 from src.keyboards.profile_keyboards import SeekerProfileKeyboardMarkup
 from src.keyboards.seeker_inline_keyboards import SeekerVacancySearchingInlineKeyboardMarkup
-from src.users.vacancy import VacanciesChunk, Vacancy
+from src.users.vacancy import VacanciesChunk, Vacancy, VacancyCatalog, VacancyFilters
+from src.users.search_session import SearchSession
+from src.users.vacancy_index import VacancyIndex
+from src.users.vacancy_ranker import RankedVacancies
+
+
+# Chunk size adapts to the paging pace of the seeker: a chunk should last about CHUNK_HORIZON_SECONDS of browsing
+INITIAL_CHUNK_LIMIT = 5
+MIN_CHUNK_LIMIT = 3
+MAX_CHUNK_LIMIT = 25
+CHUNK_HORIZON_SECONDS = 60.0
+# Pauses longer than this are not browsing anymore and should not shrink chunks
+MAX_PAGING_INTERVAL = 60.0
+# The neighboring chunk is prefetched once the seeker is this many vacancies away from the end of the current one
+PREFETCH_DISTANCE = 2
+
+
+@dataclass(frozen=True)
+class SearchPosition:
+    """
+    Where a navigation step landed: the vacancy, its index counting from the first vacancy of the search,
+    and whether there are vacancies before and after it
+    """
+    vacancy: Vacancy
+    index: int
+    has_prev: bool
+    has_next: bool
 
 
 class VacanciesSearchContext:
-    def __init__(self, chunk_limit: int, psql_connection: PsqlConnection, mongodb_connection: MongoDBConnection):
+    def __init__(self, psql_connection: PsqlConnection, mongodb_connection: MongoDBConnection,
+                 chunk_limit: int = INITIAL_CHUNK_LIMIT, prefetch_executor: Optional[Executor] = None,
+                 document_cache: Optional[TTLCache] = None, vacancy_index: Optional[VacancyIndex] = None,
+                 vacancy_catalog: Optional[VacancyCatalog] = None, search_session: Optional[SearchSession] = None,
+                 resume_from: Optional[tuple[int, int, Optional[VacancyFilters]]] = None,
+                 ranked_vacancies: Optional[RankedVacancies] = None):
+        """
+        If prefetch_executor is given, the chunk next to the current one (and its vacancy documents) is queried on it
+        in the background as the seeker approaches the end of the current chunk.
+        Vacancy documents are looked up in document_cache before querying MongoDB,
+        and filtered vacancies are found in vacancy_index and vacancy_catalog.
+        If search_session is given, the vacancies are materialized into it and paged from there,
+        unless resume_from (a position loaded from the session) is given, in which case the search continues there.
+        If ranked_vacancies are given instead, the search goes through them in the order of relevance
+        """
         self._sql_connection = psql_connection
         self._mongodb_connection = mongodb_connection
+        self._document_cache = document_cache
+        self._vacancy_index = vacancy_index
+        self._vacancy_catalog = vacancy_catalog
+        self._prefetch_executor = prefetch_executor
+        self._search_session = search_session
+        self._ranked_vacancies = ranked_vacancies
+        # Filters the filtered set of the session was materialized for, None if there is none
+        self._session_filters: Optional[VacancyFilters] = None
+        # Queried (or being queried) chunks next to the current one, keyed by their cursors
+        self._neighbor_chunks: dict[tuple, Future] = {}
 
         self._chunk_limit = chunk_limit
-        self._chunk_offset = 0
-
-        self._curr_chunk = VacanciesChunk(chunk_limit, 0)
-        self._curr_chunk.query_chunk(psql_connection)
+        self._paging_interval: Optional[float] = None
+        self._last_jump_time: Optional[float] = None
+        # The current chunk is the keyset cursor of this search session: neighboring chunks are queried
+        # relative to the ids of its first and last vacancies
+        self._curr_chunk = VacanciesChunk(chunk_limit)
+        # Index of the current vacancy within the current chunk
         self._vacancy_idx = 0
+        # Index of the current vacancy counting from the first vacancy of the search
+        self._vacancy_position = 0
+        if resume_from is not None:
+            vacancy_id, self._vacancy_position, self._session_filters = resume_from
+            # Starts right at the vacancy, as nothing but 0 precedes the first one
+            self._curr_chunk = VacanciesChunk(chunk_limit, vacancy_id - 1, filters=self._session_filters)
+        elif search_session is not None:
+            vacancies = self._find_matching_vacancies(None)
+            if vacancies is None or not search_session.create(vacancies):
+                logging.warning("Failed to materialize search session, searching live vacancies")
+                self._search_session = None
+        self._query_chunk(self._curr_chunk)
 
         # We can immediately turn off the "prev_button" here, as there will be no vacancies
         self.inline_markup = SeekerVacancySearchingInlineKeyboardMarkup()
         self.inline_markup.toggle_button("prev_vacancy_button", False)
 
-        # We should also check if there are any vacancies next to us
-        self.empty_context = False
+        # We should also check if there are any vacancies at all and next to us
+        self.empty_context = len(self._curr_chunk.get_current_chunk()) == 0
         if not self.has_next_vacancy():
             self.inline_markup.toggle_button("next_vacancy_button", False)
-            self.empty_context = True
 
         self.inline_markup.update_keyboard()
 
     
-    def is_current_vacancy_by_filters(self, salary: tuple[int, int], position_regex) -> bool:
+    def is_current_vacancy_by_filters(self, salary: tuple[int, int], position: str) -> bool:
         vacancy = self.get_current_vacancy()
-        return self.is_vacancy_by_filters(vacancy, salary, position_regex)
+        return self.is_vacancy_by_filters(vacancy, salary, position)
 
 
-    def is_vacancy_by_filters(self, vacancy: Vacancy, salary: tuple[int, int], position_regex) -> bool:
+    def is_vacancy_by_filters(self, vacancy: Vacancy, salary: tuple[int, int], position: str) -> bool:
+        """
+        Whether vacancy matches the filters the same way the vacancies jump_vacancy_with_filters steps over do
+        """
         assert vacancy is not None
-        return vacancy.filter_suitable(salary, position_regex, self._mongodb_connection) 
+        return vacancy.filter_suitable(VacancyFilters.create(salary, position), self._mongodb_connection,
+                                       self._document_cache)
 
 
     # unused
@@ -54,177 +123,324 @@ class VacanciesSearchContext:
     #     return self.jump_vacancy_with_filters(-1, salary, position)
 
 
-    def jump_vacancy_with_filters(self, step: int, salary: tuple[int, int], position: str) -> bool:
-        # Escape special characters in the phrase and create a case-insensitive regex
-        position_regex = None
-        if position is not None:
-            position_regex = re.compile(re.escape(position), re.IGNORECASE)
-        
-        while self.jump_vacancy(step):
-            if self.is_current_vacancy_by_filters(salary, position_regex):
-                self.inline_markup.toggle_button("prev_vacancy_button", self._has_neighbor_vacancy_with_filters(-1, salary, position_regex))
-                self.inline_markup.toggle_button("next_vacancy_button", self._has_neighbor_vacancy_with_filters(1, salary, position_regex))
-                self.inline_markup.update_keyboard()
-                return True
+    def jump_vacancy_with_filters(self, step: int, salary: tuple[int, int], position: str) -> Optional[SearchPosition]:
+        """
+        Same as jump_vacancy, but only steps over vacancies matching the filters.
+        Once the filters change, the search is re-anchored at the current vacancy: from there on the neighboring
+        chunks only hold matching vacancies, which MongoDB finds with one query per chunk
+        """
+        filters = VacancyFilters.create(salary, position)
+        if filters != self._curr_chunk.get_filters() and not self.empty_context:
+            if self._search_session is not None and filters is not None and filters != self._session_filters:
+                self._materialize_filters(filters)
+            self._curr_chunk = VacanciesChunk.create_anchor(self._chunk_limit, self.get_current_vacancy(), filters)
+            self._vacancy_idx = 0
+            self._neighbor_chunks = {}
 
-        return False
+        return self.jump_vacancy(step)
 
 
-    def _has_neighbor_vacancy_with_filters(self, step: int, salary: tuple[int, int], position_regex) -> bool:
-        if salary is None and position_regex is None:
-            able, _ = self._has_neighbor_vacancy(step)
-            return able
+    def has_next_vacancy(self) -> bool:
+        """
+        Returns True if there is any vacancy next to the current. 
+        Answered from the vacancies already queried (chunks are queried with one row of look-ahead), so no queries
+        are issued, except for right after the filters change, when the neighboring chunk is queried and kept
 
-        if step == 0:
+        Returns False otherwise
+        """
+        return self._has_neighbor_vacancy(forward=True)
+
+
+    def has_prev_vacancy(self) -> bool:
+        """
+        Same as self.has_next_vacancy
+        """
+        return self._has_neighbor_vacancy(forward=False)
+
+
+    def _has_neighbor_vacancy(self, forward: bool) -> bool:
+        """
+        For internal use only
+        Returns True if any vacancies in the specified direction
+        Returns False if no vacancies in whatever direction
+        """
+        vacancies = self._curr_chunk.get_current_chunk()
+        if len(vacancies) == 0:
             return False
+        if (self._vacancy_idx < len(vacancies) - 1) if forward else (self._vacancy_idx > 0):
+            return True
 
-        step = -1 if step < 0 else 1
-        current_step = step
-        able, chunk = self._has_neighbor_vacancy(current_step)
-        while able:
-            current_idx = self._vacancy_idx + current_step
-            query_chunk = self._curr_chunk
-            local_idx = current_idx % self._chunk_limit
-            if chunk is not None:
-                query_chunk = chunk
+        available = self._curr_chunk.has_following() if forward else self._curr_chunk.has_preceding()
+        if available is None:
+            # Only next to an anchor, which does not tell what matches the filters around it
+            neighbor = self._get_neighbor_chunk(self._curr_chunk, forward)
+            available = neighbor is not None and len(neighbor.get_current_chunk()) > 0
+        return available
 
-            vacancy = query_chunk.get_current_chunk()[local_idx]
-            if self.is_vacancy_by_filters(vacancy, salary, position_regex):
-                return True
 
-            current_step = current_step + step
-            able, chunk = self._has_neighbor_vacancy(current_step)
+    def _locate_vacancy(self, chunk: VacanciesChunk, idx: int) -> Tuple[(VacanciesChunk | None), int]:
+        """
+        For internal use only
+        Finds the vacancy at index idx relative to the beginning of chunk, which may lie outside of it.
+        Returns the chunk holding that vacancy and its index within that chunk, or (None, 0) if there is no such vacancy.
+        Neighboring chunks are queried by keyset (relative to the first or last vacancy id of chunk),
+        so vacancies inserted or deleted meanwhile are neither skipped nor repeated
+        """
+        while idx >= len(chunk.get_current_chunk()):
+            following_chunk = self._get_neighbor_chunk(chunk, forward=True)
+            if following_chunk is None or len(following_chunk.get_current_chunk()) == 0:
+                return None, 0
 
-        return False
+            idx -= len(chunk.get_current_chunk())
+            chunk = following_chunk
 
+        while idx < 0:
+            preceding_chunk = self._get_neighbor_chunk(chunk, forward=False)
+            if preceding_chunk is None or len(preceding_chunk.get_current_chunk()) == 0:
+                return None, 0
 
-    def has_next_vacancy(self) -> bool:
+            idx += len(preceding_chunk.get_current_chunk())
+            chunk = preceding_chunk
+
+        return chunk, idx
+
+
+    def _get_neighbor_chunk(self, chunk: VacanciesChunk, forward: bool) -> (VacanciesChunk | None):
         """
-        Returns True if there is any vacancy next to the current. 
-        The method won't update any of it's internal state, but it might query the neighboring chunk
-        of vacancies if needed
+        For internal use only
+        Returns the queried chunk right after (or before) chunk, reusing it if it was already queried or prefetched
+        """
+        neighbor = chunk.get_following_chunk(self._chunk_limit) if forward \
+            else chunk.get_preceding_chunk(self._chunk_limit)
+        if neighbor is None:
+            return None
 
-        Returns False otherwise
+        future = self._neighbor_chunks.get(neighbor.get_cursor())
+        if future is not None:
+            neighbor = future.result()
+        else:
+            self._query_chunk(neighbor)
+
+        # Vacancies may still be published there, so the end of the search is not remembered
+        if len(neighbor.get_current_chunk()) == 0:
+            self._neighbor_chunks.pop(neighbor.get_cursor(), None)
+        elif future is None:
+            self._remember_neighbor_chunk(neighbor.get_cursor(), neighbor)
+        return neighbor
+
+
+    def _remember_neighbor_chunk(self, cursor: tuple, chunk: VacanciesChunk):
+        future = Future()
+        future.set_result(chunk)
+        self._neighbor_chunks[cursor] = future
+
+
+    def _prefetch_neighbor_chunk(self, forward: bool):
         """
-        able, _ = self._has_neighbor_vacancy(1)
-        return able
+        For internal use only
+        Queries the chunk next to the current one and its vacancy documents in the background
+        """
+        if self._prefetch_executor is None:
+            return
 
+        neighbor = self._curr_chunk.get_following_chunk(self._chunk_limit) if forward \
+            else self._curr_chunk.get_preceding_chunk(self._chunk_limit)
+        if neighbor is None or neighbor.get_cursor() in self._neighbor_chunks:
+            return
 
-    def has_prev_vacancy(self) -> bool:
+        def prefetch() -> VacanciesChunk:
+            if len(self._query_chunk(neighbor)) > 0:
+                neighbor.load_documents(self._mongodb_connection, self._document_cache)
+            return neighbor
+
+        self._neighbor_chunks[neighbor.get_cursor()] = self._prefetch_executor.submit(prefetch)
+
+
+    def _query_chunk(self, chunk: VacanciesChunk) -> list[Vacancy]:
         """
-        Same as self.has_next_vacancy
+        For internal use only
+        Queries chunk from the ranked vacancies, or from the search session if it holds the vacancies of the chunk,
+        from the live vacancies otherwise
         """
-        able, _ = self._has_neighbor_vacancy(-1)
-        return able
+        snapshot_query = None
+        if self._ranked_vacancies is not None:
+            snapshot_query = self._ranked_vacancies.query
+        elif self._search_session is not None and chunk.get_filters() in (None, self._session_filters):
+            snapshot_query = self._search_session.query
+        return chunk.query_chunk(self._sql_connection, self._mongodb_connection, self._vacancy_index,
+                                 self._vacancy_catalog, snapshot_query)
 
 
-    def _has_neighbor_vacancy(self, step: int) -> Tuple[bool, (VacanciesChunk | None)]:            
+    def _find_matching_vacancies(self, filters: Optional[VacancyFilters]) -> Optional[list[tuple[int, int, str]]]:
         """
         For internal use only
-        Returns True if any vacancies in the specified direction (next if step > 0 or prev is step < 0)
-        Returns False if no vacancies in whatever direction
-        Also returns a queried chunk of vacancies, if the chunk needs update
+        Returns (vacancy_id, recruiter_id, vacancy_doc_ref) of all vacancies matching filters (all of them if None),
+        from the catalog if it is built, from the databases otherwise
         """
-        if step == 0:
-            return False, None
-
-        if self._curr_chunk is None:
-            self._curr_chunk = VacanciesChunk(self._chunk_limit, self._chunk_offset)
-            self._curr_chunk.query_chunk(self._sql_connection)
-
-        # we want to do any step
-        # step = -1 if step < 0 else 1
-
-        vacancy_idx = self._vacancy_idx + step
-        # Cannot decrement if vacancy_idx is already 0
-        if vacancy_idx < 0:
-            return False, None
-
-        idx_upper_bound = self._chunk_limit * (self._chunk_offset + 1)
-        idx_lower_bound = self._chunk_limit * self._chunk_offset
-        local_idx = vacancy_idx % self._chunk_limit
-        # If we are in the EXPECTED bounds of chunk we should check if there are enough vacancies
-        if idx_lower_bound <= vacancy_idx < idx_upper_bound:
-            # Perform checks once again to ensure we are not out of boundaries
-            # We want to check if length of vacancies is larger than our new vacancy index
-            vacancies = self._curr_chunk.get_current_chunk()
-            if local_idx >= len(vacancies):
-                # Cannot increment
-                return False, None
-            
-            return True, None
-        else: # if ![idx_lower, idx_upper) we need to query a chunk
-            chunk_offset = vacancy_idx // self._chunk_limit
-            assert chunk_offset >= 0
-
-            chunk = VacanciesChunk(self._chunk_limit, chunk_offset)
-            vacancies = chunk.query_chunk(self._sql_connection)
-
-            # We are at beginning of the chunk. Check if there are any vacancies at all.
-            # If there are no vacancies - return False, as we cannot increment
-            if local_idx >= len(vacancies):
-                # Cannot increment/decrement
-                # NOTICE: If vacancies were removed during DECREMENT search operation and the chunk
-                # is no longer valid - this will result in undefined state
-                return False, None
-
-            return True, chunk
+        if self._vacancy_catalog is not None and self._vacancy_catalog.is_ready():
+            if filters is None:
+                return self._vacancy_catalog.find_all()
+
+            candidate_ids = None
+            if filters.position is not None and self._vacancy_index is not None:
+                candidate_ids = self._vacancy_index.search(filters.position)
+            if filters.position is None or candidate_ids is not None:
+                return self._vacancy_catalog.find_all(filters.salary, filters.company_id, candidate_ids)
+
+        if filters is None:
+            rows = self._sql_connection.execute_query("SELECT vacancy_id, recruiter_id, vacancy_doc_ref FROM vacancies")
+            if rows is None:
+                return None
+            return [(row["vacancy_id"], row["recruiter_id"], row["vacancy_doc_ref"]) for row in rows]
+
+        query = {**filters.as_query(), "vacancy_id": {"$exists": True}}
+        documents = self._mongodb_connection.find_documents("vacancies", query,
+                                                            projection={"vacancy_id": 1, "recruiter_id": 1})
+        return [(document["vacancy_id"], document["recruiter_id"], str(document["_id"])) for document in documents]
+
+
+    def _materialize_filters(self, filters: VacancyFilters):
+        """
+        For internal use only
+        Materializes the vacancies of the session matching filters. If that fails, filtered chunks are queried live
+        """
+        vacancies = self._find_matching_vacancies(filters)
+        if vacancies is not None and self._search_session.filter(vacancies):
+            self._session_filters = filters
+        else:
+            logging.warning("Failed to materialize filtered search session, searching live vacancies")
+
+
+    def _save_position(self):
+        """
+        For internal use only
+        Saves the position into the search session. Saved right away rather than on prefetch_executor,
+        so that saves of quick steps can not land out of order or wait for slow prefetches
+        """
+        if self._search_session is None:
+            return
+
+        self._search_session.save_position(self.get_current_vacancy().get_id(), self._vacancy_position,
+                                           self._curr_chunk.get_filters())
+
+
+    def _move_to_chunk(self, chunk: VacanciesChunk, step: int):
+        """
+        For internal use only
+        Makes chunk the current one. Only chunks next to it are kept, the one we are leaving among them
+        """
+        previous_chunk = self._curr_chunk
+        self._curr_chunk = chunk
+
+        neighbor_cursors = set()
+        for forward in (True, False):
+            neighbor = chunk.get_following_chunk() if forward else chunk.get_preceding_chunk()
+            if neighbor is not None:
+                neighbor_cursors.add(neighbor.get_cursor())
+        self._neighbor_chunks = {cursor: future for cursor, future in self._neighbor_chunks.items()
+                                 if cursor in neighbor_cursors}
+
+        # A single step lands in an adjacent chunk, so the chunk we are leaving is its neighbor.
+        # Anchors are not, as their vacancy does not have to match the filters
+        if abs(step) == 1 and len(previous_chunk.get_current_chunk()) > 0 and not previous_chunk.is_anchor():
+            neighbor = chunk.get_preceding_chunk() if step > 0 else chunk.get_following_chunk()
+            self._remember_neighbor_chunk(neighbor.get_cursor(), previous_chunk)
+
+
+    def _record_paging_pace(self):
+        """
+        For internal use only
+        Tracks the average time between jumps and sizes chunks queried from now on to last about CHUNK_HORIZON_SECONDS
+        """
+        now = time.monotonic()
+        if self._last_jump_time is not None:
+            interval = max(min(now - self._last_jump_time, MAX_PAGING_INTERVAL), 0.1)
+            if self._paging_interval is None:
+                self._paging_interval = interval
+            else:
+                self._paging_interval = 0.7 * self._paging_interval + 0.3 * interval
+            self._chunk_limit = max(MIN_CHUNK_LIMIT,
+                                    min(MAX_CHUNK_LIMIT, round(CHUNK_HORIZON_SECONDS / self._paging_interval)))
+        self._last_jump_time = now
     
 
-    def jump_next_vacancy(self) -> bool:
+    def jump_next_vacancy(self) -> Optional[SearchPosition]:
         """
-        Returns False if cannot increment. No changes if cannot increment
-        Otherwise increments the vacancy index and returns True
+        Returns None if cannot increment. No changes if cannot increment
+        Otherwise increments the vacancy index and returns the new position
         """
         return self.jump_vacancy(1)
 
     
-    def jump_prev_vacancy(self) -> bool:
+    def jump_prev_vacancy(self) -> Optional[SearchPosition]:
         """
-        Returns False if cannot decrement. No changes if cannot.
-        Otherwise decrements and returns True.
+        Returns None if cannot decrement. No changes if cannot.
+        Otherwise decrements and returns the new position.
         """
         return self.jump_vacancy(-1)
 
     
-    def jump_vacancy(self, step: int) -> bool:
+    def jump_vacancy(self, step: int) -> Optional[SearchPosition]:
         """
-        Returns False if cannot increment/decrement. No changes if cannot increment/decrement
-        Otherwise increments/decrements (if 1 or -1 respectively) the vacancy index and returns True
+        Returns None if cannot increment/decrement. No changes if cannot increment/decrement
+        Otherwise increments/decrements (if 1 or -1 respectively) the vacancy index and returns the new position,
+        along with the availability of its neighbors the buttons are toggled by
         """
         if step == 0:
-            return False
-
-        # we want any step
-        # step = -1 if step < 0 else 1
-        able, chunk = self._has_neighbor_vacancy(step)
-        if not able:
-            return False
-
-        self._vacancy_idx = self._vacancy_idx + step
-        if chunk is not None:
-            self._chunk_offset = self._vacancy_idx // self._chunk_limit
-            self._curr_chunk = chunk
-
-        # logging.info(f"Current vacancy {self._vacancy_idx} with chunk {self._chunk_offset}")
-        self.inline_markup.toggle_button("prev_vacancy_button", self.has_prev_vacancy())
-        self.inline_markup.toggle_button("next_vacancy_button", self.has_next_vacancy())
+            return None
+
+        chunk, idx = self._locate_vacancy(self._curr_chunk, self._vacancy_idx + step)
+        if chunk is None:
+            # Vacancies the look-ahead saw may have been deleted since
+            self.inline_markup.toggle_button("next_vacancy_button" if step > 0 else "prev_vacancy_button", False)
+            self.inline_markup.update_keyboard()
+            return None
+
+        if chunk is not self._curr_chunk:
+            self._move_to_chunk(chunk, step)
+        self._vacancy_idx = idx
+        self._vacancy_position += step
+        self._record_paging_pace()
+
+        vacancies_left = len(chunk.get_current_chunk()) - 1 - idx if step > 0 else idx
+        if vacancies_left < PREFETCH_DISTANCE:
+            self._prefetch_neighbor_chunk(forward=step > 0)
+
+        self._save_position()
+        position = SearchPosition(self.get_current_vacancy(), self._vacancy_position,
+                                  has_prev=self.has_prev_vacancy(), has_next=self.has_next_vacancy())
+        self.inline_markup.toggle_button("prev_vacancy_button", position.has_prev)
+        self.inline_markup.toggle_button("next_vacancy_button", position.has_next)
         self.inline_markup.update_keyboard()
-        return True
+        return position
 
 
     def get_current_vacancy(self) -> Vacancy:
-        local_idx = self._vacancy_idx % self._chunk_limit
         vacancies = self._curr_chunk.get_current_chunk()
         # Out of range (somehow?)
-        # if local_idx >= len(vacancies):
+        # if self._vacancy_idx >= len(vacancies):
         #     return None
             
-        return vacancies[local_idx]
+        return vacancies[self._vacancy_idx]
+
+
+    def get_current_chunk(self) -> VacanciesChunk:
+        return self._curr_chunk
 
 
     def get_current_vacancy_index(self) -> int:
-        return self._vacancy_idx
+        return self._vacancy_position
+
+
+    def estimate_size(self) -> int:
+        """
+        Rough number of bytes taken by the chunks held by the context
+        """
+        size = self._curr_chunk.estimate_size()
+        for future in list(self._neighbor_chunks.values()):
+            if future.done() and future.exception() is None:
+                size += future.result().estimate_size()
+        return size
 
 
 @dataclass
@@ -265,14 +481,41 @@ class SeekerProfile:
         return mongodb_connection.update_document("portfolios", self._portfolio_ref, filtered_doc)
 
 
-    def add_search_context(self, psql_connection: PsqlConnection, mongodb_connection: MongoDBConnection):
+    def add_search_context(self, psql_connection: PsqlConnection, mongodb_connection: MongoDBConnection,
+                           prefetch_executor: Optional[Executor] = None, document_cache: Optional[TTLCache] = None,
+                           vacancy_index: Optional[VacancyIndex] = None,
+                           vacancy_catalog: Optional[VacancyCatalog] = None,
+                           search_session: Optional[SearchSession] = None,
+                           resume_from: Optional[tuple[int, int, Optional[VacancyFilters]]] = None,
+                           ranked_vacancies: Optional[RankedVacancies] = None):
         self.vacancies_search_context = VacanciesSearchContext( 
-            chunk_limit=5, 
             psql_connection=psql_connection,
-            mongodb_connection=mongodb_connection
+            mongodb_connection=mongodb_connection,
+            prefetch_executor=prefetch_executor,
+            document_cache=document_cache,
+            vacancy_index=vacancy_index,
+            vacancy_catalog=vacancy_catalog,
+            search_session=search_session,
+            resume_from=resume_from,
+            ranked_vacancies=ranked_vacancies
         )
         return self.vacancies_search_context
 
 
+    @staticmethod
+    def get_portfolio_text(portfolio: dict[str, Any]) -> str:
+        """
+        Desired position and experience titles and descriptions of the portfolio, as vacancies are ranked by
+        """
+        texts = [portfolio.get("position") or ""]
+        for experience in portfolio.get("experiences") or []:
+            texts += [experience.get("title") or "", experience.get("desc") or ""]
+        return " ".join(texts)
+
+
+    def get_portfolio_ref(self) -> str:
+        return self._portfolio_ref
+
+
     def get_seeker_node_ref(self) -> str:
         return self._seeker_node_ref
\ No newline at end of file
@@ -6,6 +6,34 @@ from src.users.recruiter_profile import RecruiterProfile
 from src.connections import PsqlConnection, Neo4jConnection, MongoDBConnection, RedisConnection
 from src.keyboards.profile_keyboards import UserProfileKeyboardMarkup
 
+# Columns of a user profile row LEFT JOINed with the seeker and recruiter profiles of the user, see from_joined_row
+JOINED_PROFILE_QUERY = ("SELECT u.user_id, u.first_name, u.last_name, s.portfolio_ref, s.seeker_node_ref, "
+                        "r.company_id, r.recruiter_node_ref "
+                        "FROM user_profiles u "
+                        "LEFT JOIN seeker_profiles s ON s.user_id = u.user_id "
+                        "LEFT JOIN recruiter_profiles r ON r.user_id = u.user_id ")
+
+# Rough size in bytes of a user profile with its seeker and recruiter profiles, besides the vacancies they hold
+PROFILE_SIZE = 2048
+
+
+def _create_user_markup(has_seeker_profile: bool, has_recruiter_profile: bool) -> UserProfileKeyboardMarkup:
+    user_markup = UserProfileKeyboardMarkup()
+    if has_seeker_profile:
+        user_markup.set_button_value("seeker_button", "Seeker Menu 🔍")
+    if has_recruiter_profile:
+        user_markup.set_button_value("recruiter_button", "Recruiter Menu 📝")
+    user_markup.update_markup(2, 1)
+    return user_markup
+
+
+# Menus by (has seeker profile, has recruiter profile). They are shared by all users and never changed once built,
+# as profiles are built and modified on several storage threads at once
+_USER_MARKUPS = {(has_seeker_profile, has_recruiter_profile): _create_user_markup(has_seeker_profile,
+                                                                                   has_recruiter_profile)
+                 for has_seeker_profile in (False, True) for has_recruiter_profile in (False, True)}
+
+
 @dataclass
 class UserProfile:
     _user_id: int
@@ -13,7 +41,6 @@ class UserProfile:
     last_name: str
     seeker_ref: SeekerProfile = None
     recruiter_ref: RecruiterProfile = None
-    user_markup = UserProfileKeyboardMarkup()
 
 
     def get_full_name(self) -> str:
@@ -24,23 +51,58 @@ class UserProfile:
         self.first_name = first_name
         self.last_name = last_name
 
-        sql_connection.execute_query(f"""
+        sql_connection.execute_query("""
             UPDATE user_profiles 
             SET first_name = %s, last_name = %s 
-            WHERE user_id = {self.get_id()}""", self.first_name, self.last_name)
+            WHERE user_id = %s""", self.first_name, self.last_name, self.get_id())
 
 
     def get_id(self) -> int:
         return self._user_id
 
 
+    @property
+    def user_markup(self) -> UserProfileKeyboardMarkup:
+        return _USER_MARKUPS[(self.has_seeker_profile(), self.has_recruiter_profile())]
+
+
+    @staticmethod
+    def from_joined_row(row: dict) -> 'UserProfile':
+        """
+        Builds the user profile, along with its seeker and recruiter profiles if the user has them,
+        from a row queried with JOINED_PROFILE_QUERY. Vacancies of the recruiter are not loaded
+        """
+        user_id = row['user_id']
+        user_profile = UserProfile(user_id, row['first_name'], row['last_name'])
+        if row['seeker_node_ref'] is not None:
+            user_profile._set_seeker_profile(SeekerProfile(user_id, row['portfolio_ref'], row['seeker_node_ref']))
+        if row['recruiter_node_ref'] is not None:
+            user_profile._set_recruiter_profile(RecruiterProfile(user_id, int(row['company_id']),
+                                                                 row['recruiter_node_ref']))
+        return user_profile
+
+
+    def estimate_size(self) -> int:
+        """
+        Rough number of bytes taken by the profile, most of them by the vacancies of the search context
+        of the seeker and by the cached vacancies of the recruiter
+        """
+        size = PROFILE_SIZE
+        if self.seeker_ref is not None and self.seeker_ref.vacancies_search_context is not None:
+            size += self.seeker_ref.vacancies_search_context.estimate_size()
+        if self.recruiter_ref is not None:
+            size += self.recruiter_ref.estimate_size()
+        return size
+
+
     def add_seeker_profile(self, portfolio: dict, mongodb_connection: MongoDBConnection, neo4j_connection: Neo4jConnection,
                            psql_connection: PsqlConnection):
         assert not self.request_seeker_profile(psql_connection)
         user_id = self.get_id()
         portfolio_ref = mongodb_connection.insert_document("portfolios", portfolio)
-        result = neo4j_connection.run_query("MERGE (s:Seeker {user_id: $user_id}) RETURN ID(s) AS seeker_id",
-                                            {"user_id": user_id})
+        results = neo4j_connection.run_transaction([("MERGE (s:Seeker {user_id: $user_id}) RETURN ID(s) AS seeker_id",
+                                                     {"user_id": user_id})])
+        result = results[0] if results is not None else []
         if len(result) != 1:
             logging.error("Error while adding seeker to the neo4j graph")
             return
@@ -57,8 +119,10 @@ class UserProfile:
         """
         assert not self.request_recruiter_profile(psql_connection, neo4j_connection)
         user_id = self.get_id()
-        result = neo4j_connection.run_query("MERGE (r:Recruiter {user_id: $user_id}) RETURN ID(r) AS recruiter_id",
-                                            {"user_id": user_id})
+        results = neo4j_connection.run_transaction([("MERGE (r:Recruiter {user_id: $user_id}) "
+                                                     "RETURN ID(r) AS recruiter_id",
+                                                     {"user_id": user_id})])
+        result = results[0] if results is not None else []
         if len(result) != 1:
             logging.error("Error while adding recruiter to the neo4j graph")
             return
@@ -87,7 +151,8 @@ class UserProfile:
             return True
 
         user_id = self.get_id()
-        row = psql_connection.execute_query_fetchone(f"SELECT * FROM seeker_profiles WHERE user_id = {user_id}")
+        row = psql_connection.execute_prepared_fetchone("seeker_profile_by_id",
+                                                        "SELECT * FROM seeker_profiles WHERE user_id = $1", user_id)
         if row is None:
             return False
 
@@ -111,15 +176,14 @@ class UserProfile:
             return True
 
         user_id = self.get_id()
-        row = psql_connection.execute_query_fetchone(f"SELECT * FROM recruiter_profiles WHERE user_id = {user_id}")
+        row = psql_connection.execute_prepared_fetchone("recruiter_profile_by_id",
+                                                        "SELECT * FROM recruiter_profiles WHERE user_id = $1", user_id)
         if row is None:
             return False
 
         company_id: int = int(row['company_id'])
         recruiter_node_ref = row['recruiter_node_ref']
-        recruiter_profile = RecruiterProfile(user_id, company_id, recruiter_node_ref)
-        recruiter_profile.update_vacancies(psql_connection, neo4j_connection)
-        self._set_recruiter_profile(recruiter_profile)
+        self._set_recruiter_profile(RecruiterProfile(user_id, company_id, recruiter_node_ref))
         return True
 
 
@@ -135,16 +199,12 @@ class UserProfile:
         # This is unexpected behavior if we try to set a seeker profile while there is already one
         assert not self.has_seeker_profile()
         assert seeker_profile.get_id() == self.get_id() # They should have same id
-        self.user_markup.set_button_value("seeker_button", "Seeker Menu 🔍")
-        self.user_markup.update_markup(2, 1)
         self.seeker_ref = seeker_profile
-        logging.info(f"Seeker profile {seeker_profile} was set")
+        logging.debug("Seeker profile of user %d was set", self.get_id())
 
 
     def _set_recruiter_profile(self, recruiter_profile: RecruiterProfile):
         # This is unexpected behavior if we try to set a recruiter profile while there is already one
         assert not self.has_recruiter_profile()
         assert recruiter_profile.get_id() == self.get_id() # They should have same id
-        self.user_markup.set_button_value("recruiter_button", "Recruiter Menu 📝")
-        self.user_markup.update_markup(2, 1)
         self.recruiter_ref = recruiter_profile
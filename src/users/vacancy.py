@@ -1,6 +1,15 @@
 import logging
-from typing import Dict, Any
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, Callable, Iterable, Optional
+
+import numpy as np
+
+from src.caches import TTLCache
 from src.connections import PsqlConnection, MongoDBConnection, Neo4jConnection
+from src.users.vacancy_index import (VacancyIndex, keywords_query, matches_keywords, scan_vacancy_documents,
+                                     tokenize)
 
 
 class Vacancy:
@@ -18,8 +27,21 @@ class Vacancy:
         return self._recruiter_id
 
 
-    def get_vacancy_data(self, mongodb_connection: MongoDBConnection) -> (Dict[str, Any] | None):
-        return mongodb_connection.get_document("vacancies", self._vacancy_doc_ref)
+    def get_doc_ref(self) -> str:
+        return self._vacancy_doc_ref
+
+
+    def get_vacancy_data(self, mongodb_connection: MongoDBConnection,
+                         document_cache: Optional[TTLCache] = None) -> (Dict[str, Any] | None):
+        if document_cache is not None:
+            data = document_cache.get(self._vacancy_doc_ref)
+            if data is not None:
+                return data
+
+        data = mongodb_connection.get_document("vacancies", self._vacancy_doc_ref)
+        if data is not None and document_cache is not None:
+            document_cache.put(self._vacancy_doc_ref, data)
+        return data
 
 
     def get_applicants(self, neo4j_connection: Neo4jConnection):
@@ -34,67 +56,485 @@ class Vacancy:
 
 
     def add_applicant(self, seeker_node_ref: str, neo4j_connection: Neo4jConnection) -> bool:
-        res = neo4j_connection.run_query(
+        return len(self.add_applicants([seeker_node_ref], neo4j_connection)) == 1
+
+
+    def add_applicants(self, seeker_node_refs: list[str], neo4j_connection: Neo4jConnection) -> list[str]:
+        """
+        Creates applied_to relationships for all seekers with one UNWIND query
+        Returns node refs of the seekers that were not applied to this vacancy before
+        """
+        res = neo4j_connection.run_batch(
             """
             MATCH (s:Seeker), (v:Vacancy)
-            WHERE ID(s) = $seeker_node_ref AND v.vacancy_id = $vacancy_id
+            WHERE ID(s) = row.seeker_node_ref AND v.vacancy_id = row.vacancy_id
             OPTIONAL MATCH (s)-[r:applied_to]->(v)
             WITH s, v, r
             WHERE r IS NULL
             CREATE (s)-[:applied_to]->(v)
-            return s
+            RETURN ID(s) AS seeker_node_ref
             """,
-            {"vacancy_id": self._vacancy_id, "seeker_node_ref": seeker_node_ref})
+            [{"vacancy_id": self._vacancy_id, "seeker_node_ref": ref} for ref in seeker_node_refs])
 
-        if len(res) == 0:
-            return False
+        if res is None:
+            return []
 
-        return True
+        return [record["seeker_node_ref"] for record in res]
 
 
-    def filter_suitable(self, salary: tuple[int, int], position_regex, mongodb_connection: MongoDBConnection) -> bool:
-        data = self.get_vacancy_data(mongodb_connection)
+    def filter_suitable(self, filters: Optional['VacancyFilters'], mongodb_connection: MongoDBConnection,
+                        document_cache: Optional[TTLCache] = None) -> bool:
+        if filters is None:
+            return True
+
+        data = self.get_vacancy_data(mongodb_connection, document_cache)
         # Shouldnt happen
         if data is None:
-            logging.error(f"Data is none for vacancy {self.get_id()}")
+            logging.error("Data is none for vacancy %d", self.get_id())
+            return False
+
+        return filters.matches(data)
+
+
+
+@dataclass(frozen=True)
+class VacancyFilters:
+    """
+    Salary range, position keywords and company a seeker searches vacancies by.
+    Every keyword of position must be a prefix of a word of the position or the description of a vacancy,
+    case insensitive (e.g. "dev" matches "Developer"). Evaluated by MongoDB over vacancy documents, which carry
+    vacancy_id and recruiter_id for that purpose, in memory by VacancyIndex and VacancyCatalog,
+    or for a single document by matches. All of them must match the same vacancies
+    """
+    salary: (tuple[int, int] | None) = None
+    position: (str | None) = None
+    company_id: (int | None) = None
+
+
+    @staticmethod
+    def create(salary: (tuple[int, int] | None), position: (str | None),
+               company_id: (int | None) = None) -> Optional['VacancyFilters']:
+        """
+        Returns None if no filter is set. A position holding no keywords (e.g. only punctuation) is no filter
+        """
+        if position is not None and len(tokenize(position)) == 0:
+            position = None
+        if salary is None and position is None and company_id is None:
+            return None
+        return VacancyFilters(tuple(salary) if salary is not None else None, position, company_id)
+
+
+    def as_query(self) -> dict[str, Any]:
+        query = {}
+        if self.salary is not None:
+            min_salary, max_salary = self.salary
+            query["salary"] = {"$gte": min_salary, "$lte": max_salary}
+        if self.position is not None:
+            query.update(keywords_query(self.position))
+        if self.company_id is not None:
+            query["company"] = self.company_id
+        return query
+
+
+    def matches(self, document: dict[str, Any]) -> bool:
+        """
+        Whether the vacancy document matches the filters, as as_query would in MongoDB
+        """
+        if self.salary is not None:
+            min_salary, max_salary = self.salary
+            salary = document.get("salary")
+            if salary is None or not (min_salary <= salary <= max_salary):
+                return False
+        if self.position is not None and not matches_keywords(self.position, document):
+            return False
+        if self.company_id is not None and document.get("company") != self.company_id:
+            return False
+        return True
+
+
+class VacancyCatalog:
+    """
+    Compact columnar copy of the vacancy fields searched by: NumPy arrays of vacancy_id, salary, company_id
+    and recruiter_id (plus vacancy_doc_ref), rows kept in vacancy_id order, and a salary-sorted index.
+    Filters are evaluated as vectorized masks over a window of rows after (or before) the cursor,
+    or, if a salary range is selective, as a searchsorted range of the salary index.
+    Built once with a single MongoDB scan and kept up to date by RecruiterProfile.add_vacancy and delete_vacancy,
+    and by VacancyStructures with the vacancies other workers publish or delete.
+    Until it is built, callers fall back to querying MongoDB
+    """
+    # Rows checked at once while scanning for matches, grown as long as too few of them match
+    MIN_SCAN_WINDOW = 256
+    # The salary index is used if the salary range holds less than this share of rows in scope
+    SALARY_INDEX_SELECTIVITY = 0.25
+
+    def __init__(self, capacity: int = 1024):
+        self._lock = threading.Lock()
+        self._size = 0
+        self._deleted = 0
+        self._vacancy_ids = np.empty(capacity, dtype=np.int64)
+        # NaN if the vacancy has no salary, so that no salary range matches it
+        self._salaries = np.empty(capacity, dtype=np.float64)
+        # -1 if the vacancy has no company
+        self._company_ids = np.empty(capacity, dtype=np.int64)
+        self._recruiter_ids = np.empty(capacity, dtype=np.int64)
+        self._doc_refs = np.empty(capacity, dtype=object)
+        # Deleted rows are only unmarked, and dropped once they make up half of the rows
+        self._alive = np.empty(capacity, dtype=bool)
+        # Rows ordered by salary and their salaries, rebuilt on the first salary query after a change
+        self._salary_order: (np.ndarray | None) = None
+        self._sorted_salaries: (np.ndarray | None) = None
+        self._ready = False
+
+
+    def __len__(self) -> int:
+        return self._size - self._deleted
+
+
+    def is_ready(self) -> bool:
+        return self._ready
+
+
+    def build(self, mongodb_connection: MongoDBConnection,
+              documents: Optional[Iterable[dict[str, Any]]] = None) -> bool:
+        """
+        Loads all vacancy documents, replacing the catalog. Those are scanned with scan_vacancy_documents,
+        unless documents read with it (in vacancy_id order) are given
+        """
+        start = time.perf_counter()
+        rows = []
+        try:
+            if documents is None:
+                documents = scan_vacancy_documents(mongodb_connection)
+            for document in documents:
+                rows.append(self._create_row(document["vacancy_id"], document.get("recruiter_id"),
+                                             str(document["_id"]), document))
+        except Exception as e:
+            logging.error("Error while building vacancy catalog: %s", e)
             return False
 
-        data_salary = data['salary']
-        data_position = data['position']
+        columns = list(zip(*rows)) if rows else [()] * 5
+        capacity = max(1024, 2 * len(rows))
+        with self._lock:
+            self._size = len(rows)
+            self._deleted = 0
+            self._vacancy_ids = self._column(columns[0], np.int64, capacity)
+            self._salaries = self._column(columns[1], np.float64, capacity)
+            self._company_ids = self._column(columns[2], np.int64, capacity)
+            self._recruiter_ids = self._column(columns[3], np.int64, capacity)
+            self._doc_refs = self._column(columns[4], object, capacity)
+            self._alive = self._column([True] * len(rows), bool, capacity)
+            self._salary_order = self._sorted_salaries = None
+            self._ready = True
+
+        logging.info("Loaded %d vacancies into catalog in %.2fs", len(rows), time.perf_counter() - start)
+        return True
+
+
+    def add(self, vacancy_id: int, recruiter_id: int, doc_ref: str, document: dict[str, Any]):
+        row = self._create_row(vacancy_id, recruiter_id, doc_ref, document)
+        with self._lock:
+            idx = int(np.searchsorted(self._vacancy_ids[:self._size], vacancy_id))
+            if idx < self._size and self._vacancy_ids[idx] == vacancy_id:
+                if not self._alive[idx]:
+                    self._deleted -= 1
+                self._set_row(idx, row)
+            else:
+                if self._size == len(self._vacancy_ids):
+                    self._grow()
+                # New vacancies get the greatest ids, so nothing is usually shifted
+                if idx < self._size:
+                    for column in self._columns():
+                        column[idx + 1:self._size + 1] = column[idx:self._size]
+                self._size += 1
+                self._set_row(idx, row)
+            self._salary_order = self._sorted_salaries = None
+
+
+    def remove(self, vacancy_id: int):
+        with self._lock:
+            idx = int(np.searchsorted(self._vacancy_ids[:self._size], vacancy_id))
+            if idx == self._size or self._vacancy_ids[idx] != vacancy_id or not self._alive[idx]:
+                return
+
+            self._alive[idx] = False
+            self._deleted += 1
+            if self._deleted * 2 > self._size:
+                self._compact()
+            self._salary_order = self._sorted_salaries = None
+
+
+    def find(self, cursor_id: int, forward: bool, limit: int, salary: (tuple[float, float] | None) = None,
+             company_id: (int | None) = None, candidate_ids=None) -> list[tuple[int, int, str]]:
+        """
+        Returns (vacancy_id, recruiter_id, vacancy_doc_ref) of up to limit vacancies matching the filters
+        right after (or right before) cursor_id, in ascending vacancy_id order.
+        candidate_ids (ascending, e.g. found by VacancyIndex) restricts the vacancies to those
+        """
+        with self._lock:
+            ids = self._vacancy_ids[:self._size]
+            if forward:
+                lo, hi = int(np.searchsorted(ids, cursor_id, side="right")), self._size
+            else:
+                lo, hi = 0, int(np.searchsorted(ids, cursor_id, side="left"))
+
+            if candidate_ids is not None:
+                rows = self._candidate_rows(candidate_ids, lo, hi)
+            elif salary is not None and self._salary_range_count(salary) < self.SALARY_INDEX_SELECTIVITY * (hi - lo):
+                rows = self._salary_rows(salary, lo, hi)
+            else:
+                rows = None
+
+            if rows is not None:
+                matched = rows[self._match_mask(rows, salary, company_id)]
+                matched = matched[:limit] if forward else matched[-limit:]
+            else:
+                matched = self._scan(lo, hi, forward, limit, salary, company_id)
+
+            return list(zip(self._vacancy_ids[matched].tolist(), self._recruiter_ids[matched].tolist(),
+                            self._doc_refs[matched].tolist()))
+
+
+    def find_all(self, salary: (tuple[float, float] | None) = None, company_id: (int | None) = None,
+                 candidate_ids=None) -> list[tuple[int, int, str]]:
+        """
+        Same as find, but returns all matching vacancies
+        """
+        with self._lock:
+            if candidate_ids is not None:
+                rows = self._candidate_rows(candidate_ids, 0, self._size)
+            elif salary is not None:
+                rows = self._salary_rows(salary, 0, self._size)
+            else:
+                rows = np.arange(self._size)
+
+            matched = rows[self._match_mask(rows, salary, company_id)]
+            return list(zip(self._vacancy_ids[matched].tolist(), self._recruiter_ids[matched].tolist(),
+                            self._doc_refs[matched].tolist()))
+
+
+    def _scan(self, lo: int, hi: int, forward: bool, limit: int, salary, company_id) -> np.ndarray:
+        """
+        Checks windows of rows moving away from the cursor until limit of them match
+        """
+        found = []
+        num_found = 0
+        window = max(self.MIN_SCAN_WINDOW, 4 * limit)
+        while lo < hi and num_found < limit:
+            if forward:
+                rows = np.arange(lo, min(hi, lo + window))
+                lo += window
+            else:
+                rows = np.arange(max(lo, hi - window), hi)
+                hi -= window
+
+            matched = rows[self._match_mask(rows, salary, company_id)]
+            if len(matched) > 0:
+                found.append(matched)
+                num_found += len(matched)
+            window *= 2
+
+        if num_found == 0:
+            return np.empty(0, dtype=np.int64)
+        if forward:
+            return np.concatenate(found)[:limit]
+        return np.concatenate(found[::-1])[-limit:]
 
-        is_suitable = True
+
+    def _match_mask(self, rows: np.ndarray, salary, company_id) -> np.ndarray:
+        mask = self._alive[rows]
         if salary is not None:
-            min_salary, max_salary = salary
-            if not (min_salary <= data_salary <= max_salary):
-                is_suitable = False
+            salaries = self._salaries[rows]
+            mask &= (salaries >= salary[0]) & (salaries <= salary[1])
+        if company_id is not None:
+            mask &= self._company_ids[rows] == company_id
+        return mask
 
-        if position_regex is not None and position_regex.search(data_position) is None:
-            is_suitable = False
 
-        return is_suitable
+    def _candidate_rows(self, candidate_ids, lo: int, hi: int) -> np.ndarray:
+        """
+        Rows of the candidate vacancies within [lo, hi), ascending. Candidates not in the catalog are left out
+        """
+        candidates = np.asarray(candidate_ids, dtype=np.int64)
+        rows = np.searchsorted(self._vacancy_ids[:self._size], candidates)
+        in_catalog = rows < self._size
+        in_catalog[in_catalog] = self._vacancy_ids[rows[in_catalog]] == candidates[in_catalog]
+        rows = rows[in_catalog]
+        return rows[(rows >= lo) & (rows < hi)]
+
+
+    def _salary_range_count(self, salary: tuple[float, float]) -> int:
+        first, last = self._salary_range(salary)
+        return last - first
+
+
+    def _salary_rows(self, salary: tuple[float, float], lo: int, hi: int) -> np.ndarray:
+        first, last = self._salary_range(salary)
+        rows = self._salary_order[first:last]
+        return np.sort(rows[(rows >= lo) & (rows < hi)])
+
+
+    def _salary_range(self, salary: tuple[float, float]) -> tuple[int, int]:
+        if self._salary_order is None:
+            # NaN salaries are sorted last and never fall into a range
+            self._salary_order = np.argsort(self._salaries[:self._size], kind="stable")
+            self._sorted_salaries = self._salaries[self._salary_order]
+        return (int(np.searchsorted(self._sorted_salaries, salary[0], side="left")),
+                int(np.searchsorted(self._sorted_salaries, salary[1], side="right")))
+
+
+    def _columns(self) -> tuple[np.ndarray, ...]:
+        return (self._vacancy_ids, self._salaries, self._company_ids, self._recruiter_ids, self._doc_refs, self._alive)
+
+
+    def _set_row(self, idx: int, row: tuple):
+        for column, value in zip(self._columns(), row + (True,)):
+            column[idx] = value
+
+
+    def _grow(self):
+        capacity = 2 * len(self._vacancy_ids)
+        (self._vacancy_ids, self._salaries, self._company_ids, self._recruiter_ids, self._doc_refs,
+         self._alive) = (self._column(column[:self._size], column.dtype, capacity) for column in self._columns())
+
+
+    def _compact(self):
+        alive = self._alive[:self._size]
+        size = int(np.count_nonzero(alive))
+        capacity = max(1024, 2 * size)
+        (self._vacancy_ids, self._salaries, self._company_ids, self._recruiter_ids, self._doc_refs,
+         self._alive) = (self._column(column[:self._size][alive], column.dtype, capacity)
+                         for column in self._columns())
+        self._size = size
+        self._deleted = 0
+
+
+    @staticmethod
+    def _column(values, dtype, capacity: int) -> np.ndarray:
+        column = np.empty(capacity, dtype=dtype)
+        column[:len(values)] = values
+        return column
+
+
+    @staticmethod
+    def _create_row(vacancy_id: int, recruiter_id: (int | None), doc_ref: str, document: dict[str, Any]) -> tuple:
+        salary = document.get("salary")
+        company_id = document.get("company")
+        return (vacancy_id, float(salary) if salary is not None else np.nan,
+                int(company_id) if company_id is not None else -1,
+                recruiter_id if recruiter_id is not None else -1, doc_ref)
+
+
+# Rough sizes in bytes of a Vacancy and of a vacancy document, to bound caches by memory
+VACANCY_SIZE = 200
+DOCUMENT_SIZE = 2000
 
-    
 
 class VacanciesChunk:
     """
-    Represents a "search" chunk of vacancies. Basically stores an array of vacancies
-    Object will query vacancies by the provided offset and limit
+    Represents a "search" chunk of vacancies. Basically stores an array of vacancies ordered by vacancy_id
+    Chunks are keyset paginated: the object will query up to limit vacancies right after (or right before)
+    the provided cursor id, so a page costs the same no matter how deep it is, and vacancies inserted
+    or deleted elsewhere do not shift it
+    If filters are given, the chunk only holds vacancies matching them. Those are queried from MongoDB
+    with a single indexed query instead of checking vacancies one by one, or found in the in-memory
+    VacancyCatalog (among vacancies found by keywords in VacancyIndex if there is a position filter)
     """
-    def __init__(self, limit: int, chunk_offset: int):
+    def __init__(self, limit: int, cursor_id: int = 0, forward: bool = True, filters: Optional[VacancyFilters] = None):
         self._limit = limit
-        self._chunk_offset = chunk_offset
+        self._cursor_id = cursor_id
+        self._forward = forward
+        self._filters = filters
+        self._is_anchor = False
         self._vacancies = []
+        # Whether there are vacancies right after (before) this chunk, None if unknown. The direction the chunk is
+        # queried in is known from one extra look-ahead row, the other one from the chunk it was reached from
+        self._has_following: Optional[bool] = None
+        # Vacancy ids start at 1, so nothing precedes the first chunk
+        self._has_preceding: Optional[bool] = False if forward and cursor_id == 0 else None
+        # Documents of the vacancies keyed by their refs, loaded with a single query by load_documents
+        self.documents: (dict[str, dict[str, Any]] | None) = None
+        # Metrics of the companies that published vacancies of this chunk, see SeekerHome.get_vacancy_view
+        self.company_metrics: (dict[int, dict[str, int]] | None) = None
+
+
+    @staticmethod
+    def create_anchor(limit: int, vacancy: Vacancy, filters: Optional[VacancyFilters]) -> 'VacanciesChunk':
+        """
+        Returns a chunk holding just the vacancy (whether it matches filters or not),
+        so that the chunks following and preceding it are queried with filters
+        """
+        chunk = VacanciesChunk(limit, vacancy.get_id(), filters=filters)
+        chunk._vacancies = [vacancy]
+        chunk._is_anchor = True
+        return chunk
+
+
+    def is_anchor(self) -> bool:
+        return self._is_anchor
+
+
+    def has_following(self) -> Optional[bool]:
+        return self._has_following
+
+
+    def has_preceding(self) -> Optional[bool]:
+        return self._has_preceding
+
+
+    def get_filters(self) -> Optional[VacancyFilters]:
+        return self._filters
+
+
+    def get_cursor(self) -> tuple[int, bool, Optional[VacancyFilters]]:
+        """
+        Identifies the vacancies the chunk is queried for, regardless of its limit
+        """
+        return self._cursor_id, self._forward, self._filters
 
     
-    def query_chunk(self, psql_connection: PsqlConnection) -> list[Vacancy]:
-        row_offset = self._chunk_offset * self._limit
-        rows = psql_connection.execute_query(f"SELECT * FROM vacancies LIMIT {self._limit} OFFSET {row_offset}")
+    def query_chunk(self, psql_connection: PsqlConnection, mongodb_connection: Optional[MongoDBConnection] = None,
+                    vacancy_index: Optional[VacancyIndex] = None, vacancy_catalog: Optional[VacancyCatalog] = None,
+                    snapshot_query: Optional[Callable[[int, bool, int, bool], Optional[list[Vacancy]]]] = None
+                    ) -> list[Vacancy]:
+        """
+        snapshot_query(cursor_id, forward, count, filtered), e.g. SearchSession.query, pages over a snapshot
+        of the search instead of the live vacancies. They are queried as usual if it fails (returns None)
+        """
+        if snapshot_query is not None:
+            vacancies = snapshot_query(self._cursor_id, self._forward, self._limit + 1, self._filters is not None)
+            if vacancies is not None:
+                self._vacancies = self._take_look_ahead(vacancies)
+                return self._vacancies
+
+        if self._filters is not None:
+            if vacancy_catalog is not None and vacancy_catalog.is_ready():
+                if self._filters.position is None:
+                    return self._query_catalog_chunk(vacancy_catalog)
+
+                candidate_ids = vacancy_index.search(self._filters.position) if vacancy_index is not None else None
+                if candidate_ids is not None:
+                    return self._query_catalog_chunk(vacancy_catalog, candidate_ids)
+
+            assert mongodb_connection is not None
+            return self._query_filtered_chunk(mongodb_connection)
+
+        # One row more than needed tells whether there are vacancies beyond the chunk
+        if self._forward:
+            rows = psql_connection.execute_prepared(
+                "vacancies_chunk_after",
+                "SELECT * FROM vacancies WHERE vacancy_id > $1 ORDER BY vacancy_id LIMIT $2",
+                self._cursor_id, self._limit + 1)
+        else:
+            rows = psql_connection.execute_prepared(
+                "vacancies_chunk_before",
+                "SELECT * FROM vacancies WHERE vacancy_id < $1 ORDER BY vacancy_id DESC LIMIT $2",
+                self._cursor_id, self._limit + 1)
 
         vacancies = []
         if rows is None:
             return vacancies
 
-        for row in rows:
+        for row in self._take_look_ahead(rows):
             vacancy = Vacancy(
                 vacancy_id=row['vacancy_id'], 
                 recruiter_id=row['recruiter_id'], 
@@ -106,5 +546,95 @@ class VacanciesChunk:
         return vacancies
 
 
+    def _query_filtered_chunk(self, mongodb_connection: MongoDBConnection) -> list[Vacancy]:
+        query = self._filters.as_query()
+        query["vacancy_id"] = {"$gt": self._cursor_id} if self._forward else {"$lt": self._cursor_id}
+        documents = mongodb_connection.find_documents("vacancies", query,
+                                                      projection={"vacancy_id": 1, "recruiter_id": 1},
+                                                      sort=[("vacancy_id", 1 if self._forward else -1)],
+                                                      limit=self._limit + 1)
+
+        self._vacancies = [Vacancy(document["vacancy_id"], document["recruiter_id"], str(document["_id"]))
+                           for document in self._take_look_ahead(documents)]
+        return self._vacancies
+
+
+    def _query_catalog_chunk(self, vacancy_catalog: VacancyCatalog, candidate_ids=None) -> list[Vacancy]:
+        """
+        Finds vacancies matching salary and company filters in the catalog,
+        among candidate_ids if the position filter was matched by VacancyIndex
+        """
+        rows = vacancy_catalog.find(self._cursor_id, self._forward, self._limit + 1, self._filters.salary,
+                                    self._filters.company_id, candidate_ids)
+        if not self._forward:
+            rows.reverse()
+
+        self._vacancies = [Vacancy(vacancy_id, recruiter_id, doc_ref)
+                           for vacancy_id, recruiter_id, doc_ref in self._take_look_ahead(rows)]
+        return self._vacancies
+
+
+    def _take_look_ahead(self, rows: list) -> list:
+        """
+        Takes rows queried (up to limit + 1 of them) in the order moving away from the cursor.
+        Records whether there is a row beyond the limit and returns the others in ascending vacancy_id order
+        """
+        has_more = len(rows) > self._limit
+        rows = rows[:self._limit]
+        if self._forward:
+            self._has_following = has_more
+        else:
+            self._has_preceding = has_more
+            rows.reverse()
+        return rows
+
+
     def get_current_chunk(self) -> list[Vacancy]:
-        return self._vacancies
\ No newline at end of file
+        return self._vacancies
+
+
+    def load_documents(self, mongodb_connection: MongoDBConnection,
+                       document_cache: Optional[TTLCache] = None) -> dict[str, dict[str, Any]]:
+        """
+        Loads documents of all vacancies of the chunk. Those found in document_cache are not queried
+        """
+        doc_refs = [vacancy.get_doc_ref() for vacancy in self._vacancies]
+        documents = document_cache.get_many(doc_refs) if document_cache is not None else {}
+
+        missing_refs = [doc_ref for doc_ref in doc_refs if doc_ref not in documents]
+        if len(missing_refs) > 0:
+            queried_documents = mongodb_connection.find_many("vacancies", missing_refs)
+            if document_cache is not None:
+                document_cache.put_many(queried_documents)
+            documents.update(queried_documents)
+
+        self.documents = documents
+        return self.documents
+
+
+    def estimate_size(self) -> int:
+        return len(self._vacancies) * VACANCY_SIZE + (len(self.documents) * DOCUMENT_SIZE if self.documents else 0)
+
+
+    def get_following_chunk(self, limit: Optional[int] = None) -> Optional['VacanciesChunk']:
+        """
+        Returns a (not yet queried) chunk of the vacancies right after this one, None if this chunk is empty.
+        The chunk holds up to limit vacancies, as many as this one by default
+        """
+        if len(self._vacancies) == 0:
+            return None
+        chunk = VacanciesChunk(limit or self._limit, self._vacancies[-1].get_id(), forward=True, filters=self._filters)
+        # This chunk precedes it. Unless it is an anchor, which does not have to match the filters
+        chunk._has_preceding = None if self._is_anchor else True
+        return chunk
+
+
+    def get_preceding_chunk(self, limit: Optional[int] = None) -> Optional['VacanciesChunk']:
+        """
+        Same as get_following_chunk, but for the vacancies right before this one
+        """
+        if len(self._vacancies) == 0:
+            return None
+        chunk = VacanciesChunk(limit or self._limit, self._vacancies[0].get_id(), forward=False, filters=self._filters)
+        chunk._has_following = None if self._is_anchor else True
+        return chunk
@@ -0,0 +1,230 @@
+import logging
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from typing import Any, Iterable, Iterator, Optional
+
+from src.connections import MongoDBConnection
+
+
+# Word characters, plus "+" and "#" so that "C++" and "C#" stay whole tokens
+_TOKEN_REGEX = re.compile(r"[\w+#]+")
+# Fields of vacancy documents that are searched by keywords
+INDEXED_FIELDS = ("position", "description")
+# Fields of vacancy documents VacancyIndex, VacancyCatalog and VacancyRanker are built from
+SCANNED_FIELDS = ("vacancy_id", "recruiter_id", "salary", "company") + INDEXED_FIELDS
+
+
+def words(text: Any) -> list[str]:
+    """
+    Lowercased tokens of text in order, repeated ones included
+    """
+    if not isinstance(text, str):
+        return []
+    return _TOKEN_REGEX.findall(text.lower())
+
+
+def tokenize(text: Any) -> set[str]:
+    return set(words(text))
+
+
+def matches_keywords(keywords: str, document: dict[str, Any]) -> bool:
+    """
+    Whether every token of keywords is a prefix of a word of the indexed fields of document (case insensitive),
+    the way VacancyIndex.search matches vacancies. See also keywords_query, which matches the same in MongoDB
+    """
+    document_words = set()
+    for field in INDEXED_FIELDS:
+        document_words.update(words(document.get(field)))
+    return all(any(word.startswith(token) for word in document_words) for token in tokenize(keywords))
+
+
+def keywords_query(keywords: str) -> dict[str, Any]:
+    """
+    MongoDB query matching the vacancy documents matches_keywords matches. Each token must follow a character
+    that is not a token character (or start the field), (*UCP) makes \\w match the same letters as in Python
+    """
+    conditions = []
+    for token in sorted(tokenize(keywords)):
+        regex = {"$regex": r"(*UCP)(?<![\w+#])" + re.escape(token), "$options": "i"}
+        conditions.append({"$or": [{field: regex} for field in INDEXED_FIELDS]})
+    return {"$and": conditions}
+
+
+def scan_vacancy_documents(mongodb_connection: MongoDBConnection) -> Iterator[dict[str, Any]]:
+    """
+    Streams all vacancy documents carrying a vacancy_id (see prepare_vacancy_documents) in vacancy_id order,
+    with the fields of all in-memory vacancy structures, so that a single scan can build each of them.
+    Raises on errors, see MongoDBConnection.scan_documents
+    """
+    return mongodb_connection.scan_documents("vacancies", {"vacancy_id": {"$exists": True}},
+                                             projection={field: 1 for field in SCANNED_FIELDS},
+                                             sort=[("vacancy_id", 1)])
+
+
+class VacancyIndex:
+    """
+    In-memory inverted index from the tokens of vacancy positions and descriptions to the ids of the vacancies
+    containing them. Posting lists are sorted arrays of vacancy ids, so a keyword search is an intersection
+    of posting lists, and its result is already in the vacancy_id order the search pages by.
+    Built once with a single MongoDB scan and kept up to date by RecruiterProfile.add_vacancy and delete_vacancy,
+    and by VacancyStructures with the vacancies other workers publish or delete.
+    Until it is built, search returns None and callers fall back to querying MongoDB.
+    Other fields of the matching vacancies are filtered by VacancyCatalog
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        # token -> ids of the vacancies containing it, ascending
+        self._postings: dict[str, array] = {}
+        # All tokens in sorted order, for prefix lookups
+        self._tokens: list[str] = []
+        # vacancy_id -> tokens of the vacancy, to remove it from posting lists
+        self._vacancy_tokens: dict[int, frozenset[str]] = {}
+        self._ready = False
+
+
+    def __len__(self) -> int:
+        return len(self._vacancy_tokens)
+
+
+    def is_ready(self) -> bool:
+        return self._ready
+
+
+    def build(self, mongodb_connection: MongoDBConnection,
+              documents: Optional[Iterable[dict[str, Any]]] = None) -> bool:
+        """
+        Indexes all vacancy documents, replacing the index. Those are scanned with scan_vacancy_documents,
+        unless documents read with it are given. They come in vacancy_id order, so posting lists are built by appending
+        """
+        start = time.perf_counter()
+        postings: dict[str, array] = {}
+        vacancy_tokens: dict[int, frozenset[str]] = {}
+        try:
+            if documents is None:
+                documents = scan_vacancy_documents(mongodb_connection)
+            for document in documents:
+                vacancy_id = document["vacancy_id"]
+                tokens = vacancy_tokens[vacancy_id] = self._document_tokens(document)
+                for token in tokens:
+                    posting = postings.get(token)
+                    if posting is None:
+                        posting = postings[token] = array("q")
+                    posting.append(vacancy_id)
+        except Exception as e:
+            logging.error("Error while building vacancy index: %s", e)
+            return False
+
+        with self._lock:
+            self._postings = postings
+            self._tokens = sorted(postings)
+            self._vacancy_tokens = vacancy_tokens
+            self._ready = True
+
+        logging.info("Indexed %d vacancies (%d tokens) in %.2fs", len(vacancy_tokens), len(postings),
+                     time.perf_counter() - start)
+        return True
+
+
+    def add(self, vacancy_id: int, document: dict[str, Any]):
+        tokens = self._document_tokens(document)
+        with self._lock:
+            if vacancy_id in self._vacancy_tokens:
+                self._remove(vacancy_id)
+
+            self._vacancy_tokens[vacancy_id] = tokens
+            for token in tokens:
+                posting = self._postings.get(token)
+                if posting is None:
+                    self._postings[token] = array("q", [vacancy_id])
+                    insort(self._tokens, token)
+                elif posting[-1] < vacancy_id:
+                    # New vacancies get the greatest ids, so this is the common case
+                    posting.append(vacancy_id)
+                else:
+                    posting.insert(bisect_left(posting, vacancy_id), vacancy_id)
+
+
+    def remove(self, vacancy_id: int):
+        with self._lock:
+            self._remove(vacancy_id)
+
+
+    def search(self, keywords: str) -> Optional[array]:
+        """
+        Returns ascending ids of the vacancies whose position or description contains every keyword
+        as a word prefix (case insensitive), e.g. "dev" matches "Developer".
+        Returns None if the index is not built yet or keywords hold no tokens
+        """
+        tokens = tokenize(keywords)
+        if not self._ready or len(tokens) == 0:
+            return None
+
+        with self._lock:
+            postings = [self._prefix_postings(token) for token in tokens]
+
+        # Intersect the shortest lists first, the result is never longer than any of them
+        postings.sort(key=len)
+        result = postings[0]
+        for posting in postings[1:]:
+            if len(result) == 0:
+                break
+            result = _intersect(result, posting)
+        return result
+
+
+    def _prefix_postings(self, prefix: str) -> array:
+        """
+        Ids of the vacancies containing any token starting with prefix. Must be called under the lock
+        """
+        first = bisect_left(self._tokens, prefix)
+        last = first
+        while last < len(self._tokens) and self._tokens[last].startswith(prefix):
+            last += 1
+
+        if last - first == 1:
+            return array("q", self._postings[self._tokens[first]])
+        vacancy_ids = set()
+        for token in self._tokens[first:last]:
+            vacancy_ids.update(self._postings[token])
+        return array("q", sorted(vacancy_ids))
+
+
+    def _remove(self, vacancy_id: int):
+        tokens = self._vacancy_tokens.pop(vacancy_id, None)
+        if tokens is None:
+            return
+
+        for token in tokens:
+            posting = self._postings[token]
+            del posting[bisect_left(posting, vacancy_id)]
+            if len(posting) == 0:
+                del self._postings[token]
+                del self._tokens[bisect_left(self._tokens, token)]
+
+
+    @staticmethod
+    def _document_tokens(document: dict[str, Any]) -> frozenset[str]:
+        tokens = set()
+        for field in INDEXED_FIELDS:
+            tokens |= tokenize(document.get(field))
+        return frozenset(tokens)
+
+
+def _intersect(smaller: array, larger: array) -> array:
+    """
+    Intersects two ascending arrays by binary searching elements of the smaller one in the larger one,
+    each search starting where the previous one ended
+    """
+    result = array("q")
+    lo = 0
+    for vacancy_id in smaller:
+        lo = bisect_left(larger, vacancy_id, lo)
+        if lo == len(larger):
+            break
+        if larger[lo] == vacancy_id:
+            result.append(vacancy_id)
+            lo += 1
+    return result
@@ -0,0 +1,200 @@
+import logging
+import threading
+import time
+import zlib
+from typing import Any, Iterable, Optional
+
+import numpy as np
+
+from src.connections import MongoDBConnection
+from src.users.vacancy import Vacancy
+from src.users.vacancy_index import INDEXED_FIELDS, scan_vacancy_documents, words
+
+
+class VacancyRanker:
+    """
+    Scores vacancies by relevance to a text (e.g. a seeker portfolio) with TF-IDF over hashed bags of words.
+    Each vacancy is a row of term frequencies of its position and description, tokens hashed into n_features
+    columns, so the matrix has a fixed width no matter how large the vocabulary grows. IDF weights are derived
+    from per-column document frequencies at ranking time, and all vacancies are scored with a single
+    matrix-vector product.
+    Built once with a single MongoDB scan and kept up to date by RecruiterProfile.add_vacancy and delete_vacancy,
+    and by VacancyStructures with the vacancies other workers publish or delete
+    """
+    def __init__(self, n_features: int = 1024):
+        self._n_features = n_features
+        self._lock = threading.Lock()
+        # L2 normalized (sublinear) term frequencies of the vacancies, first _size rows are in use
+        self._matrix = np.zeros((0, n_features), dtype=np.float32)
+        # Number of vacancies having a non-zero value in each column
+        self._document_frequencies = np.zeros(n_features, dtype=np.int64)
+        # (vacancy_id, recruiter_id, vacancy_doc_ref) of each row, and the row of each vacancy_id
+        self._vacancies: list[tuple[int, int, str]] = []
+        self._rows: dict[int, int] = {}
+        self._size = 0
+        self._ready = False
+
+
+    def __len__(self) -> int:
+        return self._size
+
+
+    def __contains__(self, vacancy_id: int) -> bool:
+        return vacancy_id in self._rows
+
+
+    def is_ready(self) -> bool:
+        return self._ready
+
+
+    def build(self, mongodb_connection: MongoDBConnection,
+              documents: Optional[Iterable[dict[str, Any]]] = None) -> bool:
+        """
+        Vectorizes all vacancy documents, replacing the matrix. Those are scanned with scan_vacancy_documents,
+        unless documents read with it are given
+        """
+        start = time.perf_counter()
+        vectors = []
+        vacancies = []
+        try:
+            if documents is None:
+                documents = scan_vacancy_documents(mongodb_connection)
+            for document in documents:
+                vectors.append(self.vectorize(VacancyRanker._document_text(document)))
+                vacancies.append((document["vacancy_id"], document.get("recruiter_id", -1), str(document["_id"])))
+        except Exception as e:
+            logging.error("Error while building vacancy ranker: %s", e)
+            return False
+
+        matrix = np.zeros((max(len(vectors), 1), self._n_features), dtype=np.float32)
+        if len(vectors) > 0:
+            matrix[:len(vectors)] = vectors
+        with self._lock:
+            self._matrix = matrix
+            self._document_frequencies = np.count_nonzero(matrix[:len(vectors)], axis=0).astype(np.int64)
+            self._vacancies = vacancies
+            self._rows = {vacancy[0]: row for row, vacancy in enumerate(vacancies)}
+            self._size = len(vacancies)
+            self._ready = True
+
+        logging.info("Vectorized %d vacancies in %.2fs", len(vacancies), time.perf_counter() - start)
+        return True
+
+
+    def add(self, vacancy_id: int, recruiter_id: int, doc_ref: str, document: dict[str, Any]):
+        vector = self.vectorize(VacancyRanker._document_text(document))
+        with self._lock:
+            if vacancy_id in self._rows:
+                self._remove(vacancy_id)
+
+            if self._size == len(self._matrix):
+                matrix = np.zeros((max(2 * len(self._matrix), 16), self._n_features), dtype=np.float32)
+                matrix[:self._size] = self._matrix[:self._size]
+                self._matrix = matrix
+
+            self._matrix[self._size] = vector
+            self._document_frequencies += vector > 0
+            self._vacancies.append((vacancy_id, recruiter_id, doc_ref))
+            self._rows[vacancy_id] = self._size
+            self._size += 1
+
+
+    def remove(self, vacancy_id: int):
+        with self._lock:
+            self._remove(vacancy_id)
+
+
+    def rank(self, text: str, limit: int) -> list[tuple[int, int, str]]:
+        """
+        Returns (vacancy_id, recruiter_id, vacancy_doc_ref) of up to limit vacancies sharing any words with text,
+        most relevant first
+        """
+        query = self.vectorize(text)
+        with self._lock:
+            if self._size == 0 or not query.any():
+                return []
+
+            # Smoothed IDF, applied to the query twice as the rows hold plain term frequencies
+            idf = np.log((1 + self._size) / (1 + self._document_frequencies)) + 1
+            scores = self._matrix[:self._size] @ (query * idf * idf).astype(np.float32)
+
+            limit = min(limit, self._size)
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            top = top[scores[top] > 0]
+            return [self._vacancies[row] for row in top.tolist()]
+
+
+    def vectorize(self, text: str) -> np.ndarray:
+        """
+        Hashed bag of words of text: 1 + log of the count of each column, L2 normalized
+        """
+        vector = np.zeros(self._n_features, dtype=np.float32)
+        columns = [zlib.crc32(word.encode()) % self._n_features for word in words(text)]
+        if len(columns) == 0:
+            return vector
+
+        np.add.at(vector, columns, 1)
+        nonzero = vector > 0
+        vector[nonzero] = 1 + np.log(vector[nonzero])
+        return vector / np.linalg.norm(vector)
+
+
+    def _remove(self, vacancy_id: int):
+        """
+        Moves the last row into the place of the removed one, rows are not ordered. Must be called under the lock
+        """
+        row = self._rows.pop(vacancy_id, None)
+        if row is None:
+            return
+
+        self._document_frequencies -= self._matrix[row] > 0
+        last = self._size - 1
+        if row != last:
+            self._matrix[row] = self._matrix[last]
+            self._vacancies[row] = self._vacancies[last]
+            self._rows[self._vacancies[row][0]] = row
+        self._matrix[last] = 0
+        self._vacancies.pop()
+        self._size -= 1
+
+
+    @staticmethod
+    def _document_text(document: dict[str, Any]) -> str:
+        return " ".join(str(document.get(field) or "") for field in INDEXED_FIELDS)
+
+
+class RankedVacancies:
+    """
+    Vacancies recommended to a seeker, most relevant first. Paged by VacanciesChunk the same way as
+    a SearchSession, except that chunks follow each other in the order of relevance instead of vacancy_id.
+    Vacancies deleted since they were ranked are skipped
+    """
+    def __init__(self, vacancy_ranker: VacancyRanker, vacancies: list[tuple[int, int, str]]):
+        self._vacancy_ranker = vacancy_ranker
+        self._vacancies = vacancies
+        self._ranks = {vacancy[0]: rank for rank, vacancy in enumerate(vacancies)}
+
+
+    def __len__(self) -> int:
+        return len(self._vacancies)
+
+
+    def query(self, cursor_id: int, forward: bool, count: int, filtered: bool) -> Optional[list[Vacancy]]:
+        """
+        Returns up to count vacancies ranked right after (or right before) the vacancy cursor_id,
+        ordered away from it. Cursor 0 precedes the most relevant vacancy.
+        Returns None for filtered chunks, which are queried as usual
+        """
+        if filtered:
+            return None
+
+        step = 1 if forward else -1
+        rank = self._ranks.get(cursor_id, -1) + step
+        vacancies = []
+        while 0 <= rank < len(self._vacancies) and len(vacancies) < count:
+            vacancy_id, recruiter_id, doc_ref = self._vacancies[rank]
+            if vacancy_id in self._vacancy_ranker:
+                vacancies.append(Vacancy(vacancy_id, recruiter_id, doc_ref))
+            rank += step
+        return vacancies
@@ -0,0 +1,44 @@
+import time
+import statistics
+
+from src.sweet_home import SweetConnections
+
+
+ITERATIONS = 2000
+LOOKUP_QUERY = ("SELECT * FROM user_profiles u "
+                "LEFT JOIN seeker_profiles s ON s.user_id = u.user_id "
+                "LEFT JOIN recruiter_profiles r ON r.user_id = u.user_id "
+                "WHERE u.user_id = %s")
+
+
+def measure(lookup) -> list[float]:
+    latencies = []
+    for i in range(ITERATIONS):
+        start = time.perf_counter()
+        lookup(i)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(name: str, latencies: list[float]):
+    latencies = sorted(latencies)
+    print(f"{name:>10}: mean {statistics.mean(latencies):.3f} ms, "
+          f"p50 {latencies[len(latencies) // 2]:.3f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)]:.3f} ms")
+
+
+# Compares plain parameterized execution against a named prepared statement for a profile lookup.
+# Requires the databases from docker-compose.yml to be running: python -m tests.benchmark_prepared_statements
+if __name__ == "__main__":
+    sweet_connections = SweetConnections()
+    sweet_connections.open()
+    sql_connection = sweet_connections.sql_connection
+
+    # Warm up both paths, so that connection setup and the first PREPARE are not measured
+    sql_connection.execute_query_fetchone(LOOKUP_QUERY, 0)
+    sql_connection.execute_prepared_fetchone("bench_profile_lookup", LOOKUP_QUERY.replace("%s", "$1"), 0)
+
+    report("plain", measure(lambda i: sql_connection.execute_query_fetchone(LOOKUP_QUERY, i)))
+    report("prepared", measure(lambda i: sql_connection.execute_prepared_fetchone(
+        "bench_profile_lookup", LOOKUP_QUERY.replace("%s", "$1"), i)))
+    sweet_connections.close()
@@ -0,0 +1,15 @@
+class DocumentsScan:
+    """
+    Serves vacancy documents the way MongoDBConnection.scan_documents does, counting the scans
+    """
+    def __init__(self, documents: list[dict]):
+        self.documents = documents
+        self.scans = 0
+
+
+    def scan_documents(self, collection_name, query, projection=None, sort=None):
+        self.scans += 1
+        documents = sorted(self.documents, key=lambda document: document['vacancy_id'])
+        if isinstance(query.get('vacancy_id'), int):
+            documents = [document for document in documents if document['vacancy_id'] == query['vacancy_id']]
+        return iter(documents)
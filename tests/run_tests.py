@@ -1,8 +1,13 @@
 import sys
 import logging
 import unittest
+import tests.test_caches
 import tests.test_connections
+import tests.test_logging_setup
 import tests.test_routers
+import tests.test_vacancy_catalog
+import tests.test_vacancy_index
+import tests.test_vacancy_ranker
 
 
 if __name__ == "__main__":
@@ -10,4 +15,9 @@ if __name__ == "__main__":
     loader = unittest.TestLoader()
     runner = unittest.TextTestRunner(verbosity=2)
     runner.run(loader.loadTestsFromModule(tests.test_connections))
-    runner.run(loader.loadTestsFromModule(tests.test_routers))
\ No newline at end of file
+    runner.run(loader.loadTestsFromModule(tests.test_routers))
+    runner.run(loader.loadTestsFromModule(tests.test_logging_setup))
+    runner.run(loader.loadTestsFromModule(tests.test_caches))
+    runner.run(loader.loadTestsFromModule(tests.test_vacancy_index))
+    runner.run(loader.loadTestsFromModule(tests.test_vacancy_catalog))
+    runner.run(loader.loadTestsFromModule(tests.test_vacancy_ranker))
\ No newline at end of file
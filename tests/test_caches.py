@@ -0,0 +1,78 @@
+import unittest
+
+from src.caches import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TTLCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = TTLCache(max_size=2, ttl=10.0, clock=self.clock)
+
+
+    def test_hits_and_misses_counted(self):
+        self.cache.put('a', 1)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+
+    def test_least_recently_used_evicted(self):
+        self.cache.put('a', 1)
+        self.cache.put('b', 2)
+        # Reading 'a' makes 'b' the least recently used
+        self.cache.get('a')
+        self.cache.put('c', 3)
+
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertEqual(self.cache.evictions, 1)
+
+
+    def test_entries_expire(self):
+        self.cache.put('a', 1)
+        self.clock.now = 9.0
+        self.assertEqual(self.cache.get('a'), 1)
+
+        self.clock.now = 10.0
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(len(self.cache), 0)
+
+
+    def test_get_many_returns_cached_keys_in_order(self):
+        self.cache.put_many({'a': 1, 'b': 2})
+        self.assertEqual(list(self.cache.get_many(['b', 'missing', 'a']).items()), [('b', 2), ('a', 1)])
+        self.assertEqual(self.cache.misses, 1)
+
+
+    def test_invalidate(self):
+        self.cache.put('a', 1)
+        self.cache.invalidate('a')
+        self.cache.invalidate('missing')
+        self.assertIsNone(self.cache.get('a'))
+
+
+    def test_weight_limited(self):
+        cache = TTLCache(max_size=10, ttl=10.0, clock=self.clock, max_weight=10, weigh=len)
+        cache.put('a', [0] * 4)
+        cache.put('b', [0] * 4)
+        cache.put('c', [0] * 4)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual((len(cache), cache.weight), (2, 8))
+
+        # Values growing after they were put are measured again
+        value = cache.get('b')
+        value += [0] * 4
+        cache.reweigh('b')
+        self.assertIsNone(cache.get('c'))
+        self.assertEqual((len(cache), cache.weight, cache.evictions), (1, 8, 2))
@@ -1,5 +1,17 @@
+import time
 import unittest
-from src.sweet_home import SweetConnections
+from concurrent.futures import ThreadPoolExecutor
+
+from src.cache_invalidation import CacheInvalidator
+from src.caches import TTLCache
+from src.migrations import MIGRATIONS, migrate_company_metrics, run_migrations
+from src.sweet_home import SweetConnections, SweetHome
+from src.users.company import Company, CompanyMetrics
+from src.users.company_registry import CompanyRegistry
+from src.users.search_session import SearchSession
+from src.users.seeker_profile import VacanciesSearchContext
+from src.users.vacancy import VacanciesChunk, VacancyCatalog, VacancyFilters
+from tests.fakes import DocumentsScan
 
 
 class SweetConnectionsTest(unittest.TestCase):
@@ -7,8 +19,19 @@ class SweetConnectionsTest(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         cls.sweet_connections = SweetConnections()
+        cls.sweet_connections.open()
     
 
+    def test_connections_open_lazily(self):
+        sweet_connections = SweetConnections()
+        self.assertFalse(sweet_connections.sql_connection.is_open())
+
+        result = sweet_connections.sql_connection.execute_query_fetchone("SELECT 1 AS one")
+        self.assertEqual(result['one'], 1)
+        self.assertTrue(sweet_connections.sql_connection.is_open())
+        sweet_connections.close()
+
+
     def test_postgresql_insert_and_fetch(self):
         # Insert a user profile
         user_id = 123
@@ -36,6 +59,108 @@ class SweetConnectionsTest(unittest.TestCase):
         self.assertIsNone(result_after_deletion)
         
 
+    def test_user_profiles_loaded_in_batch(self):
+        sql_connection = self.sweet_connections.sql_connection
+        for user_id in (124, 125):
+            sql_connection.execute_query("INSERT INTO user_profiles (user_id, first_name, last_name) "
+                                         "VALUES (%s, %s, %s)", user_id, 'Test', str(user_id))
+        sql_connection.execute_query("INSERT INTO seeker_profiles VALUES (%s, %s, %s)", 125, 'portfolio', 1)
+
+        user_profiles = SweetHome(self.sweet_connections).request_user_profiles([125, 126, 124])
+        self.assertEqual([user_profile.get_id() for user_profile in user_profiles], [125, 124])
+        self.assertEqual(user_profiles[0].seeker_ref.get_portfolio_ref(), 'portfolio')
+        self.assertIsNone(user_profiles[1].seeker_ref)
+        self.assertIs(self.sweet_connections.user_profiles.get(124), user_profiles[1])
+
+        sql_connection.execute_query("DELETE FROM seeker_profiles WHERE user_id = %s", 125)
+        sql_connection.execute_query("DELETE FROM user_profiles WHERE user_id IN (124, 125)")
+        self.sweet_connections.user_profiles.clear()
+
+
+    def test_recruiter_vacancies_loaded_lazily(self):
+        sql_connection = self.sweet_connections.sql_connection
+        sql_connection.execute_query("INSERT INTO user_profiles (user_id, first_name, last_name) "
+                                     "VALUES (%s, %s, %s)", 127, 'Test', 'Recruiter')
+        company_id = sql_connection.execute_query_fetchone("INSERT INTO companies (name) VALUES (%s) "
+                                                           "RETURNING company_id", 'Test Company')['company_id']
+        sql_connection.execute_query("INSERT INTO recruiter_profiles VALUES (%s, %s, %s)", 127, 1, company_id)
+        vacancy_id = sql_connection.execute_query_fetchone("INSERT INTO vacancies (recruiter_id, vacancy_doc_ref) "
+                                                           "VALUES (%s, %s) RETURNING vacancy_id",
+                                                           127, 'doc')['vacancy_id']
+
+        user_profile = SweetHome(self.sweet_connections).request_user_profile(127)
+        self.assertIsNone(user_profile.seeker_ref)
+        self.assertEqual(user_profile.recruiter_ref.estimate_size(), 0)
+        vacancies = user_profile.recruiter_ref.get_vacancies(sql_connection)
+        self.assertEqual([vacancy.get_id() for vacancy in vacancies], [vacancy_id])
+
+        sql_connection.execute_query("DELETE FROM vacancies WHERE vacancy_id = %s", vacancy_id)
+        sql_connection.execute_query("DELETE FROM recruiter_profiles WHERE user_id = %s", 127)
+        sql_connection.execute_query("DELETE FROM companies WHERE company_id = %s", company_id)
+        sql_connection.execute_query("DELETE FROM user_profiles WHERE user_id = %s", 127)
+        self.sweet_connections.user_profiles.clear()
+
+
+    def test_postgresql_concurrent_queries(self):
+        # Every call checks out its own pooled connection, so concurrent queries must not interfere
+        sql_connection = self.sweet_connections.sql_connection
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(
+                lambda i: sql_connection.execute_query_fetchone("SELECT %s::int AS value", i), range(32)))
+
+        self.assertEqual([row['value'] for row in results], list(range(32)))
+
+
+    def test_postgresql_prepared_statements(self):
+        sql_connection = self.sweet_connections.sql_connection
+        query = "SELECT $1::int + $2::int AS total"
+        # The second call reuses the statement already prepared on the connection
+        for _ in range(2):
+            row = sql_connection.execute_prepared_fetchone("test_sum", query, 2, 3)
+            self.assertEqual(row['total'], 5)
+
+        rows = sql_connection.execute_prepared("test_series", "SELECT generate_series(1, $1) AS value", 3)
+        self.assertEqual([row['value'] for row in rows], [1, 2, 3])
+
+
+    def test_migrations_are_recorded_once(self):
+        sql_connection = self.sweet_connections.sql_connection
+        # open() already migrated the database, so there is nothing left to apply
+        self.assertEqual(run_migrations(sql_connection), [])
+
+        rows = sql_connection.execute_query("SELECT version FROM schema_migrations ORDER BY version")
+        self.assertEqual([row['version'] for row in rows], [migration.version for migration in MIGRATIONS])
+
+        index = sql_connection.execute_query_fetchone(
+            "SELECT indexname FROM pg_indexes WHERE indexname = %s", 'companies_name_trgm_idx')
+        self.assertIsNotNone(index)
+
+
+    def test_vacancies_chunks_keyset_pagination(self):
+        sql_connection = self.sweet_connections.sql_connection
+        rows = [sql_connection.execute_query_fetchone(
+            "INSERT INTO vacancies (recruiter_id, vacancy_doc_ref) VALUES (%s, %s) RETURNING vacancy_id", -1, 'test')
+            for _ in range(5)]
+        vacancy_ids = [row['vacancy_id'] for row in rows]
+
+        chunk = VacanciesChunk(2, vacancy_ids[0] - 1)
+        self.assertEqual([vacancy.get_id() for vacancy in chunk.query_chunk(sql_connection)], vacancy_ids[:2])
+        # Known from the look-ahead row
+        self.assertTrue(chunk.has_following())
+
+        # A vacancy deleted before the cursor does not shift the following chunk
+        sql_connection.execute_query("DELETE FROM vacancies WHERE vacancy_id = %s", vacancy_ids[0])
+        following_chunk = chunk.get_following_chunk()
+        self.assertEqual([vacancy.get_id() for vacancy in following_chunk.query_chunk(sql_connection)],
+                         vacancy_ids[2:4])
+
+        preceding_chunk = following_chunk.get_preceding_chunk()
+        self.assertEqual([vacancy.get_id() for vacancy in preceding_chunk.query_chunk(sql_connection)],
+                         vacancy_ids[1:2])
+
+        sql_connection.execute_query("DELETE FROM vacancies WHERE recruiter_id = %s", -1)
+
+
     def test_neo4j_run_query(self):
         # Assuming you have a simple query to test the connection
         result = self.sweet_connections.neo4j_connection.run_query("CREATE (n: Node {test: 123}) RETURN n")
@@ -49,6 +174,37 @@ class SweetConnectionsTest(unittest.TestCase):
         self.assertIsNotNone(result)
 
 
+    def test_neo4j_run_transaction_and_batch(self):
+        neo4j_connection = self.sweet_connections.neo4j_connection
+        result = neo4j_connection.run_batch("CREATE (n: Node {test: row.value}) RETURN n.test AS value",
+                                            [{"value": value} for value in range(5)], batch_size=2)
+        self.assertEqual([record["value"] for record in result], list(range(5)))
+
+        results = neo4j_connection.run_transaction([
+            ("MATCH (n: Node) WHERE n.test IN $values RETURN count(n) AS count", {"values": list(range(5))}),
+            ("MATCH (n: Node) WHERE n.test IN $values DELETE n", {"values": list(range(5))})
+        ])
+        self.assertIsNotNone(results)
+        self.assertEqual(results[0][0]["count"], 5)
+
+
+    def test_neo4j_session_reused_by_thread(self):
+        neo4j_connection = self.sweet_connections.neo4j_connection
+        neo4j_connection.close()
+        self.assertEqual(neo4j_connection.run_query("RETURN 1 AS one"), [{"one": 1}])
+        self.assertIsNotNone(neo4j_connection.run_transaction([("RETURN 2 AS two", None)]))
+        self.assertEqual(len(neo4j_connection._sessions), 1)
+
+        # Every storage thread gets a session of its own
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(neo4j_connection.run_query, "RETURN 1 AS one").result()
+        self.assertEqual(len(neo4j_connection._sessions), 2)
+
+        # A failed query drops the session of the thread
+        self.assertIsNone(neo4j_connection.run_query("RETURN $missing AS value"))
+        self.assertEqual(len(neo4j_connection._sessions), 1)
+
+
     def test_mongodb_insert_and_find(self):
         # Insert a document
         collection_name = 'testCollection'
@@ -64,6 +220,37 @@ class SweetConnectionsTest(unittest.TestCase):
         self.sweet_connections.mongodb_connection.delete_document(collection_name, inserted_id)
 
 
+    def test_mongodb_find_many_keeps_order(self):
+        collection_name = 'testCollection'
+        mongodb_connection = self.sweet_connections.mongodb_connection
+        inserted_ids = [mongodb_connection.insert_document(collection_name, {'name': f'Test {i}', 'value': i})
+                        for i in range(5)]
+
+        requested_ids = list(reversed(inserted_ids))
+        documents = mongodb_connection.find_many(collection_name, requested_ids, projection={'value': 1}, batch_size=2)
+        self.assertEqual(list(documents.keys()), requested_ids)
+        self.assertEqual([document['value'] for document in documents.values()], [4, 3, 2, 1, 0])
+        self.assertNotIn('name', documents[requested_ids[0]])
+
+        for inserted_id in inserted_ids:
+            mongodb_connection.delete_document(collection_name, inserted_id)
+
+
+    def test_mongodb_find_documents_filtered_and_sorted(self):
+        collection_name = 'testCollection'
+        mongodb_connection = self.sweet_connections.mongodb_connection
+        inserted_ids = [mongodb_connection.insert_document(collection_name, {'vacancy_id': i, 'salary': i * 1000})
+                        for i in range(6)]
+
+        documents = mongodb_connection.find_documents(collection_name,
+                                                      {'vacancy_id': {'$lt': 5}, 'salary': {'$gte': 1000}},
+                                                      projection={'vacancy_id': 1}, sort=[('vacancy_id', -1)], limit=2)
+        self.assertEqual([document['vacancy_id'] for document in documents], [4, 3])
+
+        for inserted_id in inserted_ids:
+            mongodb_connection.delete_document(collection_name, inserted_id)
+
+
     def test_redis_set_and_get(self):
         # Set a value
         key = 'testKey'
@@ -75,7 +262,147 @@ class SweetConnectionsTest(unittest.TestCase):
         self.assertEqual(retrieved_value.decode('utf-8'), value)        
 
 
+    def test_redis_hashes_pipelined(self):
+        redis_connection = self.sweet_connections.redis_connection
+        redis_connection.hset('testHash:1', {'employees': 10, 'vacancies': 1})
+        redis_connection.hset('testHash:2', {'employees': 20, 'vacancies': 2})
+
+        hashes = redis_connection.hgetall_many(['testHash:1', 'testHash:2', 'testHash:missing'])
+        self.assertEqual(hashes[0][b'employees'], b'10')
+        self.assertEqual(hashes[1][b'vacancies'], b'2')
+        self.assertEqual(hashes[2], {})
+
+        self.assertEqual(redis_connection.hincrby('testHash:1', 'vacancies', 1), 2)
+        redis_connection.delete('testHash:1', 'testHash:2')
+
+
+    def test_legacy_company_metrics_migrated_once(self):
+        redis_connection = self.sweet_connections.redis_connection
+        redis_connection.set('company:-1:employees', 10)
+        redis_connection.set('company:-1:vacancies', 3)
+
+        # Workers reaching the company at the same time, one of them publishing a vacancy before any read
+        def first_access(i):
+            metrics = CompanyMetrics(Company.get_metrics_ref(-1))
+            if i == 0:
+                metrics.increment_num_vacancies(redis_connection)
+            else:
+                metrics.update(redis_connection)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(first_access, range(16)))
+        self.assertEqual(redis_connection.hgetall('company:-1'), {b'employees': b'10', b'vacancies': b'4'})
+        self.assertIsNone(redis_connection.get('company:-1:employees'))
+
+        # A hash created by a plain HINCRBY before the migration is completed by the one at startup
+        redis_connection.delete('company:-1')
+        redis_connection.set('company:-1:employees', 10)
+        redis_connection.set('company:-1:vacancies', 3)
+        redis_connection.hincrby('company:-1', 'vacancies', 1)
+        self.assertGreaterEqual(migrate_company_metrics(redis_connection), 1)
+        self.assertEqual(redis_connection.hgetall('company:-1'), {b'employees': b'10', b'vacancies': b'4'})
+        redis_connection.delete('company:-1')
+
+
+    def test_cache_invalidated_by_other_worker(self):
+        redis_connection = self.sweet_connections.redis_connection
+        cache, other_cache = TTLCache(10, 60.0), TTLCache(10, 60.0)
+        invalidator = CacheInvalidator(redis_connection, 'testInvalidate', cache, parse_key=int)
+        other_invalidator = CacheInvalidator(redis_connection, 'testInvalidate', other_cache, parse_key=int)
+        self.assertTrue(invalidator.start())
+        self.assertTrue(other_invalidator.start())
+        cache.put(1, 'profile')
+        other_cache.put(1, 'profile')
+
+        other_invalidator.notify(1)
+        for _ in range(50):
+            if len(cache) == 0:
+                break
+            time.sleep(0.1)
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(other_cache.get(1), 'profile')
+        invalidator.stop()
+        other_invalidator.stop()
+
+
+    def test_company_metrics_reread_on_change_by_other_worker(self):
+        sql_connection = self.sweet_connections.sql_connection
+        redis_connection = self.sweet_connections.redis_connection
+        registry = CompanyRegistry(sql_connection, redis_connection)
+        other_registry = CompanyRegistry(sql_connection, redis_connection)
+        invalidator = CacheInvalidator(redis_connection, 'testInvalidate:companies', registry, parse_key=int)
+        other_invalidator = CacheInvalidator(redis_connection, 'testInvalidate:companies', other_registry,
+                                             parse_key=int)
+        self.assertTrue(invalidator.start())
+        self.assertTrue(other_invalidator.start())
+        company = registry.add_company('Test Company', 10)
+        other_company = other_registry.get_company(company.get_id())
+        version = other_company.metrics.version
+
+        # Cards the other worker rendered from the metrics become stale
+        company.metrics.increment_num_vacancies(redis_connection)
+        invalidator.notify(company.get_id())
+        for _ in range(50):
+            if other_company.metrics.version != version:
+                break
+            time.sleep(0.1)
+        self.assertEqual(other_company.metrics.as_dict(), {'employees': 10, 'open_vacancies': 1})
+        invalidator.stop()
+        other_invalidator.stop()
+        sql_connection.execute_query("DELETE FROM companies WHERE company_id = %s", company.get_id())
+        redis_connection.delete(Company.get_metrics_ref(company.get_id()))
+
+
+    def test_search_session_snapshot(self):
+        search_session = SearchSession(self.sweet_connections.redis_connection, -1, 60)
+        self.assertTrue(search_session.create([(i, 1, f'doc{i}') for i in range(1, 11)]))
+
+        vacancies = search_session.query(3, True, 2, filtered=False)
+        self.assertEqual([(vacancy.get_id(), vacancy.get_doc_ref()) for vacancy in vacancies], [(4, 'doc4'), (5, 'doc5')])
+        vacancies = search_session.query(3, False, 5, filtered=False)
+        self.assertEqual([vacancy.get_id() for vacancy in vacancies], [2, 1])
+
+        # Vacancies published after the session was created are not in the filtered set
+        self.assertTrue(search_session.filter([(2, 1, 'doc2'), (8, 1, 'doc8'), (11, 1, 'doc11')]))
+        vacancies = search_session.query(0, True, 5, filtered=True)
+        self.assertEqual([vacancy.get_id() for vacancy in vacancies], [2, 8])
+
+        filters = VacancyFilters.create((1000, 2000), 'c++')
+        search_session.save_position(8, 7, filters)
+        self.assertEqual(search_session.load_position(), (8, 7, filters))
+        self.sweet_connections.redis_connection.delete('search:-1', 'search:-1:vacancies', 'search:-1:filtered')
+
+
+    def test_search_position_saved_in_order(self):
+        documents = [{'_id': f'doc{i}', 'vacancy_id': i, 'recruiter_id': 1, 'salary': 1000.0, 'company': 1}
+                     for i in range(1, 101)]
+        vacancy_catalog = VacancyCatalog()
+        self.assertTrue(vacancy_catalog.build(DocumentsScan(documents)))
+        document_cache = TTLCache(100, 60.0)
+        document_cache.put_many({document['_id']: document for document in documents})
+        search_session = SearchSession(self.sweet_connections.redis_connection, -1, 60)
+        with ThreadPoolExecutor(max_workers=2) as prefetch_executor:
+            vsc = VacanciesSearchContext(None, None, chunk_limit=5, prefetch_executor=prefetch_executor,
+                                         document_cache=document_cache, vacancy_catalog=vacancy_catalog,
+                                         search_session=search_session)
+            # Each quick step is saved before the next one, whatever the prefetches are doing
+            for step in range(1, 31):
+                self.assertIsNotNone(vsc.jump_vacancy(1))
+                self.assertEqual(search_session.load_position(), (step + 1, step, None))
+        self.sweet_connections.redis_connection.delete('search:-1', 'search:-1:vacancies', 'search:-1:filtered')
+
+
+    def test_storage_metrics_recorded(self):
+        self.sweet_connections.sql_connection.execute_query("SELECT * FROM user_profiles WHERE user_id = %s", 0)
+        self.sweet_connections.redis_connection.get('testMetrics:key')
+
+        exposition = self.sweet_connections.metrics.render()
+        self.assertIn('storage_query_duration_seconds_count{store="postgres",query="select:user_profiles"}',
+                      exposition)
+        self.assertIn('storage_query_errors_total{store="redis",query="get:testMetrics"} 0', exposition)
+
+
     @classmethod
     def tearDownClass(cls):
-        cls.sweet_connections.sql_connection.close()
+        cls.sweet_connections.close()
 
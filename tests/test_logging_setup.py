@@ -0,0 +1,39 @@
+import io
+import logging
+import unittest
+
+from src.logging_setup import setup_logging
+
+
+class LoggingSetupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.listener = setup_logging(logging.INFO, self.stream, max_records=2, interval=60.0)
+
+
+    def tearDown(self):
+        self.listener.stop()
+        logging.getLogger().handlers.clear()
+
+
+    def test_records_are_written_by_listener(self):
+        logging.info("Value of %s is %d", "key", 42)
+        self.listener.stop()
+        self.assertIn("Value of key is 42", self.stream.getvalue())
+        self.listener.start()
+
+
+    def test_call_site_is_rate_limited(self):
+        for i in range(5):
+            logging.info("Hot path record %d", i)
+        for i in range(3):
+            logging.warning("Warning record %d", i)
+        self.listener.stop()
+
+        output = self.stream.getvalue()
+        self.assertIn("Hot path record 1", output)
+        self.assertNotIn("Hot path record 2", output)
+        # Warnings are never dropped
+        self.assertIn("Warning record 2", output)
+        self.listener.start()
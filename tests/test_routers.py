@@ -1,13 +1,20 @@
+import asyncio
 import unittest
 import unittest.mock as mock
 from unittest.mock import AsyncMock, Mock
 from typing import Any, Dict
 
-from aiogram.types import Message, User
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import CallbackQuery, Message, User
 
 from src.routers.entry_router import entry_handler, enter_first_name, enter_last_name
+from src.chat_members import ChatMemberCache
+from src.middlewares import UserLockMiddleware
+from src.routers.recruiter_router import get_applicant, render_applicant, _applicant_prefetches
+from src.routers.seeker_router import on_position_filter_message, on_vacancy_filters_back, on_vacancy_filters_position
 from src.states.menu_states import MenuStates
 from src.states.registration_states import EntryRegistrationStates
+from src.users.seeker_profile import SeekerProfile
 from src.users.user_profile import UserProfile
 
 
@@ -24,6 +31,21 @@ def create_mock_message(text, user_id=1234, chat_type='private'):
     return message
 
 
+def create_mock_callback(data, user_id=1234):
+    call = mock.AsyncMock(spec=CallbackQuery)
+    call.data = data
+    call.from_user = create_mock_message(data, user_id).from_user
+    call.message = create_mock_message(data, user_id)
+    call.message.delete = AsyncMock()
+    return call
+
+
+def create_seeker_user_profile(user_id=1234) -> UserProfile:
+    user_profile = UserProfile(user_id, "John", "Doe")
+    user_profile.seeker_ref = SeekerProfile(user_id, "portfolio", "node")
+    return user_profile
+
+
 class FSMContextMock:
     def __init__(self):
         self.mock = AsyncMock()
@@ -115,4 +137,114 @@ class SweetBotTest(unittest.IsolatedAsyncioTestCase):
 
         data = await mock_state.get_data()
         expected = UserProfile(1234, "John", "Doe")
-        self.assertEqual(data['profile'], expected)
\ No newline at end of file
+        self.assertEqual(data['profile'], expected)
+
+
+    @mock.patch('src.bot.chat_members.get_user', new_callable=AsyncMock)
+    @mock.patch('src.sweet_home.sweet_home.request_applicants')
+    async def test_applicants_fetched_by_page(self, mock_request_applicants, mock_get_user):
+        mock_request_applicants.side_effect = lambda user_ids: [(UserProfile(user_id, "John", "Doe"), {})
+                                                                for user_id in user_ids]
+        applicant_ids = list(range(1, 26))
+
+        # Opening a page fetches it whole and prefetches the next one
+        user_profile, _ = await get_applicant(applicant_ids, 0)
+        await asyncio.gather(*_applicant_prefetches)
+        self.assertEqual(user_profile.get_id(), 1)
+        self.assertEqual([call.args[0] for call in mock_request_applicants.call_args_list],
+                         [applicant_ids[0:10], applicant_ids[10:20]])
+
+        mock_request_applicants.reset_mock()
+        user_profile, _ = await get_applicant(applicant_ids, 12)
+        self.assertEqual(user_profile.get_id(), 13)
+        self.assertEqual([call.args[0] for call in mock_request_applicants.call_args_list], [applicant_ids[10:20]])
+
+
+    @mock.patch('src.sweet_home.sweet_home.request_user_profiles', Mock(return_value=[]))
+    @mock.patch('src.sweet_home.sweet_home.request_applicants')
+    async def test_missing_applicant_reported(self, mock_request_applicants):
+        # Applicant 2 deleted their profile after the ids were listed
+        mock_request_applicants.side_effect = lambda user_ids: [(UserProfile(user_id, "John", "Doe"), {})
+                                                                for user_id in user_ids if user_id != 2]
+        applicant_ids = [1, 2, 3]
+
+        applicant = await get_applicant(applicant_ids, 1)
+        self.assertIsNone(applicant)
+        self.assertEqual(await render_applicant(applicant), "<i>This applicant is no longer available.</i>")
+        user_profile, _ = await get_applicant(applicant_ids, 2)
+        self.assertEqual(user_profile.get_id(), 3)
+
+
+    @mock.patch('src.chat_members.GetChatMember')
+    async def test_chat_members_looked_up_once(self, mock_get_chat_member):
+        async def get_chat_member(bot):
+            user_id = mock_get_chat_member.call_args.kwargs['user_id']
+            if user_id == 2:
+                raise TelegramBadRequest(method=Mock(), message="chat not found")
+            await asyncio.sleep(0.01)
+            return Mock(user=User(id=user_id, is_bot=False, first_name="John"))
+
+        mock_get_chat_member.return_value.as_ = get_chat_member
+        chat_members = ChatMemberCache(Mock(), max_size=10, ttl=60, negative_ttl=60, timeout=1.0)
+
+        # Concurrent renders share a single request, and its result is cached
+        mentions = await asyncio.gather(*[chat_members.mention_html(1, "John Doe") for _ in range(3)])
+        self.assertEqual(mentions, ['<a href="tg://user?id=1">John Doe</a>'] * 3)
+        await chat_members.mention_html(1, "John Doe")
+        self.assertEqual(mock_get_chat_member.call_count, 1)
+
+        # Users Telegram does not know are not looked up again, and are mentioned by name
+        self.assertEqual(await chat_members.mention_html(2, "Jane <Doe>"), "Jane &lt;Doe&gt;")
+        self.assertEqual(await chat_members.mention_html(2, "Jane <Doe>"), "Jane &lt;Doe&gt;")
+        self.assertEqual(mock_get_chat_member.call_count, 2)
+
+
+    async def test_updates_of_one_user_handled_one_at_a_time(self):
+        middleware = UserLockMiddleware()
+        started = []
+        release = asyncio.Event()
+
+        async def handler(event, data):
+            started.append(event)
+            await release.wait()
+            return event
+
+        def user_data(user_id):
+            return {'event_from_user': User(id=user_id, is_bot=False, first_name="John")}
+
+        tasks = [asyncio.create_task(middleware(handler, event, user_data(user_id)))
+                 for event, user_id in (('first', 1), ('second', 1), ('other', 2))]
+        for _ in range(5):
+            await asyncio.sleep(0)
+        # The other user is handled alongside, the second update of the same user waits for the first one
+        self.assertEqual(started, ['first', 'other'])
+
+        release.set()
+        self.assertEqual(await asyncio.gather(*tasks), ['first', 'second', 'other'])
+        self.assertEqual(started, ['first', 'other', 'second'])
+        self.assertEqual(len(middleware), 0)
+
+
+    @mock.patch('src.sweet_home.sweet_home.seeker_home.is_current_vacancy_by_filters')
+    @mock.patch('src.sweet_home.sweet_home.seeker_home.resume_search_context', Mock(return_value=False))
+    @mock.patch('src.sweet_home.sweet_home.request_user_profile')
+    async def test_filters_done_after_profile_evicted(self, mock_request_user_profile, mock_is_current_vacancy):
+        cached_profile = create_seeker_user_profile()
+        cached_profile.seeker_ref.vacancies_search_context = Mock()
+        mock_request_user_profile.return_value = cached_profile
+        mock_state = FSMContextMock()
+        await mock_state.set_state(MenuStates.seeker_vacancy_filters)
+
+        await on_vacancy_filters_position(create_mock_callback("filter_position"), mock_state.mock)
+        message = create_mock_message("Python")
+        message.delete = AsyncMock()
+        await on_position_filter_message(message, mock_state.mock)
+
+        # The profile is evicted from the cache, and its search session has expired meanwhile
+        mock_request_user_profile.return_value = create_seeker_user_profile()
+        call = create_mock_callback("done")
+        await on_vacancy_filters_back(call, mock_state.mock)
+
+        self.assertIn("expired", call.message.answer.await_args.args[0])
+        self.assertEqual(await mock_state.get_state(), MenuStates.seeker_home)
+        mock_is_current_vacancy.assert_not_called()
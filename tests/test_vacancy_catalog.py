@@ -0,0 +1,69 @@
+import unittest
+
+from src.users.vacancy import VacanciesChunk, VacancyCatalog, VacancyFilters
+from tests.fakes import DocumentsScan
+
+
+class VacancyCatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        # Vacancies 1..1000, salaries cycling through 0..9900 and companies through 0..4
+        self.catalog = VacancyCatalog()
+        self.assertTrue(self.catalog.build(DocumentsScan([
+            {'_id': f'doc{i}', 'vacancy_id': i, 'recruiter_id': i % 7, 'salary': (i % 100) * 100.0, 'company': i % 5}
+            for i in range(1, 1001)])))
+
+
+    def ids(self, *args, **kwargs) -> list[int]:
+        return [vacancy_id for vacancy_id, _, _ in self.catalog.find(*args, **kwargs)]
+
+
+    def test_find_after_and_before_cursor(self):
+        self.assertEqual(self.ids(0, True, 3), [1, 2, 3])
+        self.assertEqual(self.ids(998, True, 3), [999, 1000])
+        self.assertEqual(self.ids(4, False, 3), [1, 2, 3])
+        self.assertEqual(self.catalog.find(7, True, 1), [(8, 1, 'doc8')])
+
+
+    def test_find_filtered(self):
+        # Selective salary range, served by the salary index
+        self.assertEqual(self.ids(0, True, 3, salary=(1000, 1000)), [10, 110, 210])
+        self.assertEqual(self.ids(1000, False, 2, salary=(1000, 1000)), [810, 910])
+        # Wide salary range, scanned
+        self.assertEqual(self.ids(500, True, 2, salary=(0, 5000), company_id=3), [503, 508])
+        self.assertEqual(self.ids(0, True, 5, company_id=7), [])
+        self.assertEqual(self.ids(0, True, 5, salary=(100, 100), candidate_ids=[1, 101, 102, 5000]), [1, 101])
+
+
+    def test_add_and_remove(self):
+        self.catalog.add(2000, 9, 'doc2000', {'salary': 1000.0, 'company': 1})
+        # Out of order insertion shifts later rows
+        self.catalog.add(1500, 9, 'doc1500', {'salary': 1000.0})
+        self.assertEqual(self.ids(900, True, 5, salary=(1000, 1000)), [910, 1500, 2000])
+
+        self.catalog.remove(910)
+        self.catalog.remove(910)
+        self.assertEqual(self.ids(900, True, 5, salary=(1000, 1000)), [1500, 2000])
+        self.assertEqual(len(self.catalog), 1001)
+
+        # Removing most vacancies compacts the catalog
+        for vacancy_id in range(1, 1001):
+            self.catalog.remove(vacancy_id)
+        self.assertEqual(len(self.catalog), 2)
+        self.assertEqual(self.ids(0, True, 5), [1500, 2000])
+
+
+    def test_chunks_page_over_catalog(self):
+        chunk = VacanciesChunk(2, filters=VacancyFilters.create((9900, 9900), None))
+        self.assertEqual([vacancy.get_id() for vacancy in chunk.query_chunk(None, vacancy_catalog=self.catalog)],
+                         [99, 199])
+        following_chunk = chunk.get_following_chunk()
+        self.assertEqual([vacancy.get_doc_ref() for vacancy in
+                          following_chunk.query_chunk(None, vacancy_catalog=self.catalog)], ['doc299', 'doc399'])
+        self.assertTrue(following_chunk.has_preceding())
+        self.assertTrue(following_chunk.has_following())
+
+        last_chunk = VacanciesChunk(2, 800, filters=chunk.get_filters())
+        self.assertEqual([vacancy.get_id() for vacancy in last_chunk.query_chunk(None, vacancy_catalog=self.catalog)],
+                         [899, 999])
+        self.assertFalse(last_chunk.has_following())
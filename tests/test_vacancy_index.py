@@ -0,0 +1,149 @@
+import re
+import unittest
+
+from src.cache_invalidation import VacancyStructures
+from src.caches import TTLCache
+from src.users.vacancy import Vacancy, VacanciesChunk, VacancyCatalog, VacancyFilters
+from src.users.vacancy_index import VacancyIndex, scan_vacancy_documents
+from src.users.vacancy_ranker import VacancyRanker
+from tests.fakes import DocumentsScan
+
+
+def mongodb_matches(query: dict, document: dict) -> bool:
+    """
+    Evaluates the subset of MongoDB queries VacancyFilters.as_query builds
+    """
+    for field, condition in query.items():
+        if field == "$and":
+            if not all(mongodb_matches(subquery, document) for subquery in condition):
+                return False
+        elif field == "$or":
+            if not any(mongodb_matches(subquery, document) for subquery in condition):
+                return False
+        elif isinstance(condition, dict) and "$regex" in condition:
+            # Python regexes match Unicode word characters already
+            pattern = condition["$regex"].replace("(*UCP)", "")
+            flags = re.IGNORECASE if "i" in condition.get("$options", "") else 0
+            if not isinstance(document.get(field), str) or re.search(pattern, document[field], flags) is None:
+                return False
+        elif isinstance(condition, dict):
+            value = document.get(field)
+            if value is None or not condition.get("$gte", value) <= value <= condition.get("$lte", value):
+                return False
+        elif document.get(field) != condition:
+            return False
+    return True
+
+
+class VacancyIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        positions = ['C++ Developer', 'Python developer', 'Designer', 'Senior C++ engineer']
+        documents = DocumentsScan([{'_id': f'doc{i}', 'vacancy_id': i, 'recruiter_id': 1, 'salary': i * 1000,
+                                    'company': 1, 'position': position, 'description': 'Remote'}
+                                   for i, position in enumerate(positions, start=1)])
+        self.index = VacancyIndex()
+        self.assertTrue(self.index.build(documents))
+        self.catalog = VacancyCatalog()
+        self.assertTrue(self.catalog.build(documents))
+
+
+    def test_search_intersects_keyword_prefixes(self):
+        self.assertEqual(list(self.index.search('dev')), [1, 2])
+        self.assertEqual(list(self.index.search('c++ senior')), [4])
+        self.assertEqual(list(self.index.search('remote DESIGNER')), [3])
+        self.assertEqual(list(self.index.search('manager')), [])
+        self.assertIsNone(self.index.search('...'))
+
+
+    def test_index_updated_incrementally(self):
+        self.index.add(6, {'position': 'C++ Lead', 'description': 'Games'})
+        self.index.add(5, {'position': 'C++ Intern', 'description': 'Games'})
+        self.assertEqual(list(self.index.search('c++')), [1, 4, 5, 6])
+
+        self.index.remove(1)
+        self.index.remove(6)
+        self.assertEqual(list(self.index.search('c++')), [4, 5])
+        self.assertEqual(list(self.index.search('lead')), [])
+
+
+    def test_chunks_page_over_index_and_catalog(self):
+        filters = VacancyFilters.create(None, 'c++')
+        chunk = VacanciesChunk(1, filters=filters)
+        vacancies = chunk.query_chunk(None, None, self.index, self.catalog)
+        self.assertEqual([vacancy.get_id() for vacancy in vacancies], [1])
+
+        following_chunk = chunk.get_following_chunk()
+        vacancies = following_chunk.query_chunk(None, None, self.index, self.catalog)
+        self.assertEqual([vacancy.get_doc_ref() for vacancy in vacancies], ['doc4'])
+
+        chunk = VacanciesChunk(5, 5, forward=False, filters=VacancyFilters.create((2000, 5000), 'c++'))
+        vacancies = chunk.query_chunk(None, None, self.index, self.catalog)
+        self.assertEqual([vacancy.get_id() for vacancy in vacancies], [4])
+
+
+    def test_position_filter_agrees_across_paths(self):
+        positions = [('C++ Developer', 'Remote'), ('Senior C++ engineer', 'Games'), ('Backend dev', 'Python, Django'),
+                     ('Розробник', 'Python backend'), ('DevOps', 'Kubernetes'), ('Web-developer', 'React'),
+                     ('c++dev', 'Embedded'), ('Designer', None)]
+        documents = [{'_id': f'doc{i}', 'vacancy_id': i, 'recruiter_id': 1, 'salary': i * 1000, 'company': 1,
+                      'position': position, 'description': description}
+                     for i, (position, description) in enumerate(positions, start=1)]
+        index = VacancyIndex()
+        self.assertTrue(index.build(DocumentsScan(documents)))
+        document_cache = TTLCache(100, 60.0)
+        document_cache.put_many({document['_id']: document for document in documents})
+
+        for position in ['dev', 'c++', 'python dev', 'РОЗРОБ', 'ops', 'eng senior', 'web dev', 'react-dev', 'sign']:
+            filters = VacancyFilters.create(None, position)
+            # VacancyIndex, MongoDB and the check of a single vacancy must all find the same vacancies
+            indexed = list(index.search(position))
+            queried = [document['vacancy_id'] for document in documents
+                       if mongodb_matches(filters.as_query(), document)]
+            checked = [document['vacancy_id'] for document in documents
+                       if Vacancy(document['vacancy_id'], 1, document['_id']).filter_suitable(filters, None,
+                                                                                               document_cache)]
+            self.assertEqual(indexed, queried, position)
+            self.assertEqual(indexed, checked, position)
+
+        self.assertEqual(list(index.search('dev')), [1, 3, 5, 6])
+        self.assertIsNone(VacancyFilters.create(None, '...'))
+
+
+    def test_vacancy_structures_built_from_one_scan(self):
+        documents = DocumentsScan([{'_id': f'doc{i}', 'vacancy_id': i, 'recruiter_id': 1, 'salary': i * 1000.0,
+                                    'company': i % 2, 'position': position, 'description': 'Remote'}
+                                   for i, position in enumerate(['Python dev', 'C++ dev', 'Designer'], start=1)])
+        scanned = list(scan_vacancy_documents(documents))
+        index, catalog, ranker = VacancyIndex(), VacancyCatalog(), VacancyRanker(n_features=64)
+        self.assertTrue(index.build(documents, scanned))
+        self.assertTrue(catalog.build(documents, scanned))
+        self.assertTrue(ranker.build(documents, scanned))
+        self.assertEqual(documents.scans, 1)
+
+        self.assertEqual(list(index.search('dev')), [1, 2])
+        self.assertEqual(catalog.find(0, True, 10, salary=(1500.0, 3000.0), company_id=0), [(2, 1, 'doc2')])
+        self.assertEqual([vacancy_id for vacancy_id, _, _ in ranker.rank('designer', 1)], [3])
+
+
+    def test_vacancies_of_other_workers_applied(self):
+        documents = DocumentsScan([{'_id': 'doc1', 'vacancy_id': 1, 'recruiter_id': 1, 'salary': 1000.0,
+                                    'company': 1, 'position': 'Python dev', 'description': 'Remote'}])
+        index, catalog, ranker = VacancyIndex(), VacancyCatalog(), VacancyRanker(n_features=64)
+        for structure in (index, catalog, ranker):
+            self.assertTrue(structure.build(documents))
+        vacancy_structures = VacancyStructures(documents, index, catalog, ranker)
+
+        # Another worker publishes vacancy 2, and deletes vacancy 1
+        documents.documents.append({'_id': 'doc2', 'vacancy_id': 2, 'recruiter_id': 3, 'salary': 2000.0,
+                                    'company': 1, 'position': 'Python engineer', 'description': 'Office'})
+        vacancy_structures.invalidate(2)
+        self.assertEqual(list(index.search('python')), [1, 2])
+        self.assertEqual(catalog.find(0, True, 10, salary=(1500.0, 2500.0)), [(2, 3, 'doc2')])
+        self.assertEqual([vacancy_id for vacancy_id, _, _ in ranker.rank('engineer', 10)], [2])
+
+        del documents.documents[0]
+        vacancy_structures.invalidate(1)
+        self.assertEqual(list(index.search('python')), [2])
+        self.assertEqual(catalog.find_all(), [(2, 3, 'doc2')])
+        self.assertEqual([vacancy_id for vacancy_id, _, _ in ranker.rank('python', 10)], [2])
@@ -0,0 +1,66 @@
+import unittest
+
+from src.users.seeker_profile import SeekerProfile
+from src.users.vacancy import VacanciesChunk
+from src.users.vacancy_ranker import RankedVacancies, VacancyRanker
+from tests.fakes import DocumentsScan
+
+
+class VacancyRankerTest(unittest.TestCase):
+
+    def setUp(self):
+        positions = ['C++ Developer', 'Python developer', 'Designer', 'Senior C++ engineer', 'Python data engineer']
+        documents = DocumentsScan([{'_id': f'doc{i}', 'vacancy_id': i, 'recruiter_id': 1, 'position': position,
+                                    'description': 'Remote'} for i, position in enumerate(positions, start=1)])
+        self.ranker = VacancyRanker(n_features=256)
+        self.assertTrue(self.ranker.build(documents))
+
+
+    def ranked_ids(self, text: str, limit: int = 10) -> list[int]:
+        return [vacancy_id for vacancy_id, _, _ in self.ranker.rank(text, limit)]
+
+
+    def test_rank_orders_by_relevance(self):
+        ranked_ids = self.ranked_ids('Python engineer, Python and SQL')
+        self.assertEqual(ranked_ids[0], 5)
+        self.assertEqual(set(ranked_ids[1:3]), {2, 4})
+        self.assertNotIn(3, ranked_ids)
+        self.assertEqual(self.ranked_ids('C++', limit=1), [1])
+        self.assertEqual(self.ranked_ids('...'), [])
+
+
+    def test_matrix_updated_incrementally(self):
+        self.ranker.add(6, 1, 'doc6', {'position': 'Designer', 'description': 'Figma'})
+        self.assertEqual(self.ranked_ids('figma designer')[0], 6)
+
+        self.ranker.remove(1)
+        self.ranker.remove(6)
+        self.assertEqual(len(self.ranker), 4)
+        self.assertEqual(self.ranked_ids('figma designer'), [3])
+        self.assertEqual(self.ranked_ids('senior c++')[0], 4)
+
+
+    def test_chunks_page_in_ranked_order(self):
+        ranked = self.ranker.rank('python developer engineer', 10)
+        ranked_vacancies = RankedVacancies(self.ranker, ranked)
+        order = [vacancy_id for vacancy_id, _, _ in ranked]
+        self.assertEqual(len(order), 4)
+        self.ranker.remove(order[1])
+
+        chunk = VacanciesChunk(2)
+        vacancies = chunk.query_chunk(None, snapshot_query=ranked_vacancies.query)
+        self.assertEqual([vacancy.get_id() for vacancy in vacancies], [order[0], order[2]])
+        self.assertTrue(chunk.has_following())
+
+        following_chunk = chunk.get_following_chunk()
+        vacancies = following_chunk.query_chunk(None, snapshot_query=ranked_vacancies.query)
+        self.assertEqual([vacancy.get_id() for vacancy in vacancies], [order[3]])
+        self.assertFalse(following_chunk.has_following())
+
+        vacancies = following_chunk.get_preceding_chunk().query_chunk(None, snapshot_query=ranked_vacancies.query)
+        self.assertEqual([vacancy.get_id() for vacancy in vacancies], [order[0], order[2]])
+
+
+    def test_portfolio_text(self):
+        portfolio = {'position': 'Developer', 'experiences': [{'title': 'Intern', 'desc': 'C++', 'timeline': '1y'}]}
+        self.assertEqual(SeekerProfile.get_portfolio_text(portfolio), 'Developer Intern C++')